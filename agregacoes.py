@@ -0,0 +1,106 @@
+import pandas as pd
+from datetime import date
+
+# ---------------------------------------------------
+# Agregações partilhadas (dashboard e API)
+# ---------------------------------------------------
+# Funções puras sobre o ficheiro mestre (uma linha por mosca), para que o
+# dashboard e a API devolvam exatamente os mesmos números.
+
+CLASSES = ["femea", "macho", "mosca"]
+NOMES_CLASSES = {"femea": "Nº Fêmeas", "macho": "Nº Machos", "mosca": "Nº Moscas"}
+
+
+def filtrar(df, localizacoes=None, inicio=None, fim=None):
+    if localizacoes:
+        df = df[df["Localização"].isin(localizacoes)]
+    if inicio is not None and fim is not None:
+        df = df[
+            (df["First_Detection_Date"].dt.date >= inicio)
+            & (df["First_Detection_Date"].dt.date <= fim)
+        ]
+    return df
+
+
+# Curva de voo: uma linha por dia desde a primeira deteção até hoje
+def curva_diaria(df_filtrado, df_mestre, hoje=None):
+    hoje = hoje or date.today()
+    valid_dates = df_filtrado["First_Detection_Date"].dropna()
+
+    if valid_dates.empty:
+        # Sem datas: usamos a menor data do ficheiro mestre (se existir) ou hoje
+        mestre_dates = df_mestre["First_Detection_Date"].dropna()
+        start_date = mestre_dates.min().date() if not mestre_dates.empty else hoje
+        full_dates = pd.date_range(start=start_date, end=hoje, freq="D").date
+        df_daily = pd.DataFrame(0, index=full_dates, columns=CLASSES)
+    else:
+        start_date = valid_dates.min().date()
+        full_dates = pd.date_range(start=start_date, end=hoje, freq="D").date
+        df_daily = (
+            df_filtrado.groupby([df_filtrado["First_Detection_Date"].dt.date, "Class"])["Fly_ID"]
+            .count()
+            .unstack(fill_value=0)
+        )
+        df_daily = df_daily.reindex(columns=CLASSES, fill_value=0)
+        df_daily = df_daily.reindex(full_dates, fill_value=0)
+
+    df_daily.index.name = "Data"
+    df_daily = df_daily.reset_index().rename(columns=NOMES_CLASSES)
+    df_daily["Total Moscas"] = df_daily[list(NOMES_CLASSES.values())].sum(axis=1)
+    df_daily["Acumulado"] = df_daily["Total Moscas"].cumsum()
+    return df_daily
+
+
+def totais_por_classe(df_filtrado):
+    capturas_classes = (
+        df_filtrado["Class"]
+        .value_counts()
+        .reindex(CLASSES, fill_value=0)
+        .reset_index()
+    )
+    capturas_classes.columns = ["Classe", "Total"]
+    return capturas_classes
+
+
+# Contagem de moscas por classe para uma chave qualquer (série ou nome de coluna)
+def contar_por(df_filtrado, chave):
+    return (
+        df_filtrado.groupby([chave, "Class"])["Fly_ID"]
+        .count()
+        .unstack(fill_value=0)
+        .reindex(columns=CLASSES, fill_value=0)
+    )
+
+
+def por_semana(df_filtrado):
+    return contar_por(df_filtrado, df_filtrado["First_Detection_Date"].dt.isocalendar().week.rename("Semana"))
+
+
+def por_mes(df_filtrado):
+    return contar_por(df_filtrado, df_filtrado["First_Detection_Date"].dt.strftime("%Y-%m (%B)").rename("Mês"))
+
+
+def por_placa(df_filtrado):
+    return contar_por(df_filtrado, "Placa ID")
+
+
+def por_localizacao(df_filtrado):
+    return contar_por(df_filtrado, "Localização")
+
+
+# Opções dos filtros: localizações (BD + ficheiro mestre) e intervalo de datas
+def opcoes_filtros(df_mestre, df_localizacoes):
+    localizacoes = set(df_mestre["Localização"].dropna().unique())
+    if not df_localizacoes.empty:
+        localizacoes |= set(df_localizacoes["Localização"].dropna().unique())
+
+    datas = df_mestre["First_Detection_Date"].dropna() if "First_Detection_Date" in df_mestre.columns else pd.Series()
+    if datas.empty:
+        return sorted(localizacoes), None, None
+    return sorted(localizacoes), datas.min().date(), datas.max().date()
+
+
+# Pontos do mapa: armadilhas da BD ou, sem BD, coordenadas das moscas filtradas
+def pontos_mapa(df_localizacoes, df_filtrado):
+    origem = df_localizacoes if not df_localizacoes.empty else df_filtrado
+    return origem[["Latitude", "Longitude"]].dropna().drop_duplicates().reset_index(drop=True)
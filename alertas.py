@@ -0,0 +1,249 @@
+import sqlite3
+import pathlib
+import pandas as pd
+from datetime import datetime, timedelta
+
+# ---------------------------------------------------
+# Motor de alertas por armadilha (incremental)
+# ---------------------------------------------------
+# As contagens diárias por armadilha e os alertas ficam guardados em
+# 'placas.db'. Cada ingestão só processa moscas ainda não vistas e só
+# reavalia as regras nos dias afetados, pelo que o dashboard apenas lê
+# os alertas abertos em vez de voltar a percorrer todo o histórico.
+
+BASE_DIR = pathlib.Path(__file__).parent.resolve()
+DB_PATH = BASE_DIR / "placas.db"
+
+# Limiares das regras
+LIMIAR_DIARIO = 3          # moscas capturadas num só dia
+LIMIAR_SOMA_7D = 10        # soma móvel de 7 dias
+LIMIAR_CRESCIMENTO = 2.0   # semana atual / semana anterior
+MINIMO_CRESCIMENTO = 3     # moscas mínimas na semana atual para avaliar o crescimento
+
+# Margem de dias à volta dos dias alterados que tem de ser reavaliada
+# (a soma de 7 dias e a comparação semanal olham até 13 dias para trás)
+JANELA_REAVALIACAO = 14
+
+DESCRICAO_REGRAS = {
+    "diario": "Moscas no dia",
+    "soma_7d": "Soma de 7 dias",
+    "crescimento_semanal": "Crescimento semanal",
+}
+
+
+def ligar(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    criar_tabelas(conn)
+    return conn
+
+
+def criar_tabelas(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS moscas_registadas (
+            fly_id TEXT PRIMARY KEY,
+            id_armadilha INTEGER NOT NULL,
+            dia TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS contagens_diarias (
+            id_armadilha INTEGER NOT NULL,
+            dia TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            PRIMARY KEY (id_armadilha, dia)
+        );
+        CREATE TABLE IF NOT EXISTS alertas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_armadilha INTEGER NOT NULL,
+            regra TEXT NOT NULL,
+            dia TEXT NOT NULL,
+            valor REAL NOT NULL,
+            limiar REAL NOT NULL,
+            aberto INTEGER NOT NULL DEFAULT 1,
+            criado_em TEXT NOT NULL,
+            UNIQUE (id_armadilha, regra, dia),
+            FOREIGN KEY (id_armadilha) REFERENCES armadilhas(id)
+        );
+    """)
+    conn.commit()
+
+
+# Mapa Placa ID -> id da armadilha
+def carregar_mapa_placas(conn):
+    linhas = conn.execute("SELECT placa_id, id_armadilha FROM placas").fetchall()
+    return dict(linhas)
+
+
+# ---------------------------------------------------
+# Ingestão
+# ---------------------------------------------------
+# Recebe as linhas do ficheiro mestre (uma por mosca) e regista apenas as
+# moscas novas. Devolve as moscas novas por armadilha e dia (id_armadilha,
+# dia, n), usadas também para atualizar as tendências sem reler a tabela.
+def ingerir_moscas(conn, df):
+    vazio = pd.DataFrame(columns=["id_armadilha", "dia", "n"])
+    if df.empty:
+        return vazio
+
+    mapa_placas = carregar_mapa_placas(conn)
+    novas = df[["Fly_ID", "Placa ID", "First_Detection_Date"]].dropna()
+    novas = novas.assign(id_armadilha=novas["Placa ID"].map(mapa_placas)).dropna(subset=["id_armadilha"])
+    if novas.empty:
+        return vazio
+
+    linhas = list(zip(
+        novas["Fly_ID"].astype(str),
+        novas["id_armadilha"].astype(int),
+        pd.to_datetime(novas["First_Detection_Date"]).dt.strftime("%Y-%m-%d"),
+    ))
+
+    # Só as moscas que ainda não existiam contam para as contagens diárias
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS lote_moscas (
+            fly_id TEXT PRIMARY KEY, id_armadilha INTEGER, dia TEXT
+        )
+    """)
+    conn.execute("DELETE FROM lote_moscas")
+    conn.executemany("INSERT OR IGNORE INTO lote_moscas VALUES (?, ?, ?)", linhas)
+    registadas = pd.read_sql_query(
+        """
+        SELECT l.fly_id, l.id_armadilha, l.dia FROM lote_moscas l
+        LEFT JOIN moscas_registadas m ON m.fly_id = l.fly_id
+        WHERE m.fly_id IS NULL
+        """,
+        conn,
+    )
+    if registadas.empty:
+        return vazio
+
+    conn.executemany(
+        "INSERT INTO moscas_registadas (fly_id, id_armadilha, dia) VALUES (?, ?, ?)",
+        registadas.itertuples(index=False, name=None),
+    )
+
+    incrementos = registadas.groupby(["id_armadilha", "dia"]).size().reset_index(name="n")
+    conn.executemany(
+        """
+        INSERT INTO contagens_diarias (id_armadilha, dia, total) VALUES (?, ?, ?)
+        ON CONFLICT (id_armadilha, dia) DO UPDATE SET total = total + excluded.total
+        """,
+        incrementos[["id_armadilha", "dia", "n"]].itertuples(index=False, name=None),
+    )
+
+    for id_armadilha, dias in incrementos.groupby("id_armadilha")["dia"]:
+        avaliar_regras(conn, int(id_armadilha), dias.min(), dias.max())
+
+    conn.commit()
+    return incrementos
+
+
+# ---------------------------------------------------
+# Avaliação das regras
+# ---------------------------------------------------
+# Reavalia as regras de uma armadilha entre dia_inicio e dia_fim (inclusive),
+# mais a margem necessária para as janelas móveis.
+def avaliar_regras(conn, id_armadilha, dia_inicio, dia_fim):
+    inicio = pd.Timestamp(dia_inicio).date()
+    fim = pd.Timestamp(dia_fim).date() + timedelta(days=JANELA_REAVALIACAO)
+    leitura_inicio = inicio - timedelta(days=JANELA_REAVALIACAO)
+
+    serie = pd.read_sql_query(
+        """
+        SELECT dia, total FROM contagens_diarias
+        WHERE id_armadilha = ? AND dia BETWEEN ? AND ?
+        """,
+        conn,
+        params=(id_armadilha, leitura_inicio.isoformat(), fim.isoformat()),
+    )
+    dias = pd.date_range(leitura_inicio, fim, freq="D")
+    serie = (
+        serie.assign(dia=pd.to_datetime(serie["dia"]))
+        .set_index("dia")["total"]
+        .reindex(dias, fill_value=0)
+    )
+
+    soma_7d = serie.rolling(7, min_periods=1).sum()
+    semana_anterior = soma_7d.shift(7, fill_value=0)
+    crescimento = (soma_7d / semana_anterior.where(semana_anterior > 0)).fillna(0)
+
+    avaliacoes = pd.DataFrame({
+        "diario": serie,
+        "soma_7d": soma_7d,
+        "crescimento_semanal": crescimento.where(soma_7d >= MINIMO_CRESCIMENTO, 0),
+    })
+    limiares = {
+        "diario": LIMIAR_DIARIO,
+        "soma_7d": LIMIAR_SOMA_7D,
+        "crescimento_semanal": LIMIAR_CRESCIMENTO,
+    }
+
+    # Só se reescrevem os dias cujas janelas podem ter mudado
+    avaliacoes = avaliacoes.loc[pd.Timestamp(inicio):]
+    intervalo = (inicio.isoformat(), fim.isoformat())
+    agora = datetime.now().isoformat(timespec="seconds")
+
+    for regra, limiar in limiares.items():
+        # Um alerta fica associado ao dia de captura que fez ultrapassar o limiar
+        valores = avaliacoes[regra]
+        disparados = valores[(valores > limiar) & (avaliacoes["diario"] > 0)]
+
+        conn.executemany(
+            """
+            INSERT INTO alertas (id_armadilha, regra, dia, valor, limiar, criado_em)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id_armadilha, regra, dia) DO UPDATE SET valor = excluded.valor
+            """,
+            [
+                (id_armadilha, regra, dia.date().isoformat(), float(valor), limiar, agora)
+                for dia, valor in disparados.items()
+            ],
+        )
+
+        # Alertas abertos que deixaram de se verificar (ex.: semana anterior corrigida)
+        dias_disparados = {dia.date().isoformat() for dia in disparados.index}
+        abertos = conn.execute(
+            """
+            SELECT id, dia FROM alertas
+            WHERE id_armadilha = ? AND regra = ? AND aberto = 1 AND dia BETWEEN ? AND ?
+            """,
+            (id_armadilha, regra, *intervalo),
+        ).fetchall()
+        conn.executemany(
+            "DELETE FROM alertas WHERE id = ?",
+            [(id_alerta,) for id_alerta, dia in abertos if dia not in dias_disparados],
+        )
+
+
+# ---------------------------------------------------
+# Leitura (usada pelo dashboard)
+# ---------------------------------------------------
+def contagens_diarias(conn):
+    return pd.read_sql_query("SELECT id_armadilha, dia, total FROM contagens_diarias", conn)
+
+
+def alertas_abertos(conn, localizacoes=None):
+    query = """
+        SELECT
+            al.id AS "ID",
+            a.nome AS "Nome Armadilha",
+            a.localidade AS "Localização",
+            al.regra AS "Regra",
+            al.dia AS "Dia",
+            al.valor AS "Valor",
+            al.limiar AS "Limiar"
+        FROM alertas al
+        JOIN armadilhas a ON al.id_armadilha = a.id
+        WHERE al.aberto = 1
+    """
+    params = []
+    if localizacoes:
+        query += f" AND a.localidade IN ({', '.join('?' for _ in localizacoes)})"
+        params.extend(localizacoes)
+    query += " ORDER BY al.dia DESC, a.nome"
+
+    df = pd.read_sql_query(query, conn, params=params)
+    df["Regra"] = df["Regra"].map(DESCRICAO_REGRAS).fillna(df["Regra"])
+    return df
+
+
+def fechar_alertas(conn, ids):
+    conn.executemany("UPDATE alertas SET aberto = 0 WHERE id = ?", [(int(i),) for i in ids])
+    conn.commit()
@@ -0,0 +1,295 @@
+import argparse
+import hashlib
+import json
+import pathlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import agregacoes
+import consultas_duckdb
+import exportacao
+import ingestao
+
+# ---------------------------------------------------
+# API local de leitura (JSON)
+# ---------------------------------------------------
+# Expõe as mesmas agregações do dashboard (fatias do cubo de contagens)
+# para outras ferramentas (agendamento de tratamentos, relatórios). As
+# respostas são calculadas uma vez por versão dos dados e devolvem
+# ETag/Last-Modified, para que os clientes recebam 304 em vez de forçarem
+# novo cálculo. O ETag é o hash do corpo da resposta e o Last-Modified é a
+# data de modificação das fontes, pelo que ambos se mantêm válidos entre
+# reinícios do processo (e mudam sempre que os dados mudam).
+#
+#   GET /curva?localizacao=Beja&inicio=2025-07-01&fim=2025-08-31
+#   GET /placas            totais por placa
+#   GET /localizacoes      totais por localização
+#   GET /classes           totais por classe
+#   GET /armadilhas        lista de armadilhas e placas (placas.db)
+#   GET /moscas.csv        moscas filtradas (também /moscas.parquet)
+#
+# As moscas filtradas não passam pela cache de respostas: são enviadas em
+# blocos (Transfer-Encoding: chunked) à medida que são geradas, sem juntar
+# o ficheiro completo em memória.
+
+BASE_DIR = pathlib.Path(__file__).parent.resolve()
+
+PORTA = 8502
+MAX_RESPOSTAS_CACHE = 256
+
+
+def ler_filtros(query):
+    parametros = parse_qs(query)
+    localizacoes = sorted(parametros.get("localizacao", []))
+    inicio = parametros.get("inicio", [None])[0]
+    fim = parametros.get("fim", [None])[0]
+    inicio = date.fromisoformat(inicio) if inicio else None
+    fim = date.fromisoformat(fim) if fim else None
+    if (inicio is None) != (fim is None):
+        raise ValueError("Indicar 'inicio' e 'fim' em conjunto.")
+    return localizacoes, inicio, fim
+
+
+def tabela_para_registos(df):
+    df = df.reset_index() if df.index.name is not None else df
+    df.columns = [str(c) for c in df.columns]
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def listar_armadilhas(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql_query(
+            """
+            SELECT
+                a.id AS "ID Armadilha",
+                a.nome AS "Nome Armadilha",
+                a.localidade AS "Localização",
+                a.latitude AS "Latitude",
+                a.longitude AS "Longitude",
+                p.placa_id AS "Placa ID",
+                p.data_colocacao AS "Data Colocação",
+                p.ativa AS "Ativa"
+            FROM armadilhas a
+            LEFT JOIN placas p ON p.id_armadilha = a.id
+            ORDER BY a.id, p.data_colocacao
+            """,
+            conn,
+        )
+    finally:
+        conn.close()
+
+
+# Cálculo de cada recurso a partir do snapshot e dos filtros
+def calcular(recurso, snapshot, db_path, localizacoes, inicio, fim):
+    if recurso == "armadilhas":
+        df = listar_armadilhas(db_path)
+        if localizacoes:
+            df = df[df["Localização"].isin(localizacoes)]
+        return tabela_para_registos(df)
+
+    if snapshot.cubo is None:
+        return []
+    filtros = (localizacoes, inicio, fim)
+
+    if recurso == "curva":
+        df_daily = snapshot.cubo.curva_diaria(*filtros)
+        df_daily["Data"] = df_daily["Data"].map(date.isoformat)
+        return tabela_para_registos(df_daily)
+    if recurso == "placas":
+        return tabela_para_registos(snapshot.cubo.por_placa(*filtros))
+    if recurso == "localizacoes":
+        return tabela_para_registos(snapshot.cubo.por_localizacao(*filtros))
+    if recurso == "classes":
+        return tabela_para_registos(snapshot.cubo.totais_por_classe(*filtros))
+    raise KeyError(recurso)
+
+
+RECURSOS = {"curva", "placas", "localizacoes", "classes", "armadilhas"}
+EXPORTACOES = {"moscas.csv": "csv", "moscas.parquet": "parquet"}
+
+
+# Sem snapshot: a primeira ingestão falhou ou ainda não terminou (resposta 503)
+class DadosIndisponiveis(Exception):
+    pass
+
+
+class ServicoAPI:
+    def __init__(self, ingestor, db_path):
+        self.ingestor = ingestor
+        self.db_path = db_path
+        self._respostas = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Versão e data de modificação dos dados de um recurso: as armadilhas são
+    # lidas de placas.db em cada pedido; os outros recursos vêm do snapshot
+    def versao(self, recurso, snapshot):
+        if recurso == "armadilhas":
+            try:
+                stat = self.db_path.stat()
+            except FileNotFoundError:
+                return None, snapshot.modificado_em
+            return (stat.st_mtime_ns, stat.st_size), stat.st_mtime
+        return snapshot.versao_dados, snapshot.modificado_em
+
+    def snapshot(self):
+        snapshot = self.ingestor.aguardar_snapshot(ingestao.TEMPO_ESPERA)
+        if snapshot is None:
+            raise DadosIndisponiveis(self.ingestor.mensagem_indisponivel())
+        return snapshot
+
+    # Devolve (corpo, etag, last_modified) — calculado uma vez por versão dos dados e pedido
+    def resposta(self, recurso, query):
+        snapshot = self.snapshot()
+        localizacoes, inicio, fim = ler_filtros(query)
+        versao, modificado_em = self.versao(recurso, snapshot)
+        chave = (versao, recurso, tuple(localizacoes), inicio, fim)
+
+        with self._lock:
+            if chave in self._respostas:
+                self._respostas.move_to_end(chave)
+                return self._respostas[chave]
+
+        dados = calcular(recurso, snapshot, self.db_path, localizacoes, inicio, fim)
+        corpo = json.dumps({"dados": dados}, ensure_ascii=False).encode("utf-8")
+        etag = f'"{hashlib.sha1(corpo).hexdigest()[:20]}"'
+        last_modified = formatdate(modificado_em, usegmt=True)
+
+        with self._lock:
+            self._respostas[chave] = (corpo, etag, last_modified)
+            while len(self._respostas) > MAX_RESPOSTAS_CACHE:
+                self._respostas.popitem(last=False)
+        return corpo, etag, last_modified
+
+    # Blocos (DataFrames) das moscas filtradas: do Parquet com o motor DuckDB, ou do ficheiro mestre
+    def blocos_moscas(self, query):
+        snapshot = self.snapshot()
+        filtros = ler_filtros(query)
+        if snapshot.parquet_moscas is not None:
+            colunas = [c for c in consultas_duckdb.colunas(snapshot.parquet_moscas) if c in exportacao.COLUNAS_MOSCAS]
+            return consultas_duckdb.blocos_moscas(snapshot.parquet_moscas, colunas, *filtros)
+        if snapshot.n_moscas == 0:
+            return iter([pd.DataFrame(columns=exportacao.COLUNAS_MOSCAS)])
+        df = agregacoes.filtrar(snapshot.df_mestre, *filtros)
+        return exportacao.iterar_blocos(df, [c for c in df.columns if c in exportacao.COLUNAS_MOSCAS])
+
+
+def criar_handler(servico):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # necessário para Transfer-Encoding: chunked
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            recurso = url.path.strip("/")
+            if recurso in EXPORTACOES:
+                self.enviar_exportacao(recurso, EXPORTACOES[recurso], url.query)
+                return
+            if recurso not in RECURSOS:
+                self.enviar_erro(404, f"Recurso desconhecido: '{recurso}'.")
+                return
+
+            try:
+                corpo, etag, last_modified = servico.resposta(recurso, url.query)
+            except ValueError as e:
+                self.enviar_erro(400, str(e))
+                return
+            except DadosIndisponiveis as e:
+                self.enviar_erro(503, str(e))
+                return
+
+            if self.nao_modificado(etag, last_modified):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        # If-None-Match tem prioridade sobre If-Modified-Since (RFC 9110)
+        def nao_modificado(self, etag, last_modified):
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match is not None:
+                return etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+            if_modified_since = self.headers.get("If-Modified-Since")
+            if if_modified_since:
+                try:
+                    return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+        # Moscas filtradas, enviadas bloco a bloco à medida que são geradas
+        def enviar_exportacao(self, nome, formato, query):
+            if formato == "parquet" and not exportacao.parquet_disponivel():
+                self.enviar_erro(501, "Exportação Parquet requer o pacote 'pyarrow'.")
+                return
+            try:
+                blocos = servico.blocos_moscas(query)
+            except ValueError as e:
+                self.enviar_erro(400, str(e))
+                return
+            except DadosIndisponiveis as e:
+                self.enviar_erro(503, str(e))
+                return
+
+            gerar, mime = exportacao.FORMATOS[formato]
+            self.send_response(200)
+            self.send_header("Content-Type", mime)
+            self.send_header("Content-Disposition", f'attachment; filename="{nome}"')
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            for parte in gerar(blocos):
+                if parte:
+                    self.wfile.write(f"{len(parte):X}\r\n".encode("ascii") + parte + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def enviar_erro(self, codigo, mensagem):
+            corpo = json.dumps({"erro": mensagem}, ensure_ascii=False).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+    return Handler
+
+
+def servir(data_dir=BASE_DIR, host="127.0.0.1", porta=PORTA):
+    data_dir = pathlib.Path(data_dir)
+    ingestor = ingestao.iniciar(data_dir)
+    servico = ServicoAPI(ingestor, data_dir / "placas.db")
+    servidor = ThreadingHTTPServer((host, porta), criar_handler(servico))
+    print(f"API de capturas em http://{host}:{porta}/")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        ingestor.parar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API JSON local com as agregações do dashboard.")
+    parser.add_argument("--dados", default=str(BASE_DIR), help="Pasta com dashboard_data.xlsx, placas.db e results.csv")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=PORTA)
+    args = parser.parse_args()
+    servir(args.dados, args.host, args.porta)
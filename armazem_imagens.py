@@ -0,0 +1,160 @@
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import re
+import tempfile
+
+# ---------------------------------------------------
+# Armazém de imagens endereçado por conteúdo
+# ---------------------------------------------------
+# As imagens de deteção de uma mesma fotografia (_det_femea, _det_macho,
+# _det_mosca) são muitas vezes idênticas byte a byte. Cada conteúdo é
+# guardado uma única vez em 'blobs/<aa>/<sha256>.jpg' e um manifesto
+# associa cada nome de ficheiro ao seu blob. Os ficheiros soltos que ainda
+# não foram migrados continuam a ser encontrados pelo nome.
+
+BASE_DIR = pathlib.Path(__file__).parent.resolve()
+PASTA_DETECOES = BASE_DIR / "detections_output"
+
+NOME_MANIFESTO = "manifesto.json"
+PASTA_BLOBS = "blobs"
+VERSAO_MANIFESTO = 1
+
+PADRAO_DETECAO = re.compile(r"^(?P<imagem>.+)_det_(?P<classe>femea|macho|mosca)\.jpg$")
+
+
+def nome_detecao(imagem, classe):
+    return f"{imagem}_det_{classe}.jpg"
+
+
+def hash_ficheiro(caminho, tamanho_bloco=1 << 20):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def caminho_blob(pasta, sha):
+    return pathlib.Path(pasta) / PASTA_BLOBS / sha[:2] / f"{sha}.jpg"
+
+
+# Escrita atómica: ficheiro temporário na mesma pasta + os.replace
+def escrever_atomico(destino, dados):
+    destino = pathlib.Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=destino.parent, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(dados)
+        os.replace(tmp, destino)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# ---------------------------------------------------
+# Manifesto
+# ---------------------------------------------------
+def carregar_manifesto(pasta=PASTA_DETECOES):
+    caminho = pathlib.Path(pasta) / NOME_MANIFESTO
+    if not caminho.exists():
+        return {}
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f).get("entradas", {})
+
+
+def guardar_manifesto(entradas, pasta=PASTA_DETECOES):
+    conteudo = {"versao": VERSAO_MANIFESTO, "entradas": dict(sorted(entradas.items()))}
+    escrever_atomico(
+        pathlib.Path(pasta) / NOME_MANIFESTO,
+        json.dumps(conteudo, indent=1).encode("utf-8"),
+    )
+
+
+# Caminho a ler para (imagem, classe): blob do manifesto ou ficheiro solto
+def resolver(manifesto, imagem, classe, pasta=PASTA_DETECOES):
+    nome = nome_detecao(imagem, classe)
+    entrada = manifesto.get(nome)
+    if entrada is not None:
+        return caminho_blob(pasta, entrada["sha256"])
+    return pathlib.Path(pasta) / nome
+
+
+# ---------------------------------------------------
+# Escrita de novas deteções (usada pelo processamento)
+# ---------------------------------------------------
+def guardar_detecao(manifesto, imagem, classe, dados, pasta=PASTA_DETECOES):
+    sha = hashlib.sha256(dados).hexdigest()
+    destino = caminho_blob(pasta, sha)
+    if not destino.exists():
+        escrever_atomico(destino, dados)
+    manifesto[nome_detecao(imagem, classe)] = {"sha256": sha, "tamanho": len(dados)}
+    return sha
+
+
+# ---------------------------------------------------
+# Migração da pasta existente
+# ---------------------------------------------------
+# Os ficheiros soltos só são apagados depois de todos os blobs estarem
+# copiados e de o manifesto estar gravado: uma migração interrompida deixa,
+# no pior caso, blobs sem entrada (ignorados) ou originais por apagar (que a
+# migração seguinte volta a encontrar), nunca imagens perdidas.
+def migrar(pasta=PASTA_DETECOES, simular=False, manter_originais=False):
+    pasta = pathlib.Path(pasta)
+    manifesto = carregar_manifesto(pasta)
+
+    n_ficheiros = 0
+    bytes_originais = 0
+    blobs_novos = {}
+    migrados = []
+
+    for ficheiro in sorted(pasta.glob("*_det_*.jpg")):
+        if not PADRAO_DETECAO.match(ficheiro.name):
+            continue
+
+        sha = hash_ficheiro(ficheiro)
+        tamanho = ficheiro.stat().st_size
+        n_ficheiros += 1
+        bytes_originais += tamanho
+
+        destino = caminho_blob(pasta, sha)
+        if not simular:
+            if not destino.exists():
+                escrever_atomico(destino, ficheiro.read_bytes())
+            manifesto[ficheiro.name] = {"sha256": sha, "tamanho": tamanho}
+            migrados.append(ficheiro)
+
+        blobs_novos.setdefault(sha, tamanho)
+
+    if not simular:
+        guardar_manifesto(manifesto, pasta)
+        if not manter_originais:
+            for ficheiro in migrados:
+                ficheiro.unlink()
+
+    bytes_blobs = sum(blobs_novos.values())
+    return {
+        "ficheiros": n_ficheiros,
+        "blobs": len(blobs_novos),
+        "bytes_originais": bytes_originais,
+        "bytes_blobs": bytes_blobs,
+        "bytes_poupados": bytes_originais - bytes_blobs,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra detections_output para o armazém endereçado por conteúdo.")
+    parser.add_argument("--pasta", default=str(PASTA_DETECOES))
+    parser.add_argument("--simular", action="store_true", help="Só calcula a poupança, sem alterar ficheiros")
+    parser.add_argument("--manter-originais", action="store_true", help="Copia para o armazém sem apagar os ficheiros soltos")
+    args = parser.parse_args()
+
+    resumo = migrar(args.pasta, simular=args.simular, manter_originais=args.manter_originais)
+    print(
+        f"{resumo['ficheiros']} ficheiros -> {resumo['blobs']} blobs "
+        f"({resumo['bytes_originais'] / 1e6:.1f} MB -> {resumo['bytes_blobs'] / 1e6:.1f} MB, "
+        f"poupança de {resumo['bytes_poupados'] / 1e6:.1f} MB)"
+    )
@@ -0,0 +1,197 @@
+import argparse
+import hashlib
+import json
+import mmap
+import pathlib
+import re
+import struct
+import threading
+import zipfile
+from datetime import date, datetime, timedelta
+
+import armazem_imagens
+import metricas
+
+# ---------------------------------------------------
+# Arquivo de imagens antigas em ficheiros por semana
+# ---------------------------------------------------
+# As imagens de semanas passadas são empacotadas em ficheiros ZIP sem
+# compressão (os JPEG já estão comprimidos), um por semana ISO, com um
+# índice ao lado (nome -> offset e tamanho dos dados). A galeria lê as
+# imagens arquivadas com um mmap do ficheiro e o offset do índice; as
+# imagens recentes continuam soltas em detections_output.
+
+PASTA_ARQUIVO = "arquivo"
+SEMANAS_SOLTAS = 4  # semanas recentes que ficam como ficheiros soltos
+
+PADRAO_DATA = re.compile(r"^image_(\d{8})")
+
+
+def semana_iso(nome):
+    correspondencia = PADRAO_DATA.match(nome)
+    if correspondencia is None:
+        return None
+    dia = datetime.strptime(correspondencia.group(1), "%Y%m%d").date()
+    ano, semana, _ = dia.isocalendar()
+    return f"{ano}-S{semana:02d}"
+
+
+def caminho_indice(shard):
+    return shard.with_suffix(".idx.json")
+
+
+# Posição dos dados de um membro (ZIP_STORED): cabeçalho local + nome + extra
+def offset_dados(f, info):
+    f.seek(info.header_offset)
+    cabecalho = f.read(30)
+    n_nome, n_extra = struct.unpack("<HH", cabecalho[26:30])
+    return info.header_offset + 30 + n_nome + n_extra
+
+
+# ---------------------------------------------------
+# Empacotar semanas antigas
+# ---------------------------------------------------
+def arquivar(pasta=armazem_imagens.PASTA_DETECOES, semanas_soltas=SEMANAS_SOLTAS, hoje=None, simular=False):
+    pasta = pathlib.Path(pasta)
+    hoje = hoje or date.today()
+    limite = hoje - timedelta(weeks=semanas_soltas)
+    ano_limite, semana_limite, _ = limite.isocalendar()
+    semana_limite = f"{ano_limite}-S{semana_limite:02d}"
+
+    manifesto = armazem_imagens.carregar_manifesto(pasta)
+
+    # Nomes de deteção conhecidos: ficheiros soltos e entradas do manifesto
+    nomes = {f.name for f in pasta.glob("*_det_*.jpg")} | set(manifesto)
+    por_semana = {}
+    for nome in nomes:
+        semana = semana_iso(nome)
+        if semana is not None and semana < semana_limite:
+            por_semana.setdefault(semana, []).append(nome)
+
+    pasta_arquivo = pasta / PASTA_ARQUIVO
+    resumo = {}
+    for semana, nomes_semana in sorted(por_semana.items()):
+        shard = pasta_arquivo / f"{semana}.zip"
+        resumo[semana] = len(nomes_semana)
+        if simular:
+            continue
+        pasta_arquivo.mkdir(exist_ok=True)
+        empacotar_semana(pasta, shard, sorted(nomes_semana), manifesto)
+
+    if not simular and por_semana:
+        armazem_imagens.guardar_manifesto(manifesto, pasta)
+        remover_blobs_orfaos(pasta, manifesto)
+    return resumo
+
+
+def empacotar_semana(pasta, shard, nomes, manifesto):
+    indice = {}
+    if shard.exists():
+        existentes = json.loads(caminho_indice(shard).read_text(encoding="utf-8"))
+        indice = {nome: entrada["membro"] for nome, entrada in existentes.items()}
+
+    # Cada conteúdo é guardado uma vez por ficheiro (membro = sha256)
+    with zipfile.ZipFile(shard, "a", compression=zipfile.ZIP_STORED) as z:
+        membros = set(z.namelist())
+        for nome in nomes:
+            origem = armazem_imagens.resolver(manifesto, *nome_para_chave(nome), pasta)
+            if nome in indice or not origem.exists():
+                continue
+            dados = origem.read_bytes()
+            sha = manifesto[nome]["sha256"] if nome in manifesto else hashlib.sha256(dados).hexdigest()
+            membro = f"{sha}.jpg"
+            if membro not in membros:
+                z.writestr(zipfile.ZipInfo(membro, date_time=(1980, 1, 1, 0, 0, 0)), dados)
+                membros.add(membro)
+            indice[nome] = membro
+
+    # Converter membros em (offset, tamanho) depois de fechar o ficheiro
+    with zipfile.ZipFile(shard) as z, open(shard, "rb") as f:
+        infos = {info.filename: info for info in z.infolist()}
+        indice_final = {}
+        for nome, membro in indice.items():
+            info = infos[membro]
+            indice_final[nome] = {"membro": membro, "offset": offset_dados(f, info), "tamanho": info.file_size}
+
+    armazem_imagens.escrever_atomico(
+        caminho_indice(shard), json.dumps(indice_final, indent=1, sort_keys=True).encode("utf-8")
+    )
+
+    # Só depois do índice escrito é que os originais saem da pasta
+    for nome in nomes:
+        solto = pasta / nome
+        if solto.exists():
+            solto.unlink()
+        manifesto.pop(nome, None)
+
+
+def nome_para_chave(nome):
+    correspondencia = armazem_imagens.PADRAO_DETECAO.match(nome)
+    return correspondencia.group("imagem"), correspondencia.group("classe")
+
+
+def remover_blobs_orfaos(pasta, manifesto):
+    usados = {entrada["sha256"] for entrada in manifesto.values()}
+    for blob in (pasta / armazem_imagens.PASTA_BLOBS).glob("*/*.jpg"):
+        if blob.stem not in usados:
+            blob.unlink()
+
+
+# ---------------------------------------------------
+# Leitura (mmap + offset)
+# ---------------------------------------------------
+class LeitorArquivo:
+    def __init__(self, pasta=armazem_imagens.PASTA_DETECOES):
+        self.pasta_arquivo = pathlib.Path(pasta) / PASTA_ARQUIVO
+        self._indice = {}
+        self._mapas = {}
+        self._lock = threading.Lock()
+        for idx in sorted(self.pasta_arquivo.glob("*.idx.json")):
+            shard = idx.with_name(idx.name.replace(".idx.json", ".zip"))
+            for nome, entrada in json.loads(idx.read_text(encoding="utf-8")).items():
+                self._indice[nome] = (shard, entrada["offset"], entrada["tamanho"])
+
+    def __contains__(self, nome):
+        return nome in self._indice
+
+    def nomes(self):
+        return self._indice.keys()
+
+    # Chave estável de um nome arquivado (o conteúdo de um shard não muda)
+    def localizacao(self, nome):
+        return self._indice.get(nome)
+
+    # Chamar com o lock (o mapa não pode ser fechado a meio de uma leitura)
+    def _mapa(self, shard):
+        mapa = self._mapas.get(shard)
+        if mapa is None:
+            with open(shard, "rb") as f:
+                mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapas[shard] = mapa
+        return mapa
+
+    def ler(self, nome):
+        shard, offset, tamanho = self._indice[nome]
+        metricas.BYTES_DETECOES.incrementar(tamanho, origem="arquivo")
+        with self._lock:
+            return self._mapa(shard)[offset:offset + tamanho]
+
+    # Fecha os mmaps abertos; uma leitura posterior volta a abrir o shard
+    def fechar(self):
+        with self._lock:
+            for mapa in self._mapas.values():
+                mapa.close()
+            self._mapas = {}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Empacota as imagens de deteção de semanas antigas.")
+    parser.add_argument("--pasta", default=str(armazem_imagens.PASTA_DETECOES))
+    parser.add_argument("--semanas-soltas", type=int, default=SEMANAS_SOLTAS, help="Semanas recentes que ficam soltas")
+    parser.add_argument("--simular", action="store_true", help="Só mostra o que seria arquivado")
+    args = parser.parse_args()
+
+    resumo = arquivar(args.pasta, args.semanas_soltas, simular=args.simular)
+    for semana, n in resumo.items():
+        print(f"{semana}: {n} imagens")
+    print(f"Total: {sum(resumo.values())} imagens em {len(resumo)} semanas")
@@ -0,0 +1,124 @@
+import logging
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metricas
+
+# ---------------------------------------------------
+# Cache de imagens limitada em bytes + pré-carregamento
+# ---------------------------------------------------
+# Partilhada por todas as sessões do processo, com limite de memória e
+# remoção LRU. Os ficheiros são indexados por caminho e data de modificação,
+# pelo que as mesmas capturas vistas por vários utilizadores só são lidas do
+# disco uma vez. Enquanto uma página da galeria está a ser vista, as imagens
+# da página seguinte são lidas e reduzidas em segundo plano.
+#
+# O limite pode ser definido com a variável de ambiente CACHE_IMAGENS_MB.
+
+LIMITE_BYTES = int(os.environ.get("CACHE_IMAGENS_MB", 256)) * 1024 * 1024
+N_WORKERS_PRE_CARREGAMENTO = 2
+
+log = logging.getLogger(__name__)
+
+
+class CacheBytes:
+    def __init__(self, limite_bytes=LIMITE_BYTES):
+        self.limite_bytes = limite_bytes
+        self._entradas = OrderedDict()
+        self._tamanho = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+
+    def obter(self, chave):
+        with self._lock:
+            dados = self._entradas.get(chave)
+            if dados is not None:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+            else:
+                self.falhas += 1
+            return dados
+
+    def guardar(self, chave, dados):
+        # Entradas maiores do que o limite não são guardadas
+        if len(dados) > self.limite_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._tamanho -= len(anterior)
+            self._entradas[chave] = dados
+            self._tamanho += len(dados)
+            while self._tamanho > self.limite_bytes:
+                _, removido = self._entradas.popitem(last=False)
+                self._tamanho -= len(removido)
+                self.remocoes += 1
+
+    def __contains__(self, chave):
+        with self._lock:
+            return chave in self._entradas
+
+    # Devolve da cache ou calcula (e guarda) com a função indicada
+    def obter_ou_calcular(self, chave, calcular):
+        dados = self.obter(chave)
+        if dados is None:
+            dados = calcular()
+            self.guardar(chave, dados)
+        return dados
+
+    # Conteúdo de um ficheiro, indexado por caminho e data de modificação
+    def ler_ficheiro(self, caminho):
+        caminho = pathlib.Path(caminho)
+        chave = ("ficheiro", str(caminho), caminho.stat().st_mtime_ns)
+        return self.obter_ou_calcular(chave, lambda: ler_bytes(caminho))
+
+    def estatisticas(self):
+        with self._lock:
+            pedidos = self.acertos + self.falhas
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._tamanho,
+                "limite_bytes": self.limite_bytes,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "remocoes": self.remocoes,
+                "taxa_acerto": self.acertos / pedidos if pedidos else 0.0,
+            }
+
+
+# Conteúdo de um ficheiro de detections_output/ (conta os bytes lidos do disco)
+def ler_bytes(caminho):
+    dados = pathlib.Path(caminho).read_bytes()
+    metricas.BYTES_DETECOES.incrementar(len(dados), origem="ficheiro")
+    return dados
+
+
+class PreCarregador:
+    def __init__(self, cache, n_workers=N_WORKERS_PRE_CARREGAMENTO):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="pre_carregamento")
+        self._pendentes = set()
+        self._lock = threading.Lock()
+
+    # tarefas: sequência de (chave, função sem argumentos que devolve bytes)
+    def pre_carregar(self, tarefas):
+        for chave, calcular in tarefas:
+            with self._lock:
+                if chave in self._pendentes or chave in self.cache:
+                    continue
+                self._pendentes.add(chave)
+            self._executor.submit(self._executar, chave, calcular)
+
+    def _executar(self, chave, calcular):
+        try:
+            self.cache.obter_ou_calcular(chave, calcular)
+        except Exception as e:
+            log.warning("Erro no pré-carregamento de %r: %s", chave, e)
+        finally:
+            with self._lock:
+                self._pendentes.discard(chave)
@@ -0,0 +1,121 @@
+import contextlib
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import shutil
+import threading
+
+import armazem_imagens
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem bloqueio entre processos
+    fcntl = None
+
+# ---------------------------------------------------
+# Cache em disco partilhada entre processos
+# ---------------------------------------------------
+# Com vários processos do dashboard atrás de um proxy, cada um teria a sua
+# ingestão e as suas caches em memória. Esta cache guarda em disco os dados
+# já lidos e os agregados calculados, numa pasta por versão dos dados
+# (<pasta>/<versao>/<sha1 da chave>.pkl). As escritas são atómicas (ficheiro
+# temporário + rename), pelo que um processo nunca lê um ficheiro a meio.
+# Um bloqueio por ficheiro (flock) garante que só um processo faz a ingestão
+# de cada versão; os outros esperam e leem o resultado.
+#
+# A pasta é definida com a variável de ambiente DASHBOARD_CACHE_PARTILHADA.
+
+VERSOES_MANTIDAS = 2  # versões dos dados mantidas em disco
+
+log = logging.getLogger(__name__)
+
+
+class CachePartilhada:
+    def __init__(self, pasta, versoes_mantidas=VERSOES_MANTIDAS):
+        self.pasta = pathlib.Path(pasta)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        self.versoes_mantidas = versoes_mantidas
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+
+    def caminho(self, versao, chave):
+        nome = hashlib.sha1(repr(chave).encode("utf-8")).hexdigest()
+        return self.pasta / str(versao) / f"{nome}.pkl"
+
+    def obter(self, versao, chave):
+        try:
+            with open(self.caminho(versao, chave), "rb") as f:
+                valor = pickle.load(f)
+        except FileNotFoundError:
+            valor = None
+        except Exception as e:
+            log.warning("Entrada da cache partilhada ignorada (%r): %s", chave, e)
+            valor = None
+        with self._lock:
+            if valor is None:
+                self.falhas += 1
+            else:
+                self.acertos += 1
+        return valor
+
+    def guardar(self, versao, chave, valor):
+        armazem_imagens.escrever_atomico(
+            self.caminho(versao, chave), pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+
+    def obter_ou_calcular(self, versao, chave, calcular):
+        valor = self.obter(versao, chave)
+        if valor is None:
+            valor = calcular()
+            self.guardar(versao, chave, valor)
+        return valor
+
+    # Bloqueio exclusivo entre processos (ex.: só um processo faz a ingestão)
+    @contextlib.contextmanager
+    def bloqueio(self, nome):
+        with open(self.pasta / f".bloqueio_{nome}", "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # Remove as versões mais antigas, mantendo a atual e as mais recentes
+    def limpar(self, versao_atual):
+        versoes = sorted(
+            (p for p in self.pasta.iterdir() if p.is_dir() and p.name != str(versao_atual)),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True,
+        )
+        for antiga in versoes[self.versoes_mantidas - 1:]:
+            shutil.rmtree(antiga, ignore_errors=True)
+
+    # Acertos e falhas deste processo; entradas e bytes de todas as versões em disco
+    def estatisticas(self):
+        ficheiros = list(self.pasta.glob("*/*.pkl"))
+        tamanho = 0
+        for ficheiro in ficheiros:
+            try:
+                tamanho += ficheiro.stat().st_size
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            pedidos = self.acertos + self.falhas
+            return {
+                "entradas": len(ficheiros),
+                "bytes": tamanho,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / pedidos if pedidos else 0.0,
+            }
+
+
+# Cache configurada pelo ambiente (None se não estiver definida)
+def do_ambiente():
+    pasta = os.environ.get("DASHBOARD_CACHE_PARTILHADA")
+    return CachePartilhada(pasta) if pasta else None
@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import pathlib
+import random
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import date
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.sync.client import connect
+
+import dados_sinteticos
+import servir
+
+# ---------------------------------------------------
+# Teste de carga com várias sessões em simultâneo
+# ---------------------------------------------------
+# Arranca o dashboard com "streamlit run" (ou usa um servidor já a correr,
+# com --url) e liga-lhe N clientes WebSocket, cada um na sua thread, que
+# falam o protocolo do browser: pedem reruns com o estado dos widgets e
+# esperam pela mensagem de fim do script. As sessões correm em simultâneo
+# no servidor (cada script na sua thread), a partilhar as caches e o worker
+# de ingestão. Cada sessão faz uma sequência aleatória de interações
+# (filtros, galeria, tabelas); mudar um widget dentro de um fragmento pede
+# só o rerun do fragmento, como no browser.
+#
+# O tempo de cada rerun vai do pedido até ao fim do script no servidor (as
+# imagens que o browser descarrega a seguir não contam). Para cada número
+# de sessões o relatório indica reruns por segundo, p50/p95 do tempo de
+# rerun e a memória do processo do servidor: a RSS com as sessões ainda
+# ligadas menos a RSS antes da ronda, por sessão. A RSS inclui lixo ainda
+# não recolhido, pelo que é uma estimativa; só é medida quando o servidor é
+# arrancado aqui.
+
+# Peso de cada tipo de interação na sequência de uma sessão
+INTERACOES = {
+    "filtrar_localizacao": 3,
+    "limpar_filtros": 1,
+    "filtrar_datas": 2,
+    "pagina_galeria": 3,
+    "classes_galeria": 1,
+    "pagina_tabela": 2,
+}
+
+WIDGETS = ("multiselect", "number_input", "date_input")
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return None
+
+
+# ---------------------------------------------------
+# Cliente de uma sessão (protocolo WebSocket do Streamlit)
+# ---------------------------------------------------
+class Cliente:
+    def __init__(self, ws, timeout):
+        self.ws = ws
+        self.timeout = timeout
+        self.widgets = {}  # id -> (tipo, proto do elemento, id do fragmento ou "")
+        self.estado = {}   # id -> WidgetState enviado em cada rerun
+
+    # Pede um rerun (da página ou de um fragmento) e espera pelo fim do
+    # script; devolve (segundos, exceções mostradas na página)
+    def rerun(self, fragmento=""):
+        pedido = BackMsg()
+        pedido.rerun_script.query_string = ""
+        pedido.rerun_script.fragment_id = fragmento
+        pedido.rerun_script.widget_states.widgets.extend(self.estado.values())
+        if not fragmento:
+            self.widgets.clear()
+
+        erros = []
+        inicio = time.perf_counter()
+        self.ws.send(pedido.SerializeToString())
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(self.ws.recv(timeout=self.timeout))
+            tipo = msg.WhichOneof("type")
+            if tipo == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                elemento = msg.delta.new_element
+                tipo_elemento = elemento.WhichOneof("type")
+                if tipo_elemento == "exception":
+                    erros.append(elemento.exception.message)
+                elif tipo_elemento in WIDGETS:
+                    proto = getattr(elemento, tipo_elemento)
+                    self.widgets[proto.id] = (tipo_elemento, proto, msg.delta.fragment_id)
+            # Um st.rerun() no script termina o run e começa logo outro
+            elif tipo == "script_finished" and msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return time.perf_counter() - inicio, erros
+
+    # Widget ativo pela chave (prefixo) ou pelo rótulo: (tipo, proto, fragmento) ou None
+    def widget(self, prefixo=None, rotulo=None):
+        for tipo, proto, fragmento in self.widgets.values():
+            chave = proto.id.split("-", 2)[-1]  # "$$ID-<hash>-<chave>"
+            if proto.disabled:
+                continue
+            if (prefixo is not None and chave.startswith(prefixo)) or (rotulo is not None and proto.label == rotulo):
+                return tipo, proto, fragmento
+        return None
+
+    # Guarda o valor a enviar no próximo rerun; devolve o fragmento a correr
+    def definir(self, widget, valor):
+        tipo, proto, fragmento = widget
+        estado = WidgetState(id=proto.id)
+        if tipo == "number_input":
+            estado.double_value = valor
+        else:
+            estado.string_array_value.data.extend(valor)
+        self.estado[proto.id] = estado
+        return fragmento
+
+
+# Aplica uma interação a uma sessão; devolve o fragmento a correr ("" para
+# a página), ou None se o widget não existir
+def interagir(cliente, interacao, rng):
+    if interacao == "filtrar_localizacao":
+        filtro = cliente.widget("filtro_localizacoes")
+        opcoes = list(filtro[1].options)
+        return cliente.definir(filtro, rng.sample(opcoes, k=rng.randint(1, min(2, len(opcoes)))))
+    if interacao == "limpar_filtros":
+        cliente.definir(cliente.widget("filtro_localizacoes"), [])
+        return cliente.definir(cliente.widget("filtro_datas"), [])
+    if interacao == "filtrar_datas":
+        # Um intervalo aleatório com metade do histórico
+        datas = cliente.widget("filtro_datas")
+        minimo, maximo = date.fromisoformat(datas[1].min), date.fromisoformat(datas[1].max)
+        metade = (maximo - minimo) / 2
+        inicio = minimo + metade * rng.random()
+        return cliente.definir(datas, [inicio.isoformat(), (inicio + metade).isoformat()])
+    if interacao == "classes_galeria":
+        classes = cliente.widget(rotulo="Classes a desenhar")
+        if classes is None:
+            return None
+        opcoes = list(classes[1].options)
+        return cliente.definir(classes, rng.sample(opcoes, k=rng.randint(1, len(opcoes))))
+
+    prefixo = {"pagina_galeria": "pagina_galeria_", "pagina_tabela": "pagina_resumo_diario_"}[interacao]
+    pagina = cliente.widget(prefixo)
+    if pagina is None:
+        return None
+    return cliente.definir(pagina, float(rng.randint(int(pagina[1].min), int(pagina[1].max))))
+
+
+def sessao(url, n_interacoes, semente, timeout, latencias, erros, ligadas, terminadas, libertar):
+    rng = random.Random(semente)
+    try:
+        with connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout) as ws:
+            cliente = Cliente(ws, timeout)
+            ligadas.wait()
+            try:
+                correr_interacoes(cliente, n_interacoes, rng, latencias, erros)
+            finally:
+                # A sessão fica ligada até a ronda medir a memória
+                terminadas.release()
+                libertar.wait()
+            return
+    except Exception as e:
+        erros.append(("ligar", repr(e)))
+    terminadas.release()
+
+
+def correr_interacoes(cliente, n_interacoes, rng, latencias, erros):
+    tipos, pesos = zip(*INTERACOES.items())
+    interacoes = ["abrir"] + [rng.choices(tipos, pesos)[0] for _ in range(n_interacoes)]
+    for interacao in interacoes:
+        try:
+            fragmento = "" if interacao == "abrir" else interagir(cliente, interacao, rng)
+            if fragmento is None:
+                continue
+            segundos, excecoes = cliente.rerun(fragmento)
+            latencias.append((interacao, segundos))
+            erros.extend((interacao, mensagem) for mensagem in excecoes)
+        except Exception as e:
+            erros.append((interacao, repr(e)))
+
+
+def percentil_ms(tempos, q):
+    return round(float(np.percentile(tempos, q)) * 1000, 1)
+
+
+# Liga n_sessoes em simultâneo e devolve as métricas da ronda
+def ronda(url, n_sessoes, n_interacoes, semente, timeout, pid=None):
+    latencias, erros = [], []
+    ligadas = threading.Barrier(n_sessoes + 1, timeout=timeout)
+    terminadas = threading.Semaphore(0)
+    libertar = threading.Event()
+    threads = [
+        threading.Thread(
+            target=sessao,
+            args=(url, n_interacoes, semente + i, timeout, latencias, erros, ligadas, terminadas, libertar),
+            daemon=True,
+        )
+        for i in range(n_sessoes)
+    ]
+    rss_inicio = rss_mb(pid) if pid else None
+    for t in threads:
+        t.start()
+    try:
+        ligadas.wait()
+    except threading.BrokenBarrierError:
+        pass  # alguma sessão não ligou (fica nos erros)
+    inicio = time.perf_counter()
+    for _ in threads:
+        terminadas.acquire()
+    duracao = time.perf_counter() - inicio
+    rss_fim = rss_mb(pid) if pid else None
+    libertar.set()
+    for t in threads:
+        t.join()
+
+    tempos = np.array([segundos for _, segundos in latencias]) if latencias else np.zeros(1)
+    medir_rss = rss_inicio is not None and rss_fim is not None
+    return {
+        "sessoes": n_sessoes,
+        "reruns": len(latencias),
+        "duracao_s": round(duracao, 2),
+        "reruns_por_s": round(len(latencias) / duracao, 2) if duracao else 0.0,
+        "p50_ms": percentil_ms(tempos, 50),
+        "p95_ms": percentil_ms(tempos, 95),
+        "max_ms": round(float(tempos.max()) * 1000, 1),
+        "rss_mb": round(rss_fim, 1) if medir_rss else None,
+        "rss_ronda_mb": round(rss_fim - rss_inicio, 1) if medir_rss else None,
+        "rss_por_sessao_mb": round((rss_fim - rss_inicio) / n_sessoes, 2) if medir_rss else None,
+        "erros": erros[:5],
+        "n_erros": len(erros),
+    }
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Espera até o servidor responder ao health check
+def aguardar_servidor(porta, processo, timeout):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f"O servidor terminou (código {processo.returncode})")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{porta}/_stcore/health", timeout=2) as resposta:
+                if resposta.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"O servidor não respondeu em {timeout} s")
+
+
+def executar(url, sessoes, n_interacoes, semente=0, timeout=120, pid=None):
+    # Aquecimento: arranque do worker de ingestão e caches partilhadas
+    rss_base = rss_mb(pid) if pid else None
+    aquecimento = ronda(url, 1, 0, semente, timeout, pid)
+    rss_aquecido = rss_mb(pid) if pid else None
+
+    resultados = [ronda(url, n, n_interacoes, semente, timeout, pid) for n in sessoes]
+    return {
+        "rss_base_mb": rss_base and round(rss_base, 1),
+        "rss_aquecido_mb": rss_aquecido and round(rss_aquecido, 1),
+        "erros_aquecimento": aquecimento["erros"],
+        "rondas": resultados,
+    }
+
+
+# Arranca o dashboard sobre a pasta dos dados e corre as rondas
+def executar_com_servidor(dados, sessoes, n_interacoes, semente=0, timeout=120):
+    porta = porta_livre()
+    processo = servir.arrancar(porta, {**os.environ, "DASHBOARD_DADOS": str(dados)})
+    try:
+        aguardar_servidor(porta, processo, timeout)
+        url = f"ws://127.0.0.1:{porta}/_stcore/stream"
+        return executar(url, sessoes, n_interacoes, semente, timeout, processo.pid)
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+def formatar(valor):
+    return "-" if valor is None else valor
+
+
+def imprimir(relatorio):
+    print(
+        f"RSS do servidor antes do arranque: {formatar(relatorio['rss_base_mb'])} MB · "
+        f"depois do aquecimento: {formatar(relatorio['rss_aquecido_mb'])} MB"
+    )
+    for interacao, erro in relatorio["erros_aquecimento"]:
+        print(f"[aquecimento] erro em {interacao}: {erro}")
+    cabecalho = (
+        f"{'sessões':>8} {'reruns':>7} {'reruns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8} "
+        f"{'RSS MB':>8} {'MB/sessão':>10} {'erros':>6}"
+    )
+    print(cabecalho)
+    print("-" * len(cabecalho))
+    for r in relatorio["rondas"]:
+        print(
+            f"{r['sessoes']:>8} {r['reruns']:>7} {r['reruns_por_s']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+            f"{r['max_ms']:>8} {formatar(r['rss_mb']):>8} {formatar(r['rss_por_sessao_mb']):>10} {r['n_erros']:>6}"
+        )
+    for r in relatorio["rondas"]:
+        for interacao, erro in r["erros"]:
+            print(f"[{r['sessoes']} sessões] erro em {interacao}: {erro}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do dashboard com várias sessões em simultâneo.")
+    parser.add_argument("--dados", help="Pasta com os dados (por defeito gera dados sintéticos numa pasta temporária)")
+    parser.add_argument("--url", help="WebSocket de um servidor já a correr (ex.: ws://127.0.0.1:8501/_stcore/stream)")
+    parser.add_argument("--sessoes", default="1,2,4,8", help="Números de sessões a testar, separados por vírgulas")
+    parser.add_argument("--interacoes", type=int, default=10, help="Interações por sessão")
+    parser.add_argument("--armadilhas", type=int, default=20, help="Armadilhas nos dados sintéticos")
+    parser.add_argument("--dias", type=int, default=120, help="Dias de histórico nos dados sintéticos")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--timeout", type=int, default=120, help="Segundos máximos por rerun")
+    parser.add_argument("--json", help="Grava também o relatório neste ficheiro")
+    args = parser.parse_args()
+
+    sessoes = [int(n) for n in args.sessoes.split(",")]
+    if args.url:
+        relatorio = executar(args.url, sessoes, args.interacoes, args.semente, args.timeout)
+    else:
+        with tempfile.TemporaryDirectory(prefix="carga_") as tmp:
+            dados = args.dados
+            if dados is None:
+                dados = pathlib.Path(tmp) / "dados"
+                resumo = dados_sinteticos.gerar(dados, args.armadilhas, args.dias, semente=args.semente)
+                print("Dados sintéticos: " + ", ".join(f"{n} {nome}" for nome, n in resumo.items()))
+            relatorio = executar_com_servidor(dados, sessoes, args.interacoes, args.semente, args.timeout)
+    imprimir(relatorio)
+    if args.json:
+        pathlib.Path(args.json).write_text(json.dumps(relatorio, indent=1, default=str), encoding="utf-8")
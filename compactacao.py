@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------
+# Dados compactos para gráficos e tabelas
+# ---------------------------------------------------
+# O Streamlit envia cada DataFrame para o browser em Arrow. Antes de enviar,
+# ficam só as colunas que a vista mostra, com os tipos mais pequenos
+# possíveis (inteiros reduzidos, float32, texto repetido como categoria, que
+# no Arrow é um dicionário). A curva de voo é dobrada aqui para o formato
+# longo (Data, Classe, Contagem), em vez de um transform_fold no browser
+# sobre a tabela diária inteira. Os conjuntos de dados dos gráficos são
+# identificados pelo conteúdo, pelo que o mesmo filtro reutiliza o mesmo
+# conjunto.
+
+FRACAO_CATEGORIA = 0.5  # texto com menos de 50% de valores distintos passa a categoria
+
+
+def compactar(df, colunas=None):
+    if colunas is not None:
+        df = df[list(colunas)]
+    df = df.copy()
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_bool_dtype(serie):
+            continue
+        if pd.api.types.is_integer_dtype(serie) and not isinstance(serie.dtype, pd.api.extensions.ExtensionDtype):
+            sem_sinal = len(serie) > 0 and serie.min() >= 0
+            df[coluna] = pd.to_numeric(serie, downcast="unsigned" if sem_sinal else "integer")
+        elif pd.api.types.is_float_dtype(serie):
+            df[coluna] = serie.astype(np.float32)
+        elif (pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie)) and len(serie):
+            valores = serie.dropna()
+            # Datas (objetos date) ficam como estão: o Arrow guarda-as como date32
+            if len(valores) and isinstance(valores.iloc[0], str) and serie.nunique() <= FRACAO_CATEGORIA * len(serie):
+                df[coluna] = serie.astype("category")
+    return df
+
+
+# Curva diária em formato longo, já dobrada e compacta
+def curva_longa(df_daily, classes):
+    longa = df_daily.melt(id_vars="Data", value_vars=list(classes), var_name="Classe", value_name="Contagem")
+    longa["Classe"] = pd.Categorical(longa["Classe"], categories=list(classes))
+    return compactar(longa)
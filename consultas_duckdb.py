@@ -0,0 +1,339 @@
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import agregacoes
+import exportacao
+from agregacoes import CLASSES, NOMES_CLASSES
+
+# ---------------------------------------------------
+# Motor de consultas DuckDB (opcional)
+# ---------------------------------------------------
+# Alternativa ao cubo em memória: os painéis de contagens (total, curva
+# diária, classes, semana, mês e placa), os pontos do mapa e a exportação
+# das moscas filtradas correm como consultas SQL sobre um ficheiro Parquet
+# com as moscas, gravado pela ingestão uma vez por versão dos dados. O
+# DuckDB lê só as colunas e os blocos necessários, usa várias threads e, com
+# o limite de memória, escreve em disco o que não couber em RAM. A
+# exportação lê o resultado em lotes de exportacao.TAMANHO_BLOCO linhas.
+#
+# Neste motor o snapshot não guarda o ficheiro mestre nem o cubo: a
+# ingestão lê o Excel, grava o Parquet e liberta as moscas. Os painéis de
+# exposição e de tendências vêm dos objetos já calculados pela ingestão
+# (iguais nos dois motores), e os pontos do mapa vêm das armadilhas de
+# placas.db, como no motor pandas.
+#
+# Os resultados têm de ser idênticos aos do cubo (mesmas linhas, colunas,
+# tipos e ordem): `comparar` verifica-o para uma lista de filtros e
+# `python consultas_duckdb.py <pasta>` corre a verificação sobre uma pasta
+# de dados. Escolhe-se o motor com DASHBOARD_MOTOR=duckdb. O duckdb é
+# opcional; sem ele a ingestão avisa e o dashboard usa o cubo.
+
+PASTA_PARQUET = "moscas_parquet"  # dentro da pasta dos dados, um ficheiro por versão
+VERSOES_MANTIDAS = 2
+LIMITE_MEMORIA = os.environ.get("DASHBOARD_DUCKDB_MEMORIA", "1GB")
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+_conexao = None
+_lock_conexao = threading.Lock()
+
+
+def disponivel():
+    return duckdb is not None
+
+
+# Ligação partilhada pelo processo; cada consulta usa o seu cursor (um por thread)
+def cursor():
+    global _conexao
+    with _lock_conexao:
+        if _conexao is None:
+            _conexao = duckdb.connect()
+            _conexao.execute(f"SET memory_limit = '{LIMITE_MEMORIA}'")
+            _conexao.execute(f"SET temp_directory = '{tempfile.gettempdir()}/duckdb_dashboard'")
+        return _conexao.cursor()
+
+
+# ---------------------------------------------------
+# Armazenamento (corre na ingestão)
+# ---------------------------------------------------
+def gravar_moscas(df_mestre, data_dir, versao):
+    pasta = pathlib.Path(data_dir) / PASTA_PARQUET
+    pasta.mkdir(exist_ok=True)
+    caminho = pasta / f"{versao}.parquet"
+    if not caminho.exists():
+        temporario = pasta / f".{versao}.{os.getpid()}.tmp"
+        con = cursor()
+        try:
+            con.register("moscas", df_mestre)
+            con.execute(f"COPY moscas TO '{_literal(temporario)}' (FORMAT parquet)")
+        finally:
+            con.close()
+        os.replace(temporario, caminho)
+
+    # Mantém as versões mais recentes (outros processos podem ainda estar na anterior)
+    antigos = sorted(pasta.glob("*.parquet"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for antigo in antigos[VERSOES_MANTIDAS:]:
+        if antigo != caminho:
+            antigo.unlink(missing_ok=True)
+    return caminho
+
+
+def _literal(caminho):
+    return str(caminho).replace("'", "''")
+
+
+# ---------------------------------------------------
+# Consultas
+# ---------------------------------------------------
+# Condição WHERE e parâmetros do filtro do dashboard (igual a agregacoes.filtrar)
+def _condicao(localizacoes, inicio, fim, validas=False):
+    condicoes, parametros = [], []
+    if localizacoes:
+        condicoes.append('"Localização" IN (SELECT unnest(?))')
+        parametros.append(list(localizacoes))
+    if inicio is not None and fim is not None:
+        condicoes.append('CAST("First_Detection_Date" AS DATE) BETWEEN ? AND ?')
+        parametros += [inicio, fim]
+    if validas:
+        # As mesmas moscas que o cubo conta
+        condicoes.append('"Fly_ID" IS NOT NULL AND "Class" IN (SELECT unnest(?))')
+        parametros.append(CLASSES)
+    return (" WHERE " + " AND ".join(condicoes)) if condicoes else "", parametros
+
+
+def _sql(caminho, sql):
+    return sql.replace("{moscas}", f"read_parquet('{_literal(caminho)}', file_row_number = true)")
+
+
+def consultar(caminho, sql, parametros=()):
+    con = cursor()
+    try:
+        return con.execute(_sql(caminho, sql), list(parametros)).df()
+    finally:
+        con.close()
+
+
+# Colunas das moscas (sem ler linhas)
+def colunas(caminho):
+    return [c for c in consultar(caminho, "SELECT * EXCLUDE (file_row_number) FROM {moscas} LIMIT 0").columns]
+
+
+# Moscas filtradas em lotes (DataFrames com as colunas pedidas), pela ordem do
+# ficheiro mestre; sem moscas, um lote vazio (para o cabeçalho da exportação)
+def blocos_moscas(caminho, colunas, localizacoes=None, inicio=None, fim=None, tamanho_bloco=exportacao.TAMANHO_BLOCO):
+    where, parametros = _condicao(localizacoes, inicio, fim)
+    selecao = ", ".join('"' + c.replace('"', '""') + '"' for c in colunas)
+    con = cursor()
+    try:
+        lotes = con.execute(_sql(caminho, f"SELECT {selecao} FROM {{moscas}}{where}"), parametros).to_arrow_reader(
+            tamanho_bloco
+        )
+        vazio = True
+        for lote in lotes:
+            vazio = False
+            yield lote.to_pandas()
+        if vazio:
+            yield lotes.schema.empty_table().to_pandas()
+    finally:
+        con.close()
+
+
+# Função sem argumentos para o st.download_button: a consulta só corre quando o ficheiro é pedido
+def exportador(caminho, formato, colunas, localizacoes=None, inicio=None, fim=None):
+    return exportacao.exportador_blocos(lambda: blocos_moscas(caminho, colunas, localizacoes, inicio, fim), formato)
+
+
+# Pontos do mapa (como agregacoes.pontos_mapa): armadilhas da BD ou, sem BD,
+# coordenadas distintas das moscas filtradas, pela ordem da primeira mosca
+def pontos_mapa(caminho, df_localizacoes, localizacoes=None, inicio=None, fim=None):
+    if not df_localizacoes.empty:
+        return agregacoes.pontos_mapa(df_localizacoes, None)
+    where, parametros = _condicao(localizacoes, inicio, fim)
+    where = (where + " AND " if where else " WHERE ") + '"Latitude" IS NOT NULL AND "Longitude" IS NOT NULL'
+    return consultar(
+        caminho,
+        'SELECT "Latitude", "Longitude" FROM {moscas}' + where + " GROUP BY ALL ORDER BY min(file_row_number)",
+        parametros,
+    )
+
+
+# Contagens por chave e classe, em formato largo (uma coluna por classe)
+def _contar(caminho, chave, localizacoes, inicio, fim, nome, com_data=False):
+    where, parametros = _condicao(localizacoes, inicio, fim, validas=True)
+    if com_data:
+        where += ' AND "First_Detection_Date" IS NOT NULL'
+    df = consultar(
+        caminho,
+        f'SELECT {chave} AS chave, "Class" AS classe, count(*) AS n FROM {{moscas}}{where} GROUP BY ALL',
+        parametros,
+    )
+    largo = df.pivot_table(index="chave", columns="classe", values="n", aggfunc="sum", fill_value=0)
+    largo = largo.reindex(columns=CLASSES, fill_value=0).astype(np.int64)
+    largo.index.name = nome
+    largo.columns.name = "Class"
+    return largo
+
+
+def total(caminho, localizacoes=None, inicio=None, fim=None):
+    # Como no cubo, as moscas sem data não entram no total
+    where, parametros = _condicao(localizacoes, inicio, fim, validas=True)
+    sql = 'SELECT count(*) FROM {moscas}' + where + ' AND "First_Detection_Date" IS NOT NULL'
+    return int(consultar(caminho, sql, parametros).iloc[0, 0])
+
+
+def curva_diaria(caminho, localizacoes=None, inicio=None, fim=None, hoje=None):
+    hoje = hoje or date.today()
+    chave = 'CAST("First_Detection_Date" AS DATE)'
+    por_dia = _contar(caminho, chave, localizacoes, inicio, fim, "Data", com_data=True)
+
+    if len(por_dia):
+        start_date = por_dia.index.min()
+    else:
+        # Sem capturas na seleção: a curva começa no primeiro dia dos dados
+        primeiro = consultar(caminho, f"SELECT min({chave}) FROM {{moscas}}" + _condicao(None, None, None, True)[0],
+                             [CLASSES]).iloc[0, 0]
+        start_date = primeiro if not pd.isna(primeiro) else hoje
+    start_date = pd.Timestamp(start_date).date()
+
+    full_dates = pd.date_range(start=start_date, end=hoje, freq="D").date
+    por_dia.index = pd.Index([pd.Timestamp(d).date() for d in por_dia.index])
+    valores = por_dia.reindex(full_dates, fill_value=0).to_numpy(dtype=np.int64)
+
+    df_daily = pd.DataFrame(valores, columns=list(NOMES_CLASSES.values()))
+    df_daily.insert(0, "Data", full_dates)
+    df_daily["Total Moscas"] = valores.sum(axis=1)
+    df_daily["Acumulado"] = df_daily["Total Moscas"].cumsum()
+    return df_daily
+
+
+def totais_por_classe(caminho, localizacoes=None, inicio=None, fim=None):
+    where, parametros = _condicao(localizacoes, inicio, fim, validas=True)
+    df = consultar(caminho, 'SELECT "Class" AS classe, count(*) AS n FROM {moscas}' + where + " GROUP BY ALL", parametros)
+    totais = df.set_index("classe")["n"].reindex(CLASSES, fill_value=0).to_numpy(dtype=np.int64)
+    return pd.DataFrame({"Classe": CLASSES, "Total": totais})
+
+
+def por_semana(caminho, localizacoes=None, inicio=None, fim=None):
+    df = _contar(caminho, 'week("First_Detection_Date")', localizacoes, inicio, fim, "Semana", com_data=True)
+    df = df.sort_index()
+    df.index = df.index.astype("UInt32")
+    return df
+
+
+def por_mes(caminho, localizacoes=None, inicio=None, fim=None):
+    df = _contar(caminho, 'date_trunc(\'month\', "First_Detection_Date")', localizacoes, inicio, fim, "Mês", com_data=True)
+    # O rótulo é formatado pelo pandas, como no cubo (o nome do mês depende da locale)
+    df.index = pd.DatetimeIndex(df.index).strftime("%Y-%m (%B)").rename("Mês")
+    df = df.groupby(level=0).sum()
+    df.index = df.index.astype(str)
+    df.columns.name = "Class"
+    return df
+
+
+def por_placa(caminho, localizacoes=None, inicio=None, fim=None):
+    df = _contar(caminho, '"Placa ID"', localizacoes, inicio, fim, "Placa ID")
+    df = df[df.index.notna()].sort_index()
+    df.index = df.index.astype(str)
+    return df
+
+
+# Mesmo dicionário que vista_inicial.paineis
+def paineis(snapshot, localizacoes=None, inicio=None, fim=None):
+    import vista_inicial
+
+    caminho = snapshot.parquet_moscas
+    filtros = (localizacoes, inicio, fim)
+    return {
+        "total": total(caminho, *filtros),
+        "curva_diaria": curva_diaria(caminho, *filtros),
+        "totais_por_classe": totais_por_classe(caminho, *filtros),
+        "por_semana": por_semana(caminho, *filtros),
+        "por_mes": por_mes(caminho, *filtros),
+        "por_placa": por_placa(caminho, *filtros),
+        **vista_inicial.paineis_exposicao(snapshot, *filtros),
+        "mapa": pontos_mapa(caminho, snapshot.df_localizacoes, *filtros),
+    }
+
+
+# ---------------------------------------------------
+# Verificação contra o motor pandas
+# ---------------------------------------------------
+# Filtros a comparar: sem filtros, cada localização, metades do período,
+# localização com datas e um intervalo sem dados
+def filtros_verificacao(snapshot):
+    localizacoes, min_date, max_date = snapshot.opcoes_filtros
+    filtros = [(None, None, None)] + [([loc], None, None) for loc in localizacoes]
+    if min_date is not None:
+        meio = min_date + (max_date - min_date) / 2
+        filtros += [(None, min_date, meio), (None, meio, max_date), (localizacoes[:2], meio, max_date)]
+        filtros.append((None, max_date + timedelta(days=1), max_date + timedelta(days=30)))
+    return filtros
+
+
+# Compara um snapshot do motor pandas com um do motor DuckDB (mesmos dados).
+# Devolve uma lista de (filtros, painel, diferença); vazia se os dois motores coincidirem
+def comparar(snapshot_pandas, snapshot_duckdb, filtros=None):
+    import vista_inicial
+
+    diferencas = []
+    if snapshot_pandas.opcoes_filtros != snapshot_duckdb.opcoes_filtros:
+        diferencas.append((None, "filtros", f"{snapshot_pandas.opcoes_filtros!r} != {snapshot_duckdb.opcoes_filtros!r}"))
+
+    caminho = snapshot_duckdb.parquet_moscas
+    colunas_moscas = colunas(caminho)
+    for localizacoes, inicio, fim in filtros or filtros_verificacao(snapshot_pandas):
+        filtro = (localizacoes, inicio, fim)
+        df_pandas = agregacoes.filtrar(snapshot_pandas.df_mestre, *filtro)
+        csv_pandas = b"".join(exportacao.gerar_csv(exportacao.iterar_blocos(df_pandas, colunas_moscas)))
+        csv_duckdb = b"".join(exportacao.gerar_csv(blocos_moscas(caminho, colunas_moscas, *filtro, tamanho_bloco=7)))
+        if csv_pandas != csv_duckdb:
+            diferencas.append((filtro, "exportação", f"{len(csv_pandas)} bytes != {len(csv_duckdb)} bytes"))
+
+        esperado = vista_inicial.paineis(snapshot_pandas, *filtro, df_filtrado=df_pandas)
+        obtido = paineis(snapshot_duckdb, *filtro)
+        for nome, valor in esperado.items():
+            try:
+                if isinstance(valor, pd.DataFrame):
+                    pd.testing.assert_frame_equal(valor, obtido[nome])
+                else:
+                    assert valor == obtido[nome], f"{valor!r} != {obtido[nome]!r}"
+            except AssertionError as e:
+                diferencas.append((filtro, nome, str(e)))
+    return diferencas
+
+
+if __name__ == "__main__":
+    import ingestao
+
+    parser = argparse.ArgumentParser(description="Compara os painéis do motor DuckDB com os do motor pandas.")
+    parser.add_argument("pasta", nargs="?", default=str(ingestao.BASE_DIR), help="Pasta com os dados")
+    args = parser.parse_args()
+
+    if not disponivel():
+        sys.exit("O duckdb não está instalado (pip install duckdb).")
+
+    snapshots = []
+    for motor in ["pandas", "duckdb"]:
+        ingestor = ingestao.Ingestor(args.pasta, motor=motor)
+        ingestor.atualizar()
+        snapshots.append(ingestor.snapshot())
+    if snapshots[1].parquet_moscas is None:
+        sys.exit("Sem dados de moscas para comparar.")
+
+    filtros = filtros_verificacao(snapshots[0])
+    diferencas = comparar(*snapshots, filtros)
+    for filtro, painel, diferenca in diferencas:
+        print(f"[{painel}] filtros={filtro}\n{diferenca}\n")
+    print(f"{len(filtros)} combinações de filtros, {len(diferencas)} diferenças")
+    sys.exit(1 if diferencas else 0)
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+
+from agregacoes import CLASSES, NOMES_CLASSES
+
+# ---------------------------------------------------
+# Cubo de contagens dia × placa × classe
+# ---------------------------------------------------
+# Construído uma vez por geração de dados a partir do ficheiro mestre. Todos
+# os painéis (curva diária, semana, mês, placa, localização, classe) são
+# projeções do mesmo cubo: fatiar os dias e as placas selecionadas e somar,
+# em vez de um groupby sobre as moscas individuais em cada rerun.
+#
+# A dimensão "placa" é o par (Placa ID, Localização), para que o filtro de
+# localização dê exatamente o mesmo resultado que sobre as linhas.
+
+
+class Cubo:
+    def __init__(self, dias, placas, localizacoes, contagens, sem_data):
+        self.dias = dias                  # DatetimeIndex diário
+        self.placas = placas              # Placa ID de cada coluna
+        self.localizacoes = localizacoes  # Localização de cada coluna
+        self.contagens = contagens        # int32 [dia, placa, classe]
+        self.sem_data = sem_data          # int32 [placa, classe] das moscas sem data
+
+        # Rótulos por dia, calculados uma vez
+        self.semanas = dias.isocalendar().week.to_numpy() if len(dias) else np.array([], dtype=int)
+        self.meses = dias.strftime("%Y-%m (%B)").to_numpy() if len(dias) else np.array([], dtype=object)
+
+    @classmethod
+    def construir(cls, df):
+        df = df[df["Fly_ID"].notna() & df["Class"].isin(CLASSES)]
+
+        codigos_placa, pares = pd.factorize(
+            pd.MultiIndex.from_arrays([df["Placa ID"], df["Localização"]]), use_na_sentinel=False
+        )
+        placas = pares.get_level_values(0).to_numpy(dtype=object)
+        localizacoes = pares.get_level_values(1).to_numpy(dtype=object)
+        codigos_classe = pd.Categorical(df["Class"], categories=CLASSES).codes
+
+        datas = df["First_Detection_Date"].dt.normalize()
+        com_data = datas.notna().to_numpy()
+        if com_data.any():
+            dias = pd.date_range(datas.min(), datas.max(), freq="D")
+            codigos_dia = ((datas[com_data] - dias[0]) // pd.Timedelta(days=1)).to_numpy()
+        else:
+            dias = pd.DatetimeIndex([])
+            codigos_dia = np.array([], dtype=int)
+
+        contagens = np.zeros((len(dias), len(placas), len(CLASSES)), dtype=np.int32)
+        np.add.at(contagens, (codigos_dia, codigos_placa[com_data], codigos_classe[com_data]), 1)
+
+        sem_data = np.zeros((len(placas), len(CLASSES)), dtype=np.int32)
+        np.add.at(sem_data, (codigos_placa[~com_data], codigos_classe[~com_data]), 1)
+
+        return cls(dias, placas, localizacoes, contagens, sem_data)
+
+    # ---------------------------------------------------
+    # Seleção
+    # ---------------------------------------------------
+    def mascara_placas(self, localizacoes=None):
+        if not localizacoes:
+            return np.ones(len(self.placas), dtype=bool)
+        return np.isin(self.localizacoes, list(localizacoes))
+
+    def fatia_dias(self, inicio=None, fim=None):
+        if inicio is None or fim is None or len(self.dias) == 0:
+            return slice(None)
+        i = self.dias.searchsorted(pd.Timestamp(inicio))
+        j = self.dias.searchsorted(pd.Timestamp(fim), side="right")
+        return slice(i, j)
+
+    # [dia, placa, classe] para a seleção
+    def selecionar(self, localizacoes=None, inicio=None, fim=None):
+        return self.contagens[self.fatia_dias(inicio, fim)][:, self.mascara_placas(localizacoes)]
+
+    # Moscas sem data só contam quando não há filtro de datas (como no filtro sobre linhas)
+    def _sem_data(self, localizacoes, inicio, fim):
+        if inicio is not None and fim is not None:
+            return np.zeros((int(self.mascara_placas(localizacoes).sum()), len(CLASSES)), dtype=np.int32)
+        return self.sem_data[self.mascara_placas(localizacoes)]
+
+    def total(self, localizacoes=None, inicio=None, fim=None):
+        return int(self.selecionar(localizacoes, inicio, fim).sum())
+
+    # ---------------------------------------------------
+    # Painéis
+    # ---------------------------------------------------
+    def curva_diaria(self, localizacoes=None, inicio=None, fim=None, hoje=None):
+        hoje = hoje or date.today()
+        fatia = self.fatia_dias(inicio, fim)
+        por_dia = self.selecionar(localizacoes, inicio, fim).sum(axis=1)
+        dias = self.dias[fatia]
+
+        # A curva começa no primeiro dia com capturas (ou no início dos dados, se não houver nenhuma)
+        com_capturas = np.flatnonzero(por_dia.sum(axis=1))
+        if len(com_capturas):
+            dias, por_dia = dias[com_capturas[0]:], por_dia[com_capturas[0]:]
+            start_date = dias[0].date()
+        else:
+            start_date = self.dias[0].date() if len(self.dias) else hoje
+            dias, por_dia = dias[:0], por_dia[:0]
+
+        full_dates = pd.date_range(start=start_date, end=hoje, freq="D")
+        valores = np.zeros((len(full_dates), len(CLASSES)), dtype=np.int64)
+        n = min(len(dias), len(full_dates))
+        valores[:n] = por_dia[:n]
+
+        df_daily = pd.DataFrame(valores, columns=list(NOMES_CLASSES.values()))
+        df_daily.insert(0, "Data", full_dates.date)
+        df_daily["Total Moscas"] = valores.sum(axis=1)
+        df_daily["Acumulado"] = df_daily["Total Moscas"].cumsum()
+        return df_daily
+
+    def totais_por_classe(self, localizacoes=None, inicio=None, fim=None):
+        totais = self.selecionar(localizacoes, inicio, fim).sum(axis=(0, 1))
+        totais = totais + self._sem_data(localizacoes, inicio, fim).sum(axis=0)
+        return pd.DataFrame({"Classe": CLASSES, "Total": totais.astype(np.int64)})
+
+    # Soma por rótulo de dia (semana ou mês), sem linhas para rótulos sem capturas
+    def _por_rotulo(self, rotulos, nome, localizacoes, inicio, fim):
+        fatia = self.fatia_dias(inicio, fim)
+        por_dia = self.selecionar(localizacoes, inicio, fim).sum(axis=1)
+        df = pd.DataFrame(por_dia, columns=CLASSES)
+        df[nome] = rotulos[fatia]
+        df = df[por_dia.sum(axis=1) > 0].groupby(nome)[CLASSES].sum()
+        df.columns.name = "Class"
+        return df
+
+    def por_semana(self, localizacoes=None, inicio=None, fim=None):
+        df = self._por_rotulo(self.semanas, "Semana", localizacoes, inicio, fim)
+        df.index = df.index.astype("UInt32")
+        return df
+
+    # Índice de texto também quando não há linhas (o groupby vazio devolve object)
+    def por_mes(self, localizacoes=None, inicio=None, fim=None):
+        df = self._por_rotulo(self.meses, "Mês", localizacoes, inicio, fim)
+        df.index = df.index.astype(str)
+        return df
+
+    # Soma por atributo da placa (Placa ID ou Localização)
+    def _por_atributo_placa(self, atributo, nome, localizacoes, inicio, fim):
+        mascara = self.mascara_placas(localizacoes)
+        por_placa = self.selecionar(localizacoes, inicio, fim).sum(axis=0)
+        por_placa = por_placa + self._sem_data(localizacoes, inicio, fim)
+        df = pd.DataFrame(por_placa, columns=CLASSES)
+        df[nome] = atributo[mascara]
+        df = df[(por_placa.sum(axis=1) > 0) & df[nome].notna()].groupby(nome)[CLASSES].sum()
+        df.columns.name = "Class"
+        return df
+
+    def por_placa(self, localizacoes=None, inicio=None, fim=None):
+        df = self._por_atributo_placa(self.placas, "Placa ID", localizacoes, inicio, fim)
+        df.index = df.index.astype(str)
+        return df
+
+    def por_localizacao(self, localizacoes=None, inicio=None, fim=None):
+        return self._por_atributo_placa(self.localizacoes, "Localização", localizacoes, inicio, fim)
@@ -0,0 +1,165 @@
+import argparse
+import io
+import pathlib
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------
+# Dados sintéticos com o formato das fontes reais
+# ---------------------------------------------------
+# Gera uma pasta com placas.db (armadilhas e placas), dashboard_data.xlsx
+# (uma linha por mosca), results.csv (uma linha por fotografia, com as
+# coordenadas das caixas) e, opcionalmente, as fotografias em
+# detections_output. Serve para testes de carga e para comparar
+# implementações com volumes maiores do que os dados reais.
+
+LOCALIDADES = {
+    "Beja": (38.0150, -7.8650),
+    "Moura": (38.1400, -7.4500),
+    "Sousel": (38.9500, -7.6750),
+    "Serpa": (37.9450, -7.5950),
+    "Elvas": (38.8800, -7.1630),
+}
+CLASSES = ["femea", "macho", "mosca"]
+DIAS_POR_PLACA = 14
+LARGURA_IMAGEM, ALTURA_IMAGEM = 1280, 960
+
+
+def gerar(pasta, n_armadilhas=20, n_dias=120, moscas_por_dia=1.5, imagens=True, fim=None, semente=0):
+    pasta = pathlib.Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(semente)
+    fim = fim or date.today()
+    inicio = fim - timedelta(days=n_dias - 1)
+
+    # Armadilhas distribuídas pelas localidades, com uma placa nova a cada 14 dias
+    nomes_localidades = list(LOCALIDADES)
+    armadilhas = []
+    for i in range(n_armadilhas):
+        localidade = nomes_localidades[i % len(nomes_localidades)]
+        lat, lon = LOCALIDADES[localidade]
+        armadilhas.append((i + 1, f"Armadilha {i + 1:03d}", localidade,
+                           lat + rng.normal(0, 0.02), lon + rng.normal(0, 0.02)))
+
+    placas = []
+    for id_armadilha, *_ in armadilhas:
+        colocacao = inicio
+        while colocacao <= fim:
+            placa_id = f"PLACA_{colocacao:%Y%m%d}{id_armadilha:06d}"
+            placas.append((placa_id, id_armadilha, colocacao.isoformat(), int(colocacao + timedelta(days=DIAS_POR_PLACA) > fim)))
+            colocacao += timedelta(days=DIAS_POR_PLACA)
+
+    escrever_bd(pasta / "placas.db", armadilhas, placas)
+
+    # Uma fotografia por armadilha e dia; moscas novas com uma curva de voo em sino
+    dias = pd.date_range(inicio, fim, freq="D")
+    intensidade = moscas_por_dia * 2 * np.exp(-0.5 * ((np.arange(n_dias) - n_dias * 0.6) / (n_dias * 0.15)) ** 2)
+    moscas, fotografias = [], []
+    for id_armadilha, _, localidade, lat, lon in armadilhas:
+        for d, dia in enumerate(dias):
+            placa_id = placas_ativas(placas, id_armadilha, dia.date())
+            hora = datetime.combine(dia.date(), datetime.min.time()) + timedelta(hours=20, seconds=int(rng.integers(3600)))
+            imagem = f"image_{hora:%Y%m%d%H%M%S}_a{id_armadilha:03d}.jpg"
+
+            n_novas = rng.poisson(intensidade[d])
+            caixas = {classe: [] for classe in CLASSES}
+            for _ in range(n_novas):
+                classe = CLASSES[rng.choice(3, p=[0.45, 0.35, 0.2])]
+                x, y = int(rng.integers(0, LARGURA_IMAGEM - 60)), int(rng.integers(0, ALTURA_IMAGEM - 60))
+                coords = f"{x},{y},{x + 40},{y + 50}"
+                fly_id = f"{id_armadilha:04d}-{d:05d}-{len(moscas):08d}"
+                confianca = round(float(rng.uniform(0.5, 0.99)), 2)
+                caixas[classe].append((fly_id, coords, confianca))
+                moscas.append((fly_id, classe, dia, imagem, placa_id, localidade, lat, lon, coords, confianca))
+
+            fotografia = {
+                "Nome da imagem": imagem,
+                "Data imagem": hora.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "Placa ID": placa_id,
+                "Localização": localidade,
+                "Latitude": lat,
+                "Longitude": lon,
+            }
+            for classe in CLASSES:
+                fotografia[f"Nº {classe}"] = len(caixas[classe])
+                fotografia[f"Coord. {classe}"] = "; ".join(f"{f}:{c}" for f, c, _ in caixas[classe]) or None
+                fotografia[f"Conf. {classe}"] = "; ".join(str(p) for _, _, p in caixas[classe]) or None
+            fotografias.append(fotografia)
+
+    df_moscas = pd.DataFrame(moscas, columns=[
+        "Fly_ID", "Class", "First_Detection_Date", "First_Detection_Image", "Placa ID",
+        "Localização", "Latitude", "Longitude", "First_Coords", "First_Confidence",
+    ])
+    df_moscas.to_excel(pasta / "dashboard_data.xlsx", index=False, engine="openpyxl")
+    pd.DataFrame(fotografias).to_csv(pasta / "results.csv", index=False)
+
+    if imagens:
+        escrever_imagens(pasta / "detections_output", df_moscas["First_Detection_Image"].unique(), rng)
+
+    return {"armadilhas": len(armadilhas), "placas": len(placas), "moscas": len(df_moscas), "fotografias": len(fotografias)}
+
+
+def placas_ativas(placas, id_armadilha, dia):
+    ativa = None
+    for placa_id, armadilha, colocacao, _ in placas:
+        if armadilha == id_armadilha and date.fromisoformat(colocacao) <= dia:
+            ativa = placa_id
+    return ativa
+
+
+def escrever_bd(db_path, armadilhas, placas):
+    db_path.unlink(missing_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript("""
+            CREATE TABLE armadilhas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL,
+                localidade TEXT,
+                latitude REAL,
+                longitude REAL
+            );
+            CREATE TABLE placas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                placa_id TEXT UNIQUE NOT NULL,
+                id_armadilha INTEGER NOT NULL,
+                data_colocacao TEXT,
+                ativa INTEGER,
+                FOREIGN KEY (id_armadilha) REFERENCES armadilhas(id)
+            );
+        """)
+        conn.executemany("INSERT INTO armadilhas (id, nome, localidade, latitude, longitude) VALUES (?, ?, ?, ?, ?)", armadilhas)
+        conn.executemany("INSERT INTO placas (placa_id, id_armadilha, data_colocacao, ativa) VALUES (?, ?, ?, ?)", placas)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# Fotografias com manchas suaves (JPEG pequeno, mas com dimensões reais)
+def escrever_imagens(pasta, nomes, rng):
+    from PIL import Image
+
+    pasta.mkdir(exist_ok=True)
+    for nome in nomes:
+        pixels = rng.integers(90, 170, size=(ALTURA_IMAGEM // 32, LARGURA_IMAGEM // 32, 3), dtype=np.uint8)
+        img = Image.fromarray(pixels).resize((LARGURA_IMAGEM, ALTURA_IMAGEM), Image.BILINEAR)
+        saida = io.BytesIO()
+        img.save(saida, format="JPEG", quality=80)
+        (pasta / nome).write_bytes(saida.getvalue())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos com o formato das fontes do dashboard.")
+    parser.add_argument("pasta")
+    parser.add_argument("--armadilhas", type=int, default=20)
+    parser.add_argument("--dias", type=int, default=120)
+    parser.add_argument("--moscas-por-dia", type=float, default=1.5, help="Média de moscas novas por armadilha no pico")
+    parser.add_argument("--sem-imagens", action="store_true")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    resumo = gerar(args.pasta, args.armadilhas, args.dias, args.moscas_por_dia, not args.sem_imagens, semente=args.semente)
+    print(", ".join(f"{n} {nome}" for nome, n in resumo.items()))
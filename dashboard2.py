@@ -1,89 +1,174 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
+import os
 import pathlib
-import sqlite3
-from datetime import date
+import time
+from types import SimpleNamespace
+
+import agregacoes
+import alertas
+import cache_imagens
+import cache_partilhada
+import compactacao
+import consultas_duckdb
+import exportacao
+import galeria
+import ingestao
+import metricas
+import paginacao
+import recortes
+import sobreposicoes
+import vista_inicial
 
 # ---------------------------------------------------
 # Setup da página
 # ---------------------------------------------------
+inicio_rerun = time.perf_counter()
 st.set_page_config(page_title="Dashboard Mosca da Azeitona", layout="wide")
 st.title("🪰 Dashboard - Capturas da Mosca da Azeitona")
 
+# A pasta dos dados pode ser mudada com a variável de ambiente DASHBOARD_DADOS
 BASE_DIR = pathlib.Path(__file__).parent.resolve()
+DATA_DIR = pathlib.Path(os.environ.get("DASHBOARD_DADOS", BASE_DIR / "../tese_public"))
+DB_PATH = DATA_DIR / "placas.db"
+
+# Motor dos painéis: "pandas" (cubo em memória) ou "duckdb" (consultas sobre Parquet)
+MOTOR = os.environ.get("DASHBOARD_MOTOR", "pandas")
 
 # ---------------------------------------------------
-# Carregar dados mestre (Excel)
+# Dados (publicados pelo worker de ingestão)
 # ---------------------------------------------------
-@st.cache_data(ttl=60)
-def carregar_dados_mestre():
-    master_file = BASE_DIR / "../tese_public/dashboard_data.xlsx"
-    if not master_file.exists():
-        st.error("Ficheiro 'dashboard_data.xlsx' não encontrado! Executa o script de processamento primeiro.")
-        return pd.DataFrame()
-
-    df = pd.read_excel(master_file, engine='openpyxl')
-    df["First_Detection_Date"] = pd.to_datetime(df["First_Detection_Date"], errors='coerce')
-    df["Localização"] = df["Localização"].fillna("Desconhecida")
-    df["First_Confidence"] = pd.to_numeric(df["First_Confidence"], errors="coerce").fillna(0)
-    df = df.sort_values("First_Detection_Date", ascending=False)
-    return df
-
-df_mestre = carregar_dados_mestre()
-if df_mestre.empty:
+# O worker corre uma vez por processo: lê o Excel, a BD e o CSV, faz o merge
+# e atualiza os alertas. Os reruns apenas leem o último snapshot publicado.
+# Num arranque a frio, enquanto o primeiro snapshot não existe, é mostrada a
+# vista "sem filtros" gravada pela última ingestão. Com vários processos
+# (servir.py), a ingestão e os painéis ficam numa cache em disco partilhada.
+@st.cache_resource
+def obter_ingestor():
+    cache = cache_partilhada.do_ambiente()
+    if cache is not None:
+        metricas.registar_cache("partilhada", cache.estatisticas)
+    return ingestao.iniciar(DATA_DIR, cache=cache, motor=MOTOR)
+
+# Métricas de desempenho (formato Prometheus) numa porta local, uma vez por
+# processo, se a variável de ambiente DASHBOARD_METRICAS_PORTA estiver definida
+@st.cache_resource
+def obter_servidor_metricas():
+    porta = os.environ.get("DASHBOARD_METRICAS_PORTA")
+    return metricas.iniciar_servidor(int(porta)) if porta else None
+
+# Termina o rerun mais cedo (st.stop), registando a sua duração
+def parar_rerun():
+    metricas.RERUN_SEGUNDOS.observar(time.perf_counter() - inicio_rerun)
     st.stop()
 
+obter_servidor_metricas()
+ingestor = obter_ingestor()
+snapshot = ingestor.snapshot()
+vista = ingestor.vista_inicial if snapshot is None else None
+if snapshot is None and vista is None:
+    snapshot = ingestor.aguardar_snapshot(ingestao.TEMPO_ESPERA)
+    if snapshot is None:
+        st.error(ingestor.mensagem_indisponivel())
+        parar_rerun()
+
+if snapshot is not None:
+    if ingestor.erro is not None:
+        st.warning(f"A última atualização dos dados falhou ({ingestor.erro}); a mostrar os dados anteriores.")
+    for nivel, mensagem in snapshot.avisos:
+        getattr(st, nivel)(mensagem)
+    if snapshot.n_moscas == 0:
+        parar_rerun()
+    todas_localizacoes, min_date, max_date = snapshot.opcoes_filtros
+else:
+    for nivel, mensagem in vista["avisos"]:
+        getattr(st, nivel)(mensagem)
+    todas_localizacoes, min_date, max_date = vista["localizacoes"], vista["min_date"], vista["max_date"]
+
 # ---------------------------------------------------
-# Carregar localização das armadilhas a partir da BD
+# Botões de exportação (CSV/Parquet gerados em blocos ao clicar; o ficheiro
+# completo fica em memória até ser enviado — para exportações grandes, a API
+# envia as moscas filtradas em blocos)
 # ---------------------------------------------------
-def carregar_localizacoes():
-    db_path = BASE_DIR / "../tese_public/placas.db"
-    if not db_path.exists():
-        st.warning("Base de dados 'placas.db' não encontrada. Apenas serão usadas localizações do Excel.")
-        return pd.DataFrame()
-
-    conn = sqlite3.connect(db_path)
-    query = """
-        SELECT 
-            p.placa_id AS "Placa ID",
-            a.nome AS "Nome Armadilha",
-            a.localidade AS "Localização",
-            a.latitude AS "Latitude",
-            a.longitude AS "Longitude"
-        FROM placas p
-        JOIN armadilhas a ON p.id_armadilha = a.id
-    """
-    try:
-        df_loc = pd.read_sql_query(query, conn)
-    except Exception as e:
-        st.error(f"Erro a ler dados de 'placas.db': {e}")
-        conn.close()
-        return pd.DataFrame()
-
-    conn.close()
-    return df_loc
-
-df_localizacoes = carregar_localizacoes()
+# exportador: função (formato) -> dados do botão; por omissão, os blocos do DataFrame
+def botoes_exportacao(nome, df=None, colunas=None, index=False, container=st, exportador=None):
+    if exportador is None:
+        exportador = lambda formato: exportacao.exportador(df, formato, colunas, index=index)
+    formatos = ["csv", "parquet"] if exportacao.parquet_disponivel() else ["csv"]
+    colunas_botoes = container.columns(len(formatos))
+    for coluna, formato in zip(colunas_botoes, formatos):
+        coluna.download_button(
+            f"⬇️ {formato.upper()}",
+            data=exportador(formato),
+            file_name=f"{nome}.{formato}",
+            mime=exportacao.mime(formato),
+            key=f"exportar_{nome}_{formato}",
+            on_click="ignore",
+        )
 
 # ---------------------------------------------------
-# Juntar localização das armadilhas ao ficheiro mestre
+# Tabelas paginadas (ordenação e página feitas no servidor)
 # ---------------------------------------------------
-if not df_localizacoes.empty:
-    df_mestre = df_mestre.merge(df_localizacoes, on="Placa ID", how="left")
-
-    # Substituir valores antigos, se existirem
-    df_mestre["Localização"] = df_mestre["Localização_y"].combine_first(df_mestre.get("Localização_x"))
-    df_mestre["Latitude"] = df_mestre.get("Latitude_y", df_mestre.get("Latitude_x"))
-    df_mestre["Longitude"] = df_mestre.get("Longitude_y", df_mestre.get("Longitude_x"))
-    df_mestre["Nome Armadilha"] = df_mestre.get("Nome Armadilha")
-
-    # Limpar colunas duplicadas
-    df_mestre.drop(
-        columns=[c for c in df_mestre.columns if c.endswith("_x") or c.endswith("_y")],
-        inplace=True,
-        errors="ignore"
+# Cada tabela é um fragmento: mudar de página ou de ordenação só volta a
+# correr esta função, com o DataFrame recebido no último rerun completo.
+@st.fragment
+@metricas.FRAGMENTO_SEGUNDOS.medido(fragmento="tabela")
+def tabela_paginada(nome, df, ordenar_por=None, descendente=False, hide_index=False, **kwargs):
+    opcoes = paginacao.colunas_ordenacao(df)
+    controlos = st.columns([2, 1, 1])
+    ordenar_por = controlos[0].selectbox(
+        "Ordenar por", opcoes, index=opcoes.index(ordenar_por) if ordenar_por in opcoes else 0, key=f"ordem_{nome}"
     )
+    descendente = controlos[1].toggle("Descendente", value=descendente, key=f"descendente_{nome}")
+    total_paginas = paginacao.n_paginas(len(df))
+    numero = controlos[2].number_input(
+        f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, value=1,
+        key=f"pagina_{nome}_{total_paginas}",
+    )
+    janela = paginacao.pagina(df, numero, ordenar_por=ordenar_por, descendente=descendente)
+    st.dataframe(compactacao.compactar(janela), use_container_width=True, hide_index=hide_index, **kwargs)
+    st.caption(f"{len(df)} linhas")
+
+# Alertas abertos por armadilha (diário, soma de 7 dias e crescimento semanal).
+# Fragmento: silenciar só volta a desenhar este painel (os alertas são
+# fechados no callback, antes de o painel ser desenhado outra vez).
+def silenciar_alertas(ids):
+    conn = alertas.ligar(DB_PATH)
+    try:
+        alertas.fechar_alertas(conn, ids)
+    finally:
+        conn.close()
+
+@st.fragment
+@metricas.FRAGMENTO_SEGUNDOS.medido(fragmento="alertas")
+def painel_alertas(localizacoes, inicio, fim):
+    conn = alertas.ligar(DB_PATH)
+    try:
+        df_alertas = alertas.alertas_abertos(conn, localizacoes)
+    finally:
+        conn.close()
+    if inicio is not None and fim is not None:
+        df_alertas = df_alertas[
+            (df_alertas["Dia"] >= inicio.isoformat())
+            & (df_alertas["Dia"] <= fim.isoformat())
+        ]
+
+    if not df_alertas.empty:
+        st.error(f"🚨 Alerta: {len(df_alertas)} alertas abertos nas armadilhas selecionadas.")
+        st.dataframe(df_alertas.drop(columns="ID"), use_container_width=True, hide_index=True)
+        st.button("🔕 Silenciar alertas", on_click=silenciar_alertas, args=(df_alertas["ID"].tolist(),))
+
+# Volta a correr a página quando o primeiro snapshot estiver publicado (ou
+# mostra o erro, se a ingestão falhar)
+@st.fragment(run_every=1)
+@metricas.FRAGMENTO_SEGUNDOS.medido(fragmento="aguardar_snapshot")
+def aguardar_snapshot():
+    ingestor = obter_ingestor()
+    if ingestor.snapshot() is not None:
+        st.rerun()
+    elif ingestor.erro is not None:
+        st.error(ingestor.mensagem_indisponivel())
 
 # ---------------------------------------------------
 # Filtros (sidebar)
@@ -91,47 +176,60 @@ if not df_localizacoes.empty:
 with st.sidebar:
     st.header("🔍 Filtros")
 
-    # Combinar localizações da BD e do ficheiro mestre
-    if not df_localizacoes.empty:
-        todas_localizacoes = sorted(
-            set(df_localizacoes["Localização"].dropna().unique()) |
-            set(df_mestre["Localização"].dropna().unique())
-        )
-    else:
-        todas_localizacoes = sorted(df_mestre["Localização"].dropna().unique())
-
     # Filtro de localização (NÃO seleciona tudo por defeito)
     localizacoes = st.multiselect(
         "Filtrar por localização",
-        todas_localizacoes
+        todas_localizacoes,
+        key="filtro_localizacoes",
     )
 
     # Intervalo de datas
-    if not df_mestre.empty and "First_Detection_Date" in df_mestre.columns:
-        min_date = df_mestre["First_Detection_Date"].min().date()
-        max_date = df_mestre["First_Detection_Date"].max().date()
-    else:
-        min_date = max_date = None
-
     data_range = st.date_input(
         "Filtrar por intervalo de datas",
         value=(),
         min_value=min_date,
-        max_value=max_date
+        max_value=max_date,
+        key="filtro_datas",
     )
+    inicio, fim = data_range if len(data_range) == 2 else (None, None)
+    filtros = (localizacoes, inicio, fim)
+
+# Com filtros, a vista inicial não serve: espera-se pelo snapshot completo
+if snapshot is None and (localizacoes or inicio is not None):
+    with st.spinner("A carregar os dados..."):
+        snapshot = ingestor.aguardar_snapshot(ingestao.TEMPO_ESPERA)
+    if snapshot is None:
+        st.error(ingestor.mensagem_indisponivel())
+        parar_rerun()
+
+if snapshot is not None:
+    # Os painéis são fatias do cubo de contagens ou consultas DuckDB (mesmos
+    # resultados); com o DuckDB, as moscas filtradas só são lidas do Parquet,
+    # em lotes, quando se pede a exportação
+    if snapshot.parquet_moscas is not None:
+        caminho = snapshot.parquet_moscas
+        colunas_exportacao = [c for c in consultas_duckdb.colunas(caminho) if c in exportacao.COLUNAS_MOSCAS]
+        exportar_moscas = lambda formato: consultas_duckdb.exportador(caminho, formato, colunas_exportacao, *filtros)
+        calcular_paineis = lambda: consultas_duckdb.paineis(snapshot, *filtros)
+    else:
+        df_filtrado = agregacoes.filtrar(snapshot.df_mestre, localizacoes, inicio, fim)
+        colunas_exportacao = [c for c in df_filtrado.columns if c in exportacao.COLUNAS_MOSCAS]
+        exportar_moscas = lambda formato: exportacao.exportador(df_filtrado, formato, colunas_exportacao)
+        calcular_paineis = lambda: vista_inicial.paineis(snapshot, *filtros, df_filtrado=df_filtrado)
+    if ingestor.cache is None:
+        paineis = calcular_paineis()
+    else:
+        chave = ("paineis", tuple(sorted(localizacoes)), inicio, fim)
+        paineis = ingestor.cache.obter_ou_calcular(snapshot.versao_dados, chave, calcular_paineis)
 
-    # Aplicar filtros
-    df_filtrado = df_mestre.copy()
-    if localizacoes:
-        df_filtrado = df_filtrado[df_filtrado["Localização"].isin(localizacoes)]
-
-    if len(data_range) == 2:
-        inicio, fim = data_range
-        df_filtrado = df_filtrado[
-            (df_filtrado["First_Detection_Date"].dt.date >= inicio)
-            & (df_filtrado["First_Detection_Date"].dt.date <= fim)
-        ]
-
+    with st.sidebar:
+        st.markdown("**Exportar moscas filtradas**")
+        botoes_exportacao("moscas_filtradas", container=st.sidebar, exportador=exportar_moscas)
+else:
+    paineis = vista["paineis"]
+    minutos = vista_inicial.idade(vista) / 60
+    st.info(f"⏳ A carregar os dados mais recentes. A mostrar a vista gravada há {minutos:.0f} min.")
+    aguardar_snapshot()
 
 
 # ---------------------------------------------------
@@ -139,192 +237,402 @@ with st.sidebar:
 # ---------------------------------------------------
 st.subheader("📈 Curva de Voo")
 
-# Verificar se após os filtros existem datas válidas
-valid_dates = df_filtrado["First_Detection_Date"].dropna()
-
-if valid_dates.empty:
+if paineis["total"] == 0:
     # Aviso informativo ao utilizador (não é um erro)
     st.info("Sem deteções nas localizações/intervalo selecionados — gráfico vazio (não há datas).")
 
-    # Escolher um intervalo razoável para desenhar um gráfico vazio:
-    # usamos a menor data do ficheiro mestre (se existir) ou hoje como fallback.
-    mestre_dates = df_mestre["First_Detection_Date"].dropna()
-    if not mestre_dates.empty:
-        start_date = mestre_dates.min().date()
-    else:
-        # fallback simples: hoje (gera uma linha com um único dia)
-        start_date = date.today()
+# Uma linha por dia (com zeros quando não há dados, para evitar erros nas chamadas seguintes)
+df_daily = paineis["curva_diaria"]
 
-    end_date = date.today()
-    full_dates = pd.date_range(start=start_date, end=end_date, freq="D").date
-
-    # DataFrame com zeros (para evitar erros nas chamadas seguintes)
-    df_daily = pd.DataFrame(0, index=full_dates, columns=["femea", "macho", "mosca"])
-else:
-    # Cálculo normal quando há datas
-    start_date = valid_dates.min().date()
-    end_date = date.today()
-    full_dates = pd.date_range(start=start_date, end=end_date, freq="D").date
-
-    df_daily = (
-        df_filtrado.groupby([df_filtrado["First_Detection_Date"].dt.date, "Class"])["Fly_ID"]
-        .count()
-        .unstack(fill_value=0)
-    )
-    df_daily = df_daily.reindex(columns=["femea", "macho", "mosca"], fill_value=0)
-    df_daily = df_daily.reindex(full_dates, fill_value=0)
-
-# Normalizar e preparar para o gráfico (funciona tanto com dados reais como com zeros)
-df_daily.index.name = "Data"
-df_daily = df_daily.reset_index().rename(
-    columns={"femea": "Nº Fêmeas", "macho": "Nº Machos", "mosca": "Nº Moscas"}
-)
-df_daily["Total Moscas"] = df_daily[["Nº Fêmeas", "Nº Machos", "Nº Moscas"]].sum(axis=1)
-df_daily["Acumulado"] = df_daily["Total Moscas"].cumsum()
-
-# Mantém o alerta caso existam dias com mais de 3 moscas (se houver dados reais)
-moscas_altas = df_daily[df_daily["Total Moscas"] > 3]
-if not moscas_altas.empty and valid_dates.size > 0:
-    st.error(f"🚨 Alerta: {len(moscas_altas)} dias com mais de 3 moscas capturadas.")
+if DB_PATH.exists():
+    painel_alertas(*filtros)
 
+# Só seguem para o browser as colunas do gráfico, já em formato longo
 max_y = int(df_daily["Total Moscas"].max() if df_daily["Total Moscas"].size > 0 else 1)
 chart = (
-    alt.Chart(df_daily)
-    .transform_fold(["Nº Fêmeas", "Nº Machos", "Nº Moscas"], as_=["Classe", "Contagem"])
+    alt.Chart(compactacao.curva_longa(df_daily, ["Nº Fêmeas", "Nº Machos", "Nº Moscas"]))
     .mark_line(point=True)
     .encode(
         x=alt.X("Data:T", title="Data", axis=alt.Axis(format="%d %b")),
         y=alt.Y("Contagem:Q", title="Nº Moscas", scale=alt.Scale(domain=[0, max_y + 1])),
         color="Classe:N",
-        tooltip=["Data", "Nº Fêmeas", "Nº Machos", "Nº Moscas", "Acumulado"],
+        tooltip=["Data:T", "Classe:N", "Contagem:Q"],
     )
     .properties(height=300)
     .interactive()
 )
 st.altair_chart(chart, use_container_width=True)
 
+# ---------------------------------------------------
+# Taxa de captura (placa ativa em cada armadilha)
+# ---------------------------------------------------
+st.subheader("📉 Moscas por Armadilha por Dia")
+
+df_taxa = paineis["taxa_captura"]
+if df_taxa is not None:
+    if not df_taxa.empty:
+        st.altair_chart(
+            alt.Chart(compactacao.compactar(df_taxa))
+            .mark_line(point=True)
+            .encode(
+                x=alt.X("Data:T", title="Data", axis=alt.Axis(format="%d %b")),
+                y=alt.Y("Moscas por Armadilha por Dia:Q", title="Moscas/armadilha/dia"),
+                tooltip=["Data:T", "Capturas", "Armadilhas Ativas", alt.Tooltip("Moscas por Armadilha por Dia:Q", format=".2f")],
+            )
+            .properties(height=250)
+            .interactive(),
+            use_container_width=True,
+        )
+    else:
+        st.info("Sem armadilhas com placa exposta nas localizações/intervalo selecionados.")
+else:
+    st.info("Sem datas de colocação das placas em 'placas.db'.")
+
+# ---------------------------------------------------
+# Estado de cada armadilha (calculado na ingestão)
+# ---------------------------------------------------
+tendencias_df = paineis["tendencias"]
+if tendencias_df is not None:
+    st.subheader("🧭 Estado do Voo por Armadilha")
+    st.dataframe(
+        compactacao.compactar(tendencias_df.drop(columns="ID Armadilha")),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Crescimento Semanal": st.column_config.NumberColumn(format="percent"),
+            "Início do Voo": st.column_config.DateColumn(format="DD/MM/YYYY"),
+            "Data do Pico": st.column_config.DateColumn(format="DD/MM/YYYY"),
+        },
+    )
+
 
 # ---------------------------------------------------
 # Tabelas
 # ---------------------------------------------------
 st.subheader("📋 Resumo Diário de Moscas")
-st.dataframe(
-    df_daily[["Data", "Nº Fêmeas", "Nº Machos", "Nº Moscas", "Acumulado"]].sort_values(
-        "Data", ascending=False
-    ),
-    use_container_width=True,
+tabela_paginada(
+    "resumo_diario",
+    df_daily[["Data", "Nº Fêmeas", "Nº Machos", "Nº Moscas", "Acumulado"]],
+    ordenar_por="Data",
+    descendente=True,
+    hide_index=True,
+)
+botoes_exportacao(
+    "curva_diaria", df_daily, colunas=["Data", "Nº Fêmeas", "Nº Machos", "Nº Moscas", "Total Moscas", "Acumulado"]
 )
 
 st.subheader("📊 Total de Moscas por Classe")
-capturas_classes = (
-    df_filtrado["Class"]
-    .value_counts()
-    .reindex(["femea", "macho", "mosca"], fill_value=0)
-    .reset_index()
-)
-capturas_classes.columns = ["Classe", "Total"]
-st.bar_chart(capturas_classes.set_index("Classe"))
+capturas_classes = paineis["totais_por_classe"]
+st.bar_chart(compactacao.compactar(capturas_classes).set_index("Classe"))
 
 st.subheader("📅 Moscas Capturadas por Semana")
-df_filtrado["Semana"] = df_filtrado["First_Detection_Date"].dt.isocalendar().week
-semanal_df = (
-    df_filtrado.groupby(["Semana", "Class"])["Fly_ID"]
-    .count()
-    .unstack(fill_value=0)
-    .reindex(columns=["femea", "macho", "mosca"], fill_value=0)
-)
-st.dataframe(semanal_df, use_container_width=True)
+semanal_df = paineis["por_semana"]
+tabela_paginada("semanal", semanal_df)
 
 st.subheader("📆 Moscas Capturadas por Mês")
-df_filtrado["Mês"] = df_filtrado["First_Detection_Date"].dt.strftime("%Y-%m (%B)")
-mensal_df = (
-    df_filtrado.groupby(["Mês", "Class"])["Fly_ID"]
-    .count()
-    .unstack(fill_value=0)
-    .reindex(columns=["femea", "macho", "mosca"], fill_value=0)
-)
-st.dataframe(mensal_df, use_container_width=True)
+mensal_df = paineis["por_mes"]
+tabela_paginada("mensal", mensal_df)
 
 st.subheader("🪧 Total de Moscas Capturadas por Placa")
-placa_df = (
-    df_filtrado.groupby(["Placa ID", "Class"])["Fly_ID"]
-    .count()
-    .unstack(fill_value=0)
-    .reindex(columns=["femea", "macho", "mosca"], fill_value=0)
-)
-st.dataframe(placa_df, use_container_width=True)
+placa_df = paineis["por_placa"]
+tabela_paginada("por_placa", placa_df)
+botoes_exportacao("moscas_por_placa", placa_df, index=True)
+
+exposicao_df = paineis["exposicao_por_placa"]
+if exposicao_df is not None:
+    st.subheader("⏱️ Exposição e Capturas por Placa")
+    tabela_paginada("exposicao", exposicao_df, ordenar_por="Início", descendente=True, hide_index=True)
 
 # ---------------------------------------------------
 # Mapa de Armadilhas
 # ---------------------------------------------------
 st.subheader("🗺️ Mapa Localização das Armadilhas ")
 
-if not df_localizacoes.empty:
-    df_mapa = df_localizacoes[["Latitude", "Longitude"]].dropna().drop_duplicates()
-else:
-    df_mapa = df_filtrado[["Latitude", "Longitude"]].dropna().drop_duplicates()
-
+df_mapa = paineis["mapa"]
 if not df_mapa.empty:
     st.map(df_mapa.rename(columns={"Latitude": "latitude", "Longitude": "longitude"}))
 else:
     st.info("Sem coordenadas para o mapa.")
 
 # ---------------------------------------------------
-# Imagens apenas com deteções (filtradas)
+# Posição das capturas nas placas (mapa de calor)
 # ---------------------------------------------------
-with st.expander("📁 Ver imagens de deteção por data de processamento", expanded=True):
-    if not df_filtrado.empty:
-        # Limpar nomes das imagens
-        df_filtrado["First_Detection_Image_clean"] = (
-            df_filtrado["First_Detection_Image"].str.strip().str.lower()
-        )
+# Soma dos histogramas por placa e dia calculados na ingestão; escolher
+# placas ou classes só volta a correr este fragmento.
+@st.fragment
+@metricas.FRAGMENTO_SEGUNDOS.medido(fragmento="mapa_calor")
+def painel_mapa_calor(localizacoes, inicio, fim):
+    mapa = snapshot.mapa_calor
+    controlos = st.columns(2)
+    placas = controlos[0].multiselect("Placas (todas, se vazio)", mapa.placas(localizacoes), key="mapa_calor_placas")
+    classes = controlos[1].multiselect(
+        "Classes", sobreposicoes.CLASSES, default=sobreposicoes.CLASSES, format_func=str.capitalize,
+        key="mapa_calor_classes",
+    )
 
-        # Agrupar por imagem e localização e contar Fly_ID por classe
-        df_counts = (
-            df_filtrado.groupby(["First_Detection_Image_clean", "Localização", "Class"])["Fly_ID"]
-            .nunique()
-            .unstack(fill_value=0)
-            .reset_index()
+    matriz = mapa.somar(localizacoes, placas, classes, inicio, fim)
+    if matriz.sum() == 0:
+        st.info("Sem caixas de deteção nas placas/intervalo selecionados.")
+        return
+
+    st.altair_chart(
+        alt.Chart(mapa.tabela(matriz))
+        .mark_rect()
+        .encode(
+            x=alt.X("x:Q", title="x (px)", scale=alt.Scale(domain=[0, mapa.largura])),
+            x2="x2:Q",
+            y=alt.Y("y:Q", title="y (px)", scale=alt.Scale(domain=[0, mapa.altura], reverse=True)),
+            y2="y2:Q",
+            color=alt.Color("Moscas:Q", scale=alt.Scale(scheme="inferno")),
+            tooltip=["Moscas:Q"],
         )
+        .properties(height=400),
+        use_container_width=True,
+    )
+    st.caption(f"{int(matriz.sum())} moscas (cada mosca conta uma vez, na primeira fotografia)")
+
+st.subheader("🎯 Posição das Capturas nas Placas")
+if snapshot is not None and snapshot.mapa_calor is not None:
+    painel_mapa_calor(*filtros)
+elif snapshot is None:
+    st.info("O mapa de calor fica disponível quando os dados carregarem.")
+else:
+    st.info("Sem coordenadas das caixas ('results.csv').")
 
-        # Ordenar pelas mais recentes
-        df_counts = df_counts.merge(
-            df_filtrado[["First_Detection_Image_clean", "First_Detection_Date"]].drop_duplicates(),
-            on="First_Detection_Image_clean",
-            how="left",
-        ).sort_values(by="First_Detection_Date", ascending=False)
-
-        # Iterar pelas imagens filtradas
-        for _, row in df_counts.iterrows():
-            img_name = row["First_Detection_Image_clean"]
-            localizacao = row["Localização"]
-            img_date = row["First_Detection_Date"].date() if pd.notna(row["First_Detection_Date"]) else "Sem data"
-
-            n_f = int(row.get("femea", 0) or 0)
-            n_m = int(row.get("macho", 0) or 0)
-            n_mo = int(row.get("mosca", 0) or 0)
-
-            # Exibir cabeçalho da imagem
-            st.markdown(f"### 🖼️ {img_date}")
-            st.markdown(f"**📍 Localização:** {localizacao}")
-            st.markdown(f"**🔢 Deteções:** F: {n_f} | M: {n_m} | Mo: {n_mo}")
-
-            # Mostrar as imagens correspondentes
-            colunas = st.columns(3)
-            for i, classe in enumerate(["femea", "macho", "mosca"]):
-                img_nome_classe = f"{img_name}_det_{classe}.jpg"
-                img_path = BASE_DIR / "../tese_public/detections_output" / img_nome_classe
-                if img_path.exists():
-                    with colunas[i]:
-                        st.image(str(img_path), caption=classe.capitalize(), use_container_width=True)
+# ---------------------------------------------------
+# Imagens apenas com deteções (filtradas)
+# ---------------------------------------------------
+# O manifesto da galeria (imagens, contagens e ficheiros disponíveis) é
+# construído pelo worker uma vez por geração; aqui só é fatiado.
+TAMANHO_PAGINA_GALERIA = galeria.TAMANHO_PAGINA
+LARGURA_IMAGEM_GALERIA = galeria.LARGURA_IMAGEM
+
+# Cache de imagens partilhada por todas as sessões e pré-carregamento em segundo plano
+@st.cache_resource
+def obter_cache_imagens():
+    cache = cache_imagens.CacheBytes()
+    metricas.registar_cache("imagens", cache.estatisticas)
+    return cache
+
+@st.cache_resource
+def obter_pre_carregador():
+    return cache_imagens.PreCarregador(obter_cache_imagens())
+
+# Caixas de cada imagem (results.csv), agrupadas uma vez por geração de dados
+@st.cache_data(max_entries=2)
+def caixas_por_imagem(geracao, _df_caixas):
+    colunas = ["classe", "x_min", "y_min", "x_max", "y_max"]
+    return {
+        imagem: tuple(grupo[colunas].itertuples(index=False, name=None))
+        for imagem, grupo in _df_caixas.groupby("imagem")
+    }
+
+# Uma imagem base com as caixas das classes escolhidas: chave da cache e função que a desenha
+# (ou None, se a imagem já não existe). A imagem vem de um ficheiro solto ou, se já foi
+# arquivada, do arquivo por semanas. Um ficheiro que desapareceu depois do snapshot
+# (arquivado, compactado ou descartado) é procurado no arquivo pelo nome; se não estiver
+# lá, só volta a aparecer no snapshot seguinte.
+# Imagens já anotadas pelo processamento são mostradas como estão (sem caixas).
+def tarefa_imagem(row, classes):
+    cache = obter_cache_imagens()
+    caixas = caixas_imagens.get(row.Imagem, ()) if row.Original else ()
+    arquivado = row.Arquivo
+    origem = None
+    if pd.notna(row.Caminho):
+        caminho = pathlib.Path(row.Caminho)
+        try:
+            origem = (str(caminho), caminho.stat().st_mtime_ns)
+            ler = lambda: cache.ler_ficheiro(caminho)
+        except FileNotFoundError:
+            arquivado = caminho.name
+    if origem is None:
+        origem = snapshot.arquivo.localizacao(arquivado) if pd.notna(arquivado) else None
+        if origem is None:
+            return None
+        ler = lambda: cache.obter_ou_calcular(("arquivo", *origem), lambda: snapshot.arquivo.ler(arquivado))
+
+    chave = (*origem, caixas, classes)
+    return chave, lambda: sobreposicoes.desenhar_caixas(ler(), caixas, classes, largura_max=LARGURA_IMAGEM_GALERIA)
+
+def tarefas_pagina(df_pagina, classes):
+    tarefas = (
+        tarefa_imagem(row, classes)
+        for row in df_pagina.itertuples(index=False)
+        if pd.notna(row.Caminho) or pd.notna(row.Arquivo)
+    )
+    return [tarefa for tarefa in tarefas if tarefa is not None]
+
+# Cabeçalho de uma imagem da galeria
+def cabecalho_imagem(row):
+    img_date = row.Data.date() if pd.notna(row.Data) else "Sem data"
+    st.markdown(f"### 🖼️ {img_date}")
+    st.markdown(f"**📍 Localização:** {row.Localização}")
+    st.markdown(f"**🔢 Deteções:** F: {row.femea} | M: {row.macho} | Mo: {row.mosca}")
+
+# Fragmento: escolher classes ou mudar de página só volta a correr a galeria
+@st.fragment
+@metricas.FRAGMENTO_SEGUNDOS.medido(fragmento="galeria")
+def galeria_imagens(localizacoes, inicio, fim):
+    with st.expander("📁 Ver imagens de deteção por data de processamento", expanded=True):
+        # Sem imagens sem anotações, as caixas já vêm desenhadas e não é possível escolher classes
+        tem_originais = bool(snapshot.df_galeria["Original"].any())
+        classes_visiveis = st.multiselect(
+            "Classes a desenhar",
+            sobreposicoes.CLASSES,
+            default=sobreposicoes.CLASSES,
+            format_func=str.capitalize,
+            disabled=not tem_originais,
+        )
+        if tem_originais:
+            st.caption("Fêmea: vermelho · Macho: azul · Mosca: laranja")
+        else:
+            st.caption(
+                "Sem fotografias originais: as imagens já trazem as caixas desenhadas pelo processamento, "
+                "pelo que as classes não podem ser escolhidas."
+            )
+
+        df_galeria = galeria.filtrar_galeria(snapshot.df_galeria, localizacoes, inicio, fim)
+
+        if not df_galeria.empty:
+            classes = tuple(classes_visiveis)
+            cache = obter_cache_imagens()
+
+            n_paginas = -(-len(df_galeria) // TAMANHO_PAGINA_GALERIA)
+            # A chave muda com o número de páginas, para voltar à primeira quando os filtros mudam
+            pagina = st.number_input(
+                f"Página (de {n_paginas})", min_value=1, max_value=n_paginas, value=1, key=f"pagina_galeria_{n_paginas}"
+            )
+            inicio_pagina = (pagina - 1) * TAMANHO_PAGINA_GALERIA
+            df_pagina = df_galeria.iloc[inicio_pagina:inicio_pagina + TAMANHO_PAGINA_GALERIA]
+
+            # Iterar pelas imagens da página (já ordenadas pelas mais recentes)
+            for row in df_pagina.itertuples(index=False):
+                cabecalho_imagem(row)
+
+                # Mostrar a imagem base com as caixas das classes escolhidas
+                if pd.notna(row.Caminho) or pd.notna(row.Arquivo):
+                    tarefa = tarefa_imagem(row, classes)
+                    try:
+                        imagem = cache.obter_ou_calcular(*tarefa) if tarefa is not None else None
+                    except FileNotFoundError:
+                        imagem = None
+                    if imagem is not None:
+                        st.image(imagem, use_container_width=True)
+                        metricas.IMAGENS_SERVIDAS.incrementar(painel="galeria")
+                        if tem_originais and not row.Original:
+                            st.caption("Imagem já anotada pelo processamento (sem fotografia original).")
+                    else:
+                        st.warning("A imagem foi movida ou removida depois da última leitura dos dados; "
+                                   "volta a aparecer na próxima atualização.")
                 else:
-                    with colunas[i]:
-                        st.warning(f"Sem deteção de {classe}.")
+                    st.warning("Sem imagem de deteção.")
+                st.markdown("---")
+
+            # Preparar a página seguinte enquanto esta está a ser vista
+            df_seguinte = df_galeria.iloc[
+                inicio_pagina + TAMANHO_PAGINA_GALERIA:inicio_pagina + 2 * TAMANHO_PAGINA_GALERIA
+            ]
+            obter_pre_carregador().pre_carregar(tarefas_pagina(df_seguinte, classes))
+
+            stats = cache.estatisticas()
+            st.caption(
+                f"Cache de imagens: {stats['bytes'] / 1e6:.0f} MB de {stats['limite_bytes'] / 1e6:.0f} MB · "
+                f"{stats['entradas']} entradas · taxa de acerto {stats['taxa_acerto']:.0%}"
+            )
+        else:
+            st.info("Sem imagens para as localizações/intervalo selecionados.")
+
+# Primeira página já desenhada na ingestão (arranque a frio, sem filtros)
+def galeria_vista_inicial(vista):
+    with st.expander("📁 Ver imagens de deteção por data de processamento", expanded=True):
+        n_paginas = -(-vista["n_imagens_galeria"] // TAMANHO_PAGINA_GALERIA)
+        st.caption(f"Página 1 de {n_paginas} · as restantes páginas ficam disponíveis quando os dados carregarem")
+        for linha, imagem in vista["galeria"]:
+            cabecalho_imagem(SimpleNamespace(**linha))
+            if imagem is not None:
+                st.image(imagem, use_container_width=True)
+                metricas.IMAGENS_SERVIDAS.incrementar(painel="vista_inicial")
+            else:
+                st.warning("Sem imagem de deteção.")
             st.markdown("---")
-    else:
-        st.info("Sem imagens para as localizações/intervalo selecionados.")
+
+if snapshot is not None:
+    caixas_imagens = caixas_por_imagem(snapshot.geracao, snapshot.df_caixas)
+    galeria_imagens(*filtros)
+else:
+    galeria_vista_inicial(vista)
+
+# ---------------------------------------------------
+# Revisão de deteções (recortes de cada mosca)
+# ---------------------------------------------------
+# Os recortes são feitos na ingestão e lidos dos blocos em mmap; cada
+# página é montada numa única imagem (uma grelha de COLUNAS_GRELHA colunas).
+COLUNAS_GRELHA = 20
+RECORTES_POR_PAGINA = 400
+ORDENS_RECORTES = {
+    "Confiança crescente": ("confianca", True),
+    "Confiança decrescente": ("confianca", False),
+    "Mais recentes": ("Data", False),
+}
+
+# Índice dos recortes com a data e a localização de cada imagem, uma vez por geração
+@st.cache_data(max_entries=2)
+def indice_recortes(geracao, _df_recortes, _df_galeria):
+    return _df_recortes.merge(
+        _df_galeria[["Imagem", "Data", "Localização"]], left_on="imagem", right_on="Imagem", how="inner"
+    ).drop(columns="Imagem")
+
+@st.fragment
+@metricas.FRAGMENTO_SEGUNDOS.medido(fragmento="recortes")
+def grelha_recortes(localizacoes, inicio, fim):
+    with st.expander("🔬 Revisão de deteções (recortes de cada mosca)"):
+        controlos = st.columns(3)
+        classes = controlos[0].multiselect(
+            "Classes", sobreposicoes.CLASSES, default=sobreposicoes.CLASSES, format_func=str.capitalize,
+            key="recortes_classes",
+        )
+        confianca = controlos[1].slider("Confiança", 0.0, 1.0, (0.0, 1.0), step=0.01, key="recortes_confianca")
+        ordem = controlos[2].selectbox("Ordenar por", list(ORDENS_RECORTES), key="recortes_ordem")
+
+        df = galeria.filtrar_galeria(indice_recortes(snapshot.geracao, snapshot.df_recortes, snapshot.df_galeria),
+                                     localizacoes, inicio, fim)
+        df = df[df["classe"].isin(classes) & df["confianca"].fillna(0).between(*confianca)]
+        if df.empty:
+            st.info("Sem deteções para os filtros selecionados.")
+            return
+
+        coluna, ascendente = ORDENS_RECORTES[ordem]
+        df = df.sort_values(coluna, ascending=ascendente, kind="stable")
+        n_paginas = -(-len(df) // RECORTES_POR_PAGINA)
+        pagina = st.number_input(
+            f"Página (de {n_paginas})", min_value=1, max_value=n_paginas, value=1, key=f"pagina_recortes_{n_paginas}"
+        )
+        df_pagina = df.iloc[(pagina - 1) * RECORTES_POR_PAGINA:pagina * RECORTES_POR_PAGINA]
+
+        chave = ("grelha_recortes", tuple(df_pagina["ID"]))
+        folha = obter_cache_imagens().obter_ou_calcular(
+            chave, lambda: recortes.grelha(recortes.ler(ingestor.pasta_recortes, df_pagina), COLUNAS_GRELHA)
+        )
+        st.image(folha, use_container_width=True)
+        metricas.IMAGENS_SERVIDAS.incrementar(painel="grelha_recortes")
+        st.caption(f"{len(df)} deteções · recortes por linha, da esquerda para a direita")
+
+        st.dataframe(
+            compactacao.compactar(
+                df_pagina[["ID", "classe", "confianca", "Data", "Localização", "imagem"]].reset_index(drop=True)
+            ),
+            use_container_width=True,
+            column_config={"confianca": st.column_config.NumberColumn("Confiança", format="%.2f")},
+        )
+
+if snapshot is not None and snapshot.df_recortes is not None and not snapshot.df_recortes.empty:
+    grelha_recortes(*filtros)
 
 # ---------------------------------------------------
 # Rodapé
 # ---------------------------------------------------
 st.caption("Dashboard monitorização da mosca da azeitona · Desenvolvido por Rafael Rodrigues")
+
+# Reruns completos (os que param mais cedo são registados em parar_rerun; os
+# fragmentos são medidos à parte, em FRAGMENTO_SEGUNDOS)
+metricas.RERUN_SEGUNDOS.observar(time.perf_counter() - inicio_rerun)
@@ -0,0 +1,220 @@
+import argparse
+import io
+import logging
+import pathlib
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import armazem_imagens
+import arquivo_imagens
+import cache_imagens
+
+# ---------------------------------------------------
+# Fotografias quase repetidas (hash percetual)
+# ---------------------------------------------------
+# As armadilhas às vezes enviam várias fotografias quase iguais com minutos
+# de diferença. Na ingestão, cada fotografia nova recebe um dHash de 64 bits
+# (imagem reduzida a 9×8 em tons de cinzento, um bit por comparação entre
+# píxeis vizinhos), guardado na tabela hashes_imagens de placas.db. Uma
+# fotografia cuja distância de Hamming a uma fotografia original da mesma
+# placa, nos JANELA_MINUTOS anteriores, seja até LIMIAR_HAMMING fica marcada
+# como repetida (duplicado_de) e as suas linhas do results.csv não seguem para
+# o resto da ingestão: contagens, remoção de duplicados, caixas, mapa de calor
+# e recortes.
+#
+# As moscas do ficheiro mestre cuja primeira deteção é uma fotografia repetida
+# não são removidas: a First_Detection_Image passa a ser a fotografia original
+# (remapear), pelo que continuam a contar na galeria, na linha da original. As
+# caixas dessas moscas só existem nas imagens da fotografia repetida e não são
+# desenhadas.
+#
+# O hash só é calculado para fotografias que ainda não estão na tabela.
+# `python duplicados.py --descartar` apaga as imagens de deteção das
+# fotografias repetidas (ficheiros soltos e blobs do armazém), exceto as que
+# o ficheiro mestre ainda referencia como primeira deteção de uma mosca.
+
+JANELA_MINUTOS = 60
+LIMIAR_HAMMING = 10
+LADO_HASH = 8
+
+log = logging.getLogger(__name__)
+
+
+def ligar(db_path):
+    conn = sqlite3.connect(db_path)
+    criar_tabela(conn)
+    return conn
+
+
+def criar_tabela(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS hashes_imagens (
+            imagem TEXT PRIMARY KEY,
+            placa_id TEXT,
+            data TEXT NOT NULL,
+            hash INTEGER NOT NULL,
+            duplicado_de TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_hashes_placa_data ON hashes_imagens (placa_id, data);
+    """)
+    conn.commit()
+
+
+# dHash de 64 bits (com sinal, para caber num INTEGER do SQLite)
+def dhash(dados, lado=LADO_HASH):
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(dados))
+    img.draft("L", (lado * 8, lado * 8))  # descodificação JPEG já reduzida
+    pixels = np.asarray(img.convert("L").resize((lado + 1, lado), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    valor = int(np.packbits(bits).view(">u8")[0])
+    return valor - (1 << 64) if valor >= 1 << 63 else valor
+
+
+def distancia(a, b):
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+
+# Bytes de uma fotografia: o original, se existir, ou uma das imagens de deteção
+# (soltas, no armazém ou no arquivo por semanas)
+def ler_imagem(pasta, manifesto, arquivo, imagem):
+    pasta = pathlib.Path(pasta)
+    if (pasta / imagem).exists():
+        return cache_imagens.ler_bytes(pasta / imagem)
+    for classe in ["mosca", "femea", "macho"]:
+        caminho = armazem_imagens.resolver(manifesto, imagem, classe, pasta)
+        if caminho.exists():
+            return cache_imagens.ler_bytes(caminho)
+        nome = armazem_imagens.nome_detecao(imagem, classe)
+        if nome in arquivo:
+            return arquivo.ler(nome)
+    return None
+
+
+# Calcula o hash das fotografias novas do results.csv e marca as repetidas;
+# devolve todas as fotografias repetidas ({imagem: original})
+def registar(conn, df_resultados, ler):
+    datas = df_resultados["Data imagem"]
+    if getattr(datas.dt, "tz", None) is not None:
+        datas = datas.dt.tz_convert(None)
+    fotografias = pd.DataFrame({
+        "imagem": df_resultados["Nome da imagem"].str.strip().str.lower(),
+        "placa_id": df_resultados["Placa ID"],
+        "data": datas,
+    }).dropna(subset=["imagem", "data"]).drop_duplicates("imagem")
+
+    conhecidas = {imagem for (imagem,) in conn.execute("SELECT imagem FROM hashes_imagens")}
+    novas = fotografias[~fotografias["imagem"].isin(conhecidas)].sort_values("data", kind="stable")
+
+    janela = pd.Timedelta(minutes=JANELA_MINUTOS)
+    for imagem, placa_id, data in novas.itertuples(index=False, name=None):
+        try:
+            dados = ler(imagem)
+            if dados is None:
+                continue
+            valor = dhash(dados)
+        except OSError as e:
+            log.warning("Erro a calcular o hash de %s: %s", imagem, e)
+            continue
+
+        original = None
+        if pd.notna(placa_id):
+            candidatas = conn.execute(
+                """
+                SELECT imagem, hash FROM hashes_imagens
+                WHERE placa_id = ? AND data BETWEEN ? AND ? AND duplicado_de IS NULL
+                ORDER BY data DESC
+                """,
+                (placa_id, (data - janela).isoformat(), data.isoformat()),
+            )
+            original = next((outra for outra, h in candidatas if distancia(valor, h) <= LIMIAR_HAMMING), None)
+
+        conn.execute(
+            "INSERT INTO hashes_imagens (imagem, placa_id, data, hash, duplicado_de) VALUES (?, ?, ?, ?, ?)",
+            (imagem, None if pd.isna(placa_id) else placa_id, data.isoformat(), valor, original),
+        )
+    conn.commit()
+    return repetidas(conn)
+
+
+def repetidas(conn):
+    return dict(conn.execute("SELECT imagem, duplicado_de FROM hashes_imagens WHERE duplicado_de IS NOT NULL"))
+
+
+# Substitui as fotografias repetidas pela original (nomes normalizados como na galeria)
+def remapear(imagens, repetidas):
+    normalizadas = imagens.str.strip().str.lower()
+    return normalizadas.map(repetidas).fillna(imagens)
+
+
+def listar(conn):
+    return pd.read_sql_query(
+        "SELECT imagem, duplicado_de, placa_id, data FROM hashes_imagens WHERE duplicado_de IS NOT NULL ORDER BY data",
+        conn,
+    )
+
+
+# Apaga as imagens de deteção das fotografias repetidas que ainda não foram
+# arquivadas, exceto as referenciadas (primeira deteção de uma mosca no
+# ficheiro mestre); devolve o número de ficheiros e os bytes libertados
+def descartar(pasta, repetidas, referenciadas, simular=False):
+    pasta = pathlib.Path(pasta)
+    manifesto = armazem_imagens.carregar_manifesto(pasta)
+    referenciadas = {imagem.strip().lower() for imagem in referenciadas}
+    nomes = [
+        armazem_imagens.nome_detecao(imagem, classe)
+        for imagem in sorted(set(repetidas) - referenciadas)
+        for classe in ["femea", "macho", "mosca"]
+    ]
+
+    n_ficheiros, n_bytes = 0, 0
+    for nome in nomes:
+        solto = pasta / nome
+        if solto.exists():
+            n_ficheiros += 1
+            n_bytes += solto.stat().st_size
+            if not simular:
+                solto.unlink()
+        if nome in manifesto:
+            n_ficheiros += 1
+            if not simular:
+                manifesto.pop(nome)
+
+    if not simular:
+        armazem_imagens.guardar_manifesto(manifesto, pasta)
+        blobs_antes = sum(b.stat().st_size for b in (pasta / armazem_imagens.PASTA_BLOBS).glob("*/*.jpg"))
+        arquivo_imagens.remover_blobs_orfaos(pasta, manifesto)
+        n_bytes += blobs_antes - sum(b.stat().st_size for b in (pasta / armazem_imagens.PASTA_BLOBS).glob("*/*.jpg"))
+    return n_ficheiros, n_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lista (e opcionalmente descarta) as fotografias quase repetidas.")
+    parser.add_argument("--db", default=str(armazem_imagens.BASE_DIR / "placas.db"))
+    parser.add_argument("--pasta", default=str(armazem_imagens.PASTA_DETECOES))
+    parser.add_argument("--mestre", default=str(armazem_imagens.BASE_DIR / "dashboard_data.xlsx"),
+                        help="Ficheiro mestre (as imagens que referencia nunca são apagadas)")
+    parser.add_argument("--descartar", action="store_true", help="Apaga as imagens de deteção das fotografias repetidas")
+    parser.add_argument("--simular", action="store_true", help="Com --descartar, só mostra o que seria apagado")
+    args = parser.parse_args()
+
+    conn = ligar(args.db)
+    try:
+        df = listar(conn)
+    finally:
+        conn.close()
+    for linha in df.itertuples(index=False):
+        print(f"{linha.data}  {linha.placa_id}  {linha.imagem} ~ {linha.duplicado_de}")
+    print(f"{len(df)} fotografias repetidas")
+
+    if args.descartar:
+        # Sem o ficheiro mestre não se sabe que imagens ainda são referenciadas
+        if not pathlib.Path(args.mestre).exists():
+            parser.error(f"ficheiro mestre não encontrado: {args.mestre}")
+        referenciadas = pd.read_excel(args.mestre, engine="openpyxl")["First_Detection_Image"].dropna()
+        n_ficheiros, n_bytes = descartar(args.pasta, set(df["imagem"]), set(referenciadas), simular=args.simular)
+        verbo = "seriam apagados" if args.simular else "apagados"
+        print(f"{n_ficheiros} ficheiros {verbo} ({n_bytes / 1e6:.1f} MB)")
@@ -0,0 +1,142 @@
+import io
+import numpy as np
+
+# ---------------------------------------------------
+# Exportação em blocos (CSV e Parquet)
+# ---------------------------------------------------
+# Os ficheiros são gerados bloco a bloco a partir da tabela original, sem
+# construir uma segunda cópia da tabela. O pyarrow é opcional (vem com o
+# Streamlit); sem ele apenas o CSV fica disponível.
+#
+# No dashboard, o st.download_button só gera o ficheiro quando é pedido, mas
+# lê-o por inteiro para memória antes de o enviar ao browser (não há envio
+# em blocos). Só a API (GET /moscas.csv e /moscas.parquet) envia os blocos à
+# medida que são gerados, com memória constante.
+
+TAMANHO_BLOCO = 10_000  # linhas por bloco
+
+# Colunas das moscas exportadas (as que existirem no ficheiro mestre)
+COLUNAS_MOSCAS = [
+    "Fly_ID", "Class", "First_Detection_Date", "First_Detection_Image", "Placa ID",
+    "Nome Armadilha", "Localização", "Latitude", "Longitude", "First_Coords", "First_Confidence",
+]
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def parquet_disponivel():
+    return pq is not None
+
+
+# Percorre o DataFrame em fatias de linhas (opcionalmente só as posições indicadas).
+# Uma tabela vazia dá um bloco sem linhas (para exportar pelo menos o cabeçalho)
+def iterar_blocos(df, colunas=None, linhas=None, tamanho_bloco=TAMANHO_BLOCO):
+    if colunas is not None:
+        posicoes_colunas = [df.columns.get_loc(c) for c in colunas]
+    else:
+        posicoes_colunas = slice(None)
+
+    if linhas is None:
+        linhas = np.arange(len(df))
+
+    if len(linhas) == 0:
+        yield df.iloc[:0, posicoes_colunas]
+    for inicio in range(0, len(linhas), tamanho_bloco):
+        yield df.iloc[linhas[inicio:inicio + tamanho_bloco], posicoes_colunas]
+
+
+# Os geradores de cada formato recebem qualquer sequência de DataFrames com as
+# mesmas colunas (fatias de uma tabela ou lotes de uma consulta DuckDB)
+def gerar_csv(blocos, index=False):
+    primeiro = True
+    for bloco in blocos:
+        yield bloco.to_csv(index=index, header=primeiro).encode("utf-8")
+        primeiro = False
+
+
+# Destino de escrita que acumula apenas os bytes do último row group
+class _Buffer(io.RawIOBase):
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def esvaziar(self):
+        dados = b"".join(self.partes)
+        self.partes = []
+        return dados
+
+
+# Cada bloco é escrito como um row group e enviado assim que fica pronto
+def gerar_parquet(blocos, index=False):
+    if pq is None:
+        raise RuntimeError("Exportação Parquet requer o pacote 'pyarrow'.")
+
+    buffer = _Buffer()
+    escritor = None
+    for bloco in blocos:
+        tabela = pa.Table.from_pandas(bloco, preserve_index=index)
+        if escritor is None:
+            escritor = pq.ParquetWriter(buffer, tabela.schema)
+        escritor.write_table(tabela)
+        yield buffer.esvaziar()
+    escritor.close()
+    yield buffer.esvaziar()
+
+
+# Objeto de ficheiro (só de leitura) sobre um gerador de blocos de bytes
+class FluxoBlocos(io.RawIOBase):
+    def __init__(self, blocos):
+        self.blocos = iter(blocos)
+        self.resto = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        while not self.resto:
+            try:
+                self.resto = next(self.blocos)
+            except StopIteration:
+                return 0
+        n = min(len(destino), len(self.resto))
+        destino[:n] = self.resto[:n]
+        self.resto = self.resto[n:]
+        return n
+
+
+FORMATOS = {
+    "csv": (gerar_csv, "text/csv"),
+    "parquet": (gerar_parquet, "application/vnd.apache.parquet"),
+}
+
+
+# Devolve uma função sem argumentos para o st.download_button (geração diferida;
+# o Streamlit guarda o resultado completo em memória)
+def exportador(df, formato, colunas=None, linhas=None, index=False):
+    return exportador_blocos(lambda: iterar_blocos(df, colunas, linhas), formato, index)
+
+
+# O mesmo, para uma função que devolve os blocos (só chamada quando o ficheiro é pedido)
+def exportador_blocos(blocos, formato, index=False):
+    gerar, _ = FORMATOS[formato]
+    return lambda: io.BufferedReader(FluxoBlocos(gerar(blocos(), index)))
+
+
+def mime(formato):
+    return FORMATOS[formato][1]
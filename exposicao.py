@@ -0,0 +1,155 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from datetime import date
+
+# ---------------------------------------------------
+# Placas ativas por armadilha e taxas de captura
+# ---------------------------------------------------
+# Cada placa está ativa na sua armadilha desde a data_colocacao até à
+# colocação da placa seguinte (ou até hoje, se ainda estiver ativa). Cada
+# captura é associada à placa que estava ativa na armadilha nesse momento
+# (merge_asof por armadilha, vetorizado), o que permite calcular os dias de
+# exposição de cada placa e a taxa de captura em moscas por armadilha por dia.
+
+
+def carregar_placas(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql_query(
+            """
+            SELECT
+                p.placa_id AS "Placa ID",
+                p.id_armadilha AS "ID Armadilha",
+                a.nome AS "Nome Armadilha",
+                a.localidade AS "Localização",
+                p.data_colocacao AS "Data Colocação",
+                p.ativa AS "Ativa"
+            FROM placas p
+            JOIN armadilhas a ON p.id_armadilha = a.id
+            """,
+            conn,
+        )
+    finally:
+        conn.close()
+
+
+# Intervalo [início, fim) de cada placa na sua armadilha
+def intervalos_placas(df_placas, hoje=None):
+    hoje = pd.Timestamp(hoje or date.today())
+    df = df_placas.copy()
+    df["Início"] = pd.to_datetime(df["Data Colocação"], errors="coerce")
+    df = df.dropna(subset=["Início"]).sort_values(["ID Armadilha", "Início"], ignore_index=True)
+
+    # Fim: colocação da placa seguinte na mesma armadilha; a última placa
+    # ativa vai até amanhã (inclui o dia de hoje); uma placa inativa sem
+    # sucessora fecha no dia da colocação (sem exposição conhecida)
+    seguinte = df.groupby("ID Armadilha")["Início"].shift(-1)
+    fim_sem_sucessora = np.where(df["Ativa"].fillna(0).astype(bool), hoje + pd.Timedelta(days=1), df["Início"])
+    df["Fim"] = seguinte.fillna(pd.Series(fim_sem_sucessora, index=df.index))
+    df["Dias Exposição"] = ((df["Fim"] - df["Início"]) / pd.Timedelta(days=1)).clip(lower=0)
+    return df
+
+
+# Associa cada linha (captura ou imagem) à placa ativa na armadilha no momento.
+# A armadilha é obtida a partir da "Placa ID" registada na linha.
+def juntar_placa_ativa(df, df_intervalos, coluna_data="First_Detection_Date"):
+    armadilha_da_placa = df_intervalos.set_index("Placa ID")["ID Armadilha"]
+    linhas = df.assign(
+        **{"ID Armadilha": df["Placa ID"].map(armadilha_da_placa), "_ordem": np.arange(len(df))}
+    )
+    com_chave = linhas.dropna(subset=["ID Armadilha", coluna_data]).sort_values(coluna_data)
+    com_chave["ID Armadilha"] = com_chave["ID Armadilha"].astype(df_intervalos["ID Armadilha"].dtype)
+
+    ativas = df_intervalos[["ID Armadilha", "Início", "Fim", "Placa ID"]].rename(columns={"Placa ID": "Placa Ativa"})
+    juntas = pd.merge_asof(
+        com_chave,
+        ativas.sort_values("Início"),
+        left_on=coluna_data,
+        right_on="Início",
+        by="ID Armadilha",
+        direction="backward",
+    )
+    # Fora de qualquer intervalo (antes da primeira placa ou depois de uma placa fechada)
+    juntas.loc[juntas[coluna_data] >= juntas["Fim"], "Placa Ativa"] = np.nan
+
+    resultado = linhas.merge(juntas[["_ordem", "Placa Ativa"]], on="_ordem", how="left")
+    return resultado.drop(columns="_ordem").set_axis(df.index)
+
+
+# ---------------------------------------------------
+# Séries pré-calculadas
+# ---------------------------------------------------
+# Exposição e capturas por placa (usando a placa ativa, não a registada)
+def exposicao_por_placa(df_capturas, df_intervalos):
+    capturas = df_capturas.dropna(subset=["Placa Ativa"]).groupby("Placa Ativa")["Fly_ID"].count()
+    df = df_intervalos[["Placa ID", "Nome Armadilha", "Localização", "Início", "Fim", "Dias Exposição", "Ativa"]].copy()
+    df["Capturas"] = df["Placa ID"].map(capturas).fillna(0).astype(int)
+    df["Moscas por Dia"] = (df["Capturas"] / df["Dias Exposição"].where(df["Dias Exposição"] > 0)).round(3)
+    return df.sort_values("Início", ascending=False, ignore_index=True)
+
+
+# Uma linha por (dia, localização): capturas e armadilhas com placa exposta nesse dia
+def serie_capturas_armadilha_dia(df_capturas, df_intervalos, hoje=None):
+    hoje = pd.Timestamp(hoje or date.today())
+    intervalos = df_intervalos[df_intervalos["Dias Exposição"] > 0]
+    if intervalos.empty:
+        return pd.DataFrame(columns=["Data", "Localização", "Capturas", "Armadilhas Ativas"])
+
+    dias = pd.date_range(intervalos["Início"].min(), min(intervalos["Fim"].max() - pd.Timedelta(days=1), hoje), freq="D")
+
+    # Armadilhas expostas por dia e localização: +1 no início e -1 no fim de cada intervalo
+    eventos = pd.concat([
+        intervalos[["Início", "Localização"]].rename(columns={"Início": "Data"}).assign(delta=1),
+        intervalos[["Fim", "Localização"]].rename(columns={"Fim": "Data"}).assign(delta=-1),
+    ])
+    ativas = (
+        eventos.groupby(["Data", "Localização"])["delta"].sum()
+        .unstack(fill_value=0)
+        .reindex(dias.union(eventos["Data"].unique()), fill_value=0)
+        .cumsum()
+        .reindex(dias)
+    )
+
+    capturas = (
+        df_capturas.dropna(subset=["Placa Ativa"])
+        .assign(Data=lambda d: d["First_Detection_Date"].dt.normalize())
+        .merge(df_intervalos[["Placa ID", "Localização"]], left_on="Placa Ativa", right_on="Placa ID", suffixes=("_linha", ""))
+        .groupby(["Data", "Localização"])["Fly_ID"].count()
+        .unstack(fill_value=0)
+        .reindex(index=dias, columns=ativas.columns, fill_value=0)
+    )
+
+    serie = pd.DataFrame({
+        "Capturas": capturas.stack(),
+        "Armadilhas Ativas": ativas.stack(),
+    }).rename_axis(["Data", "Localização"]).reset_index()
+    return serie[serie["Armadilhas Ativas"] > 0].reset_index(drop=True)
+
+
+# Taxa de captura (moscas por armadilha por dia) para as localizações selecionadas
+def taxa_captura(serie, localizacoes=None, inicio=None, fim=None):
+    if localizacoes:
+        serie = serie[serie["Localização"].isin(localizacoes)]
+    if inicio is not None and fim is not None:
+        serie = serie[(serie["Data"].dt.date >= inicio) & (serie["Data"].dt.date <= fim)]
+    df = serie.groupby("Data")[["Capturas", "Armadilhas Ativas"]].sum()
+    df["Moscas por Armadilha por Dia"] = df["Capturas"] / df["Armadilhas Ativas"]
+    return df.reset_index()
+
+
+class Exposicao:
+    def __init__(self, intervalos, por_placa, serie):
+        self.intervalos = intervalos
+        self.por_placa = por_placa
+        self.serie = serie
+
+    @classmethod
+    def construir(cls, df_mestre, df_placas, hoje=None):
+        intervalos = intervalos_placas(df_placas, hoje)
+        capturas = juntar_placa_ativa(df_mestre, intervalos)
+        return cls(
+            intervalos,
+            exposicao_por_placa(capturas, intervalos),
+            serie_capturas_armadilha_dia(capturas, intervalos, hoje),
+        )
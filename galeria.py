@@ -0,0 +1,123 @@
+import os
+import pathlib
+import numpy as np
+import pandas as pd
+
+import armazem_imagens
+import cache_imagens
+
+# ---------------------------------------------------
+# Manifesto da galeria (uma linha por imagem)
+# ---------------------------------------------------
+# Construído uma vez por geração de dados, de forma vetorizada: imagem,
+# data, localização, contagens por classe e ficheiro a mostrar (solto, no
+# armazém ou no arquivo por semanas). A galeria só tem de fatiar esta
+# tabela com os filtros ativos.
+#
+# As caixas só podem ser desenhadas (e escolhidas por classe) sobre uma
+# imagem sem anotações ("Original"): a fotografia original, se existir, ou a
+# imagem _det_<classe> de uma classe sem caixas nessa fotografia no
+# results.csv (o processamento só desenha em cada _det_<classe> as caixas da
+# própria classe). Sem nenhuma das duas, é mostrada uma imagem _det_ tal como
+# está, já com as caixas e etiquetas do processamento.
+
+CLASSES = ["femea", "macho", "mosca"]
+
+TAMANHO_PAGINA = 10      # imagens por página
+LARGURA_IMAGEM = 1280    # largura máxima das imagens desenhadas (px)
+
+
+def listar_ficheiros(pasta):
+    try:
+        return set(os.listdir(pasta))
+    except FileNotFoundError:
+        return set()
+
+
+# arquivados: nomes presentes no arquivo por semanas (usados quando não há ficheiro)
+# df_caixas: caixas do results.csv; fotografias: imagens do results.csv (nomes normalizados)
+def construir_manifesto_galeria(
+    df_mestre, pasta=armazem_imagens.PASTA_DETECOES, manifesto=None, arquivados=(), df_caixas=None, fotografias=()
+):
+    pasta = pathlib.Path(pasta)
+    if manifesto is None:
+        manifesto = armazem_imagens.carregar_manifesto(pasta)
+
+    colunas = ["Imagem", "Data", "Localização", *CLASSES, "Caminho", "Arquivo", "Original"]
+    if df_mestre.empty:
+        return pd.DataFrame(columns=colunas)
+
+    imagens = df_mestre["First_Detection_Image"].str.strip().str.lower()
+
+    # Contagem de moscas distintas por imagem, localização e classe
+    df_galeria = (
+        df_mestre.assign(Imagem=imagens)
+        .groupby(["Imagem", "Localização", "Class"])["Fly_ID"]
+        .nunique()
+        .unstack(fill_value=0)
+        .reindex(columns=CLASSES, fill_value=0)
+        .reset_index()
+    )
+    df_galeria.columns.name = None
+
+    # Data de cada imagem (primeira deteção)
+    datas = df_mestre.assign(Imagem=imagens).groupby("Imagem")["First_Detection_Date"].min()
+    df_galeria["Data"] = df_galeria["Imagem"].map(datas)
+
+    # Fotografias do results.csv sem caixas de cada classe (a _det_ dessa classe não tem anotações)
+    fotografias = set(fotografias)
+    com_caixas = set()
+    if df_caixas is not None and not df_caixas.empty:
+        com_caixas = set(zip(df_caixas["imagem"], df_caixas["classe"]))
+
+    # Ficheiros disponíveis: soltos na pasta ou registados no manifesto do armazém
+    ficheiros = listar_ficheiros(pasta)
+    arquivados = set(arquivados)
+    vazia = pd.Series(np.nan, index=df_galeria.index, dtype=object)
+    limpa, limpa_arquivo, anotada, anotada_arquivo = vazia, vazia, vazia, vazia
+    for classe in reversed(CLASSES):
+        nomes = df_galeria["Imagem"] + f"_det_{classe}.jpg"
+        no_armazem = nomes.map(lambda n: manifesto.get(n, {}).get("sha256"))
+        caminhos = no_armazem.map(
+            lambda sha: str(armazem_imagens.caminho_blob(pasta, sha)), na_action="ignore"
+        )
+        soltos = nomes.where(nomes.isin(ficheiros)).map(lambda n: str(pasta / n), na_action="ignore")
+        caminhos = caminhos.combine_first(soltos)
+        no_arquivo = nomes.where(nomes.isin(arquivados))
+
+        sem_caixas = df_galeria["Imagem"].map(lambda imagem: imagem in fotografias and (imagem, classe) not in com_caixas)
+        limpa = caminhos.where(sem_caixas).combine_first(limpa)
+        limpa_arquivo = no_arquivo.where(sem_caixas).combine_first(limpa_arquivo)
+        anotada = caminhos.combine_first(anotada)
+        anotada_arquivo = no_arquivo.combine_first(anotada_arquivo)
+
+    # A fotografia original, se existir, tem prioridade
+    originais = df_galeria["Imagem"].where(df_galeria["Imagem"].isin(ficheiros))
+    limpa = originais.map(lambda n: str(pasta / n), na_action="ignore").combine_first(limpa)
+
+    original = limpa.notna() | limpa_arquivo.notna()
+    df_galeria["Caminho"] = limpa.where(original, anotada)
+    # Imagens arquivadas só são lidas do arquivo quando não há ficheiro solto
+    df_galeria["Arquivo"] = limpa_arquivo.where(original, anotada_arquivo).where(df_galeria["Caminho"].isna())
+    df_galeria["Original"] = original
+
+    return df_galeria.sort_values("Data", ascending=False, ignore_index=True)[colunas]
+
+
+# Fatia o manifesto com os mesmos filtros do dashboard
+def filtrar_galeria(df_galeria, localizacoes=None, inicio=None, fim=None):
+    if localizacoes:
+        df_galeria = df_galeria[df_galeria["Localização"].isin(localizacoes)]
+    if inicio is not None and fim is not None:
+        datas = df_galeria["Data"].dt.date
+        df_galeria = df_galeria[(datas >= inicio) & (datas <= fim)]
+    return df_galeria
+
+
+# Bytes da imagem base de uma linha do manifesto (ficheiro solto ou arquivo por semanas)
+def ler_imagem_base(row, arquivo):
+    if pd.notna(row.Caminho):
+        return cache_imagens.ler_bytes(row.Caminho)
+    if pd.notna(row.Arquivo):
+        return arquivo.ler(row.Arquivo)
+    return None
@@ -0,0 +1,532 @@
+import hashlib
+import logging
+import sqlite3
+import pathlib
+import threading
+import time
+from datetime import date
+import numpy as np
+import pandas as pd
+
+import agregacoes
+import alertas
+import armazem_imagens
+import arquivo_imagens
+import consultas_duckdb
+import cubo
+import duplicados
+import exposicao
+import galeria
+import mapa_calor
+import metricas
+import recortes
+import resultados_csv
+import sobreposicoes
+import tendencias
+import vista_inicial
+
+# ---------------------------------------------------
+# Ingestão em segundo plano
+# ---------------------------------------------------
+# Um único worker (thread) por processo lê o Excel mestre, a BD das placas e
+# o results.csv, faz o merge e a remoção de duplicados, e publica um snapshot
+# imutável. O dashboard só lê o último snapshot publicado, pelo que os reruns
+# dos utilizadores nunca esperam por I/O ou parsing.
+#
+# Com vários processos (servir.py), o resultado da ingestão é guardado numa
+# cache em disco partilhada, por versão dos dados: só o primeiro processo a
+# ver uma versão nova lê as fontes, os outros carregam o resultado.
+
+BASE_DIR = pathlib.Path(__file__).parent.resolve()
+
+INTERVALO_VERIFICACAO = 60  # segundos entre verificações das fontes
+TEMPO_ESPERA = 120          # segundos que um pedido espera pelo primeiro snapshot
+
+log = logging.getLogger(__name__)
+
+
+# Função para extrair centros das bounding boxes a partir da string do CSV
+def extrair_centros(coord_str):
+    if pd.isna(coord_str) or coord_str.strip() == "":
+        return []
+    centros = []
+    boxes = coord_str.split(";")
+    for box in boxes:
+        coords = box.strip().split(",")
+        if len(coords) == 4:
+            try:
+                x_min, y_min, x_max, y_max = map(int, coords)
+                cx = (x_min + x_max) / 2
+                cy = (y_min + y_max) / 2
+                centros.append((cx, cy))
+            except:
+                pass
+    return centros
+
+# Função para remover detecções duplicadas entre dias consecutivos (por placa e classe)
+def remover_detecoes_duplicadas(df, tolerancia_px=30):
+    df = df.sort_values(["Placa ID", "Data imagem"]).copy()
+    df["Data imagem"] = pd.to_datetime(df["Data imagem"])
+
+    # Preenche valores nulos das coord com string vazia
+    for classe in ["femea", "macho", "mosca"]:
+        df[f"Coord. {classe}"] = df[f"Coord. {classe}"].fillna("")
+
+    indices = df.index.to_list()
+
+    for i in range(1, len(indices)):
+        idx_atual = indices[i]
+        idx_anterior = indices[i - 1]
+
+        if df.at[idx_atual, "Placa ID"] != df.at[idx_anterior, "Placa ID"]:
+            # Placas diferentes, não comparar
+            continue
+
+        for classe in ["femea", "macho", "mosca"]:
+            coords_atual = extrair_centros(df.at[idx_atual, f"Coord. {classe}"])
+            coords_ant = extrair_centros(df.at[idx_anterior, f"Coord. {classe}"])
+
+            coords_filtrados = []
+            for (cx, cy) in coords_atual:
+                duplicado = False
+                for (px, py) in coords_ant:
+                    dist = np.sqrt((cx - px) ** 2 + (cy - py) ** 2)
+                    if dist <= tolerancia_px:
+                        duplicado = True
+                        break
+                if not duplicado:
+                    coords_filtrados.append((cx, cy))
+
+            # Atualizar contagem e coordenadas (reconstruir string)
+            df.at[idx_atual, f"Nº {classe}"] = len(coords_filtrados)
+
+            # Reconstruir string no formato original: "x_min,y_min,x_max,y_max; ..."
+            # Criar caixas 20x20 px centradas nos centros filtrados
+            caixas_str = []
+            tamanho = 20
+            for (cx, cy) in coords_filtrados:
+                x_min = int(cx - tamanho/2)
+                y_min = int(cy - tamanho/2)
+                x_max = int(cx + tamanho/2)
+                y_max = int(cy + tamanho/2)
+                caixas_str.append(f"{x_min},{y_min},{x_max},{y_max}")
+            df.at[idx_atual, f"Coord. {classe}"] = "; ".join(caixas_str)
+
+    return df
+
+
+# ---------------------------------------------------
+# Carregadores (correm apenas no worker)
+# ---------------------------------------------------
+def carregar_dados_mestre(master_file):
+    with metricas.CARREGAMENTO_SEGUNDOS.medir(fonte="xlsx"):
+        df = pd.read_excel(master_file, engine='openpyxl')
+    metricas.LINHAS_CARREGADAS.incrementar(len(df), fonte="xlsx")
+    df["First_Detection_Date"] = pd.to_datetime(df["First_Detection_Date"], errors='coerce')
+    df["Localização"] = df["Localização"].fillna("Desconhecida")
+    df["First_Confidence"] = pd.to_numeric(df["First_Confidence"], errors="coerce").fillna(0)
+    df = df.sort_values("First_Detection_Date", ascending=False)
+    return df
+
+
+def carregar_localizacoes(db_path):
+    conn = sqlite3.connect(db_path)
+    query = """
+        SELECT
+            p.placa_id AS "Placa ID",
+            a.nome AS "Nome Armadilha",
+            a.localidade AS "Localização",
+            a.latitude AS "Latitude",
+            a.longitude AS "Longitude"
+        FROM placas p
+        JOIN armadilhas a ON p.id_armadilha = a.id
+    """
+    try:
+        with metricas.CARREGAMENTO_SEGUNDOS.medir(fonte="sqlite"):
+            df = pd.read_sql_query(query, conn)
+    finally:
+        conn.close()
+    metricas.LINHAS_CARREGADAS.incrementar(len(df), fonte="sqlite")
+    return df
+
+
+# Juntar localização das armadilhas ao ficheiro mestre
+def juntar_localizacoes(df_mestre, df_localizacoes):
+    if df_localizacoes.empty:
+        return df_mestre
+
+    df_mestre = df_mestre.merge(df_localizacoes, on="Placa ID", how="left")
+
+    # Substituir valores antigos, se existirem
+    df_mestre["Localização"] = df_mestre["Localização_y"].combine_first(df_mestre.get("Localização_x"))
+    df_mestre["Latitude"] = df_mestre.get("Latitude_y", df_mestre.get("Latitude_x"))
+    df_mestre["Longitude"] = df_mestre.get("Longitude_y", df_mestre.get("Longitude_x"))
+    df_mestre["Nome Armadilha"] = df_mestre.get("Nome Armadilha")
+
+    # Limpar colunas duplicadas
+    return df_mestre.drop(
+        columns=[c for c in df_mestre.columns if c.endswith("_x") or c.endswith("_y")],
+        errors="ignore"
+    )
+
+
+# Leitura estrita (esquema e formatos explícitos); as linhas rejeitadas vão para a quarentena.
+# Devolve o DataFrame e os avisos a mostrar
+def carregar_resultados(csv_file):
+    with metricas.CARREGAMENTO_SEGUNDOS.medir(fonte="csv"):
+        df, df_quarentena, n_datas_nome = resultados_csv.ler(csv_file)
+    metricas.LINHAS_CARREGADAS.incrementar(len(df) + len(df_quarentena), fonte="csv")
+    resultados_csv.guardar_quarentena(df_quarentena, resultados_csv.caminho_quarentena(csv_file))
+
+    avisos = []
+    if not df_quarentena.empty:
+        avisos.append((
+            "warning",
+            f"{len(df_quarentena)} linhas do 'results.csv' não cumprem o formato esperado e foram ignoradas "
+            f"(ver '{resultados_csv.NOME_QUARENTENA}').",
+        ))
+    if n_datas_nome:
+        avisos.append((
+            "info",
+            f"{n_datas_nome} linhas do 'results.csv' sem 'Data imagem' válida usam a hora do nome da imagem.",
+        ))
+    df = df.sort_values("Data imagem", ascending=False)
+    return df, avisos
+
+
+# ---------------------------------------------------
+# Snapshot publicado
+# ---------------------------------------------------
+class Snapshot:
+    def __init__(
+        self, geracao, versao_dados, df_mestre, n_moscas, opcoes_filtros, df_localizacoes, df_resultados, df_caixas,
+        df_galeria, arquivo, cubo, exposicao, df_tendencias, mapa_calor, df_recortes, parquet_moscas, avisos,
+        modificado_em=None
+    ):
+        self.geracao = geracao
+        self.versao_dados = versao_dados
+        self.df_mestre = df_mestre  # sem linhas com o motor DuckDB (as moscas ficam no Parquet)
+        self.n_moscas = n_moscas
+        self.opcoes_filtros = opcoes_filtros  # (localizações, primeira data, última data)
+        self.df_localizacoes = df_localizacoes
+        self.df_resultados = df_resultados
+        self.df_caixas = df_caixas
+        self.df_galeria = df_galeria
+        self.arquivo = arquivo
+        self.cubo = cubo
+        self.exposicao = exposicao
+        self.df_tendencias = df_tendencias
+        self.mapa_calor = mapa_calor
+        self.df_recortes = df_recortes  # índice dos recortes de cada deteção (ou None)
+        self.parquet_moscas = parquet_moscas  # ficheiro das moscas para o motor DuckDB (ou None)
+        self.avisos = avisos
+        self.criado_em = time.time()
+        self.modificado_em = modificado_em or self.criado_em  # modificação mais recente das fontes
+
+
+class Ingestor:
+    def __init__(self, data_dir=BASE_DIR, intervalo=INTERVALO_VERIFICACAO, cache=None, motor="pandas"):
+        data_dir = pathlib.Path(data_dir)
+        self.data_dir = data_dir
+        self.master_file = data_dir / "dashboard_data.xlsx"
+        self.db_path = data_dir / "placas.db"
+        self.csv_file = data_dir / "results.csv"
+        self.pasta_detecoes = data_dir / "detections_output"
+        self.vista_file = data_dir / vista_inicial.NOME_FICHEIRO
+        self.pasta_recortes = data_dir / recortes.PASTA_RECORTES
+        self.intervalo = intervalo
+        self.cache = cache  # cache_partilhada.CachePartilhada com vários processos, ou None
+        self.motor = motor  # "pandas" (cubo em memória) ou "duckdb" (consultas sobre Parquet)
+
+        # Vista "sem filtros" gravada pela última ingestão (mostrada até existir snapshot)
+        self.vista_inicial = vista_inicial.carregar(self.vista_file)
+
+        self._snapshot = None
+        self.erro = None  # exceção da última ingestão falhada (None depois de uma bem-sucedida)
+        self._assinatura = None
+        self._tendencias = None  # motor de tendências, atualizado com as moscas novas
+        self._resultados = None  # (data de modificação e tamanho do results.csv, resultado da leitura)
+        self._pronto = threading.Event()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._ciclo, name="ingestao", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+    # Último snapshot publicado (a troca da referência é atómica)
+    def snapshot(self):
+        return self._snapshot
+
+    # Só bloqueia no arranque a frio, até existir o primeiro snapshot ou a
+    # primeira ingestão falhar. Devolve None se a ingestão falhou ou se o
+    # tempo acabou (a mensagem a mostrar vem de mensagem_indisponivel)
+    def aguardar_snapshot(self, timeout=None):
+        self._pronto.wait(timeout)
+        return self._snapshot
+
+    def mensagem_indisponivel(self):
+        if self.erro is not None:
+            return f"Erro a carregar os dados: {self.erro}"
+        return "Os dados ainda estão a ser carregados. Tenta outra vez daqui a pouco."
+
+    # Data de modificação e tamanho de cada fonte; muda sempre que uma fonte muda
+    # (e uma vez por dia, porque os indicadores dependem do dia de hoje)
+    def _assinatura_fontes(self):
+        assinatura = []
+        manifesto = self.pasta_detecoes / armazem_imagens.NOME_MANIFESTO
+        pasta_arquivo = self.pasta_detecoes / arquivo_imagens.PASTA_ARQUIVO
+        fontes = (self.master_file, self.db_path, self.csv_file, self.pasta_detecoes, manifesto, pasta_arquivo)
+        for caminho in fontes:
+            try:
+                stat = caminho.stat()
+                assinatura.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                assinatura.append(None)
+        assinatura.append(date.today())
+        return tuple(assinatura)
+
+    # Data de modificação mais recente do Excel mestre, de placas.db e do results.csv
+    def _modificacao_fontes(self):
+        datas = [caminho.stat().st_mtime for caminho in (self.master_file, self.db_path, self.csv_file) if caminho.exists()]
+        return max(datas, default=time.time())
+
+    def _ciclo(self):
+        while not self._parar.is_set():
+            try:
+                self.atualizar()
+            except Exception as e:
+                # Quem está à espera do primeiro snapshot é acordado e mostra o erro
+                log.exception("Erro na ingestão")
+                self.erro = e
+                self._pronto.set()
+            self._parar.wait(self.intervalo)
+
+    # Versão dos dados, igual em todos os processos que leem a mesma pasta. Ao
+    # contrário da assinatura, ignora a data de modificação de placas.db (que a
+    # ingestão de alertas altera) e usa o conteúdo das tabelas das armadilhas e placas
+    def _versao_dados(self):
+        assinatura = list(self._assinatura_fontes())
+        del assinatura[1]
+        if self.db_path.exists():
+            conn = sqlite3.connect(self.db_path)
+            try:
+                assinatura.append(conn.execute("SELECT * FROM armadilhas ORDER BY id").fetchall())
+                assinatura.append(conn.execute("SELECT * FROM placas ORDER BY id").fetchall())
+            except sqlite3.Error:
+                assinatura.append(None)
+            finally:
+                conn.close()
+        return hashlib.sha1(repr(assinatura).encode("utf-8")).hexdigest()[:16]
+
+    # Reconstrói o snapshot se alguma fonte mudou desde a última ingestão
+    def atualizar(self, forcar=False):
+        assinatura = self._assinatura_fontes()
+        if not forcar and assinatura == self._assinatura and self._snapshot is not None:
+            return False
+
+        versao = self._versao_dados()
+        # Um leitor do arquivo por geração: usado na ingestão e depois pelo snapshot
+        arquivo = arquivo_imagens.LeitorArquivo(self.pasta_detecoes)
+        try:
+            if self.cache is None:
+                with metricas.INGESTAO_SEGUNDOS.medir():
+                    dados = self._ingerir(versao, arquivo)
+                ingerido_aqui = True
+            else:
+                # Só um processo faz a ingestão de cada versão; os outros esperam e leem-na da cache
+                with self.cache.bloqueio("ingestao"):
+                    dados = None if forcar else self.cache.obter(versao, ("ingestao", self.motor))
+                    ingerido_aqui = dados is None
+                    if ingerido_aqui:
+                        with metricas.INGESTAO_SEGUNDOS.medir():
+                            dados = self._ingerir(versao, arquivo)
+                        self.cache.guardar(versao, ("ingestao", self.motor), dados)
+                        self.cache.limpar(versao)
+                    else:
+                        # As moscas novas desta versão foram registadas por outro processo:
+                        # o motor de tendências local é reconstruído da BD na próxima ingestão
+                        self._tendencias = None
+        except Exception:
+            arquivo.fechar()
+            raise
+
+        anterior = self._snapshot
+        geracao = anterior.geracao + 1 if anterior is not None else 1
+        self._snapshot = Snapshot(
+            geracao,
+            versao_dados=versao,
+            arquivo=arquivo,
+            modificado_em=self._modificacao_fontes(),
+            **dados,
+        )
+        # Os mmaps do arquivo anterior são fechados (uma sessão que ainda esteja
+        # a usar o snapshot anterior volta a abri-los ao ler)
+        if anterior is not None:
+            anterior.arquivo.fechar()
+        metricas.INGESTOES.incrementar(origem="fontes" if ingerido_aqui else "cache")
+        # A ingestão de alertas altera placas.db; a assinatura é lida depois de escrever
+        self._assinatura = self._assinatura_fontes()
+        self.erro = None
+        self._pronto.set()
+
+        # Vista inicial para o próximo arranque a frio (gravada por quem fez a ingestão)
+        if ingerido_aqui:
+            try:
+                vista = vista_inicial.construir(self._snapshot)
+                if vista is not None:
+                    vista_inicial.guardar(vista, self.vista_file)
+            except Exception:
+                log.exception("Erro a gravar a vista inicial")
+        return True
+
+    # Lê as fontes e calcula os agregados (tudo o que o snapshot guarda, exceto o arquivo)
+    def _ingerir(self, versao, arquivo):
+        avisos = []
+
+        if self.master_file.exists():
+            df_mestre = carregar_dados_mestre(self.master_file)
+        else:
+            avisos.append(("error", "Ficheiro 'dashboard_data.xlsx' não encontrado! Executa o script de processamento primeiro."))
+            df_mestre = pd.DataFrame()
+
+        df_localizacoes = pd.DataFrame()
+        df_placas = pd.DataFrame()
+        if not self.db_path.exists():
+            avisos.append(("warning", "Base de dados 'placas.db' não encontrada. Apenas serão usadas localizações do Excel."))
+        else:
+            try:
+                df_localizacoes = carregar_localizacoes(self.db_path)
+                with metricas.CARREGAMENTO_SEGUNDOS.medir(fonte="sqlite"):
+                    df_placas = exposicao.carregar_placas(self.db_path)
+                metricas.LINHAS_CARREGADAS.incrementar(len(df_placas), fonte="sqlite")
+            except Exception as e:
+                avisos.append(("error", f"Erro a ler dados de 'placas.db': {e}"))
+
+        if not df_mestre.empty:
+            df_mestre = juntar_localizacoes(df_mestre, df_localizacoes)
+
+            # Os alertas e as tendências por armadilha também são atualizados aqui,
+            # fora dos reruns; o motor de tendências só recebe as moscas novas
+            if self.db_path.exists():
+                conn = alertas.ligar(self.db_path)
+                try:
+                    incrementos = alertas.ingerir_moscas(conn, df_mestre)
+                    if self._tendencias is None:
+                        self._tendencias = tendencias.MotorTendencias.construir(alertas.contagens_diarias(conn))
+                    else:
+                        self._tendencias.atualizar(incrementos)
+                finally:
+                    conn.close()
+
+        df_resultados = pd.DataFrame()
+        df_caixas = pd.DataFrame(columns=["imagem", "classe", "fly_id", "x_min", "y_min", "x_max", "y_max", "confianca"])
+        repetidas = {}
+        if self.csv_file.exists():
+            # O results.csv só é lido e validado outra vez quando muda
+            stat = self.csv_file.stat()
+            if self._resultados is None or self._resultados[0] != (stat.st_mtime_ns, stat.st_size):
+                self._resultados = ((stat.st_mtime_ns, stat.st_size), carregar_resultados(self.csv_file))
+            df_resultados, avisos_resultados = self._resultados[1]
+            avisos.extend(avisos_resultados)
+
+            # Fotografias quase repetidas da mesma placa não seguem para o resto da ingestão
+            if self.db_path.exists():
+                manifesto = armazem_imagens.carregar_manifesto(self.pasta_detecoes)
+                conn = duplicados.ligar(self.db_path)
+                try:
+                    with metricas.DEDUPLICACAO_SEGUNDOS.medir(etapa="fotografias"):
+                        repetidas = duplicados.registar(
+                            conn, df_resultados,
+                            lambda imagem: duplicados.ler_imagem(self.pasta_detecoes, manifesto, arquivo, imagem),
+                        )
+                finally:
+                    conn.close()
+                metricas.DEDUPLICACAO_LINHAS.incrementar(len(df_resultados), etapa="fotografias")
+                df_resultados = df_resultados[~df_resultados["Nome da imagem"].str.strip().str.lower().isin(set(repetidas))]
+
+            # As caixas são extraídas antes da remoção de duplicados (que as substitui por caixas de 20x20 px)
+            df_caixas = sobreposicoes.extrair_caixas(df_resultados)
+            with metricas.DEDUPLICACAO_SEGUNDOS.medir(etapa="detecoes"):
+                df_resultados = remover_detecoes_duplicadas(df_resultados)
+            metricas.DEDUPLICACAO_LINHAS.incrementar(len(df_resultados), etapa="detecoes")
+
+        # Moscas vistas pela primeira vez numa fotografia repetida passam para a original
+        if repetidas and not df_mestre.empty:
+            df_mestre = df_mestre.assign(
+                First_Detection_Image=duplicados.remapear(df_mestre["First_Detection_Image"], repetidas)
+            )
+
+        # Histogramas da posição das capturas por placa e dia
+        mapa_posicoes = None
+        if not df_resultados.empty:
+            mapa_posicoes = mapa_calor.MapaCalor.construir(df_caixas, df_resultados, df_localizacoes)
+
+        # Com o motor DuckDB, os painéis são consultas sobre o Parquet e o cubo não é construído
+        usar_duckdb = self.motor == "duckdb" and not df_mestre.empty
+        if usar_duckdb and not consultas_duckdb.disponivel():
+            avisos.append(("warning", "O motor DuckDB foi pedido mas o duckdb não está instalado; a usar pandas."))
+            usar_duckdb = False
+
+        # Cubo de contagens dia × placa × classe (base de todos os painéis)
+        cubo_contagens = cubo.Cubo.construir(df_mestre) if not df_mestre.empty and not usar_duckdb else None
+
+        # Placa ativa de cada captura, exposição por placa e moscas por armadilha por dia
+        exposicao_placas = None
+        if not df_mestre.empty and not df_placas.empty:
+            exposicao_placas = exposicao.Exposicao.construir(df_mestre, df_placas)
+
+        # Estado de cada armadilha (início do voo, pico, subida/descida)
+        df_tendencias = None
+        if self._tendencias is not None and not df_placas.empty:
+            armadilhas = df_placas[["ID Armadilha", "Nome Armadilha", "Localização"]].drop_duplicates("ID Armadilha")
+            df_tendencias = tendencias.tabela_estado(self._tendencias, armadilhas)
+
+        # Manifesto da galeria (uma linha por imagem, com os ficheiros disponíveis)
+        fotografias = df_resultados["Nome da imagem"].str.strip().str.lower() if not df_resultados.empty else ()
+        df_galeria = galeria.construir_manifesto_galeria(
+            df_mestre, self.pasta_detecoes, arquivados=arquivo.nomes(), df_caixas=df_caixas, fotografias=fotografias
+        )
+
+        # Recortes das deteções novas para a grelha de revisão
+        df_recortes = None
+        if not df_caixas.empty and not df_galeria.empty:
+            try:
+                df_recortes, avisos_recortes = recortes.atualizar(self.pasta_recortes, df_caixas, df_galeria, arquivo)
+                avisos.extend(avisos_recortes)
+            except Exception as e:
+                avisos.append(("warning", f"Erro a preparar os recortes das deteções: {e}"))
+
+        # Moscas em Parquet para o motor DuckDB (um ficheiro por versão dos dados);
+        # o snapshot fica só com as colunas do ficheiro mestre
+        n_moscas = len(df_mestre)
+        opcoes = agregacoes.opcoes_filtros(df_mestre, df_localizacoes) if not df_mestre.empty else ([], None, None)
+        parquet_moscas = None
+        if usar_duckdb:
+            parquet_moscas = consultas_duckdb.gravar_moscas(df_mestre, self.data_dir, versao)
+            df_mestre = df_mestre.iloc[:0]
+
+        return {
+            "df_mestre": df_mestre,
+            "n_moscas": n_moscas,
+            "opcoes_filtros": opcoes,
+            "df_localizacoes": df_localizacoes,
+            "df_resultados": df_resultados,
+            "df_caixas": df_caixas,
+            "df_galeria": df_galeria,
+            "cubo": cubo_contagens,
+            "exposicao": exposicao_placas,
+            "df_tendencias": df_tendencias,
+            "mapa_calor": mapa_posicoes,
+            "df_recortes": df_recortes,
+            "parquet_moscas": parquet_moscas,
+            "avisos": avisos,
+        }
+
+
+def iniciar(data_dir=BASE_DIR, intervalo=INTERVALO_VERIFICACAO, cache=None, motor="pandas"):
+    return Ingestor(data_dir, intervalo, cache, motor).iniciar()
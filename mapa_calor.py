@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from agregacoes import CLASSES
+
+# ---------------------------------------------------
+# Mapa de calor da posição das capturas nas placas
+# ---------------------------------------------------
+# Os centros das caixas do results.csv são contados numa grelha fixa
+# (BINS_X × BINS_Y) sobre a imagem, com um histograma por placa e por dia,
+# calculado uma vez por geração de dados: um único np.bincount sobre os
+# índices (grupo, classe, linha, coluna) de todas as caixas. Como os
+# histogramas usam todos a mesma grelha, o painel soma apenas os grupos da
+# seleção (placas, dias e classes), sem voltar a percorrer as deteções.
+#
+# A mesma mosca aparece em todas as fotografias da placa depois de ser
+# capturada; cada Fly_ID conta uma vez, na primeira fotografia em que aparece.
+
+BINS_X, BINS_Y = 32, 24
+PASSO_EXTENSAO = 64  # a extensão da grelha (em px) é arredondada a este passo
+
+
+class MapaCalor:
+    def __init__(self, grupos, contagens, largura, altura):
+        self.grupos = grupos          # Placa ID, Localização e Dia de cada histograma
+        self.contagens = contagens    # int32 [grupo, classe, linha, coluna]
+        self.largura = largura        # extensão da grelha em px
+        self.altura = altura
+
+    @classmethod
+    def construir(cls, df_caixas, df_resultados, df_localizacoes=None):
+        fotografias = pd.DataFrame({
+            "imagem": df_resultados["Nome da imagem"].str.strip().str.lower(),
+            "Placa ID": df_resultados["Placa ID"],
+            "Localização": df_resultados["Localização"],
+            "Data imagem": df_resultados["Data imagem"],
+        }).drop_duplicates("imagem")
+        # Localização da BD quando existe (como no ficheiro mestre)
+        if df_localizacoes is not None and not df_localizacoes.empty:
+            da_bd = df_localizacoes.drop_duplicates("Placa ID").set_index("Placa ID")["Localização"]
+            fotografias["Localização"] = fotografias["Placa ID"].map(da_bd).combine_first(fotografias["Localização"])
+
+        caixas = df_caixas[df_caixas["classe"].isin(CLASSES)].merge(fotografias, on="imagem", how="inner")
+        caixas = caixas.sort_values("Data imagem", kind="stable")
+        caixas = caixas[~(caixas["fly_id"].notna() & caixas["fly_id"].duplicated())]
+
+        if caixas.empty:
+            grupos = pd.DataFrame({"Placa ID": [], "Localização": [], "Dia": pd.DatetimeIndex([])})
+            return cls(grupos, np.zeros((0, len(CLASSES), BINS_Y, BINS_X), dtype=np.int32), PASSO_EXTENSAO, PASSO_EXTENSAO)
+
+        x_max = caixas["x_max"].to_numpy()
+        y_max = caixas["y_max"].to_numpy()
+        largura = max(PASSO_EXTENSAO, int(-(-x_max.max() // PASSO_EXTENSAO)) * PASSO_EXTENSAO)
+        altura = max(PASSO_EXTENSAO, int(-(-y_max.max() // PASSO_EXTENSAO)) * PASSO_EXTENSAO)
+
+        # Coluna e linha da grelha de cada centro
+        cx = (caixas["x_min"].to_numpy() + x_max) / 2
+        cy = (caixas["y_min"].to_numpy() + y_max) / 2
+        coluna = np.clip((cx * BINS_X / largura).astype(np.int64), 0, BINS_X - 1)
+        linha = np.clip((cy * BINS_Y / altura).astype(np.int64), 0, BINS_Y - 1)
+
+        datas = caixas["Data imagem"]
+        if getattr(datas.dt, "tz", None) is not None:
+            datas = datas.dt.tz_localize(None)
+        codigos_grupo, pares = pd.factorize(
+            pd.MultiIndex.from_arrays([caixas["Placa ID"], caixas["Localização"], datas.dt.normalize()]),
+            use_na_sentinel=False,
+        )
+        codigos_classe = pd.Categorical(caixas["classe"], categories=CLASSES).codes.astype(np.int64)
+
+        forma = (len(pares), len(CLASSES), BINS_Y, BINS_X)
+        indices = np.ravel_multi_index((codigos_grupo, codigos_classe, linha, coluna), forma)
+        contagens = np.bincount(indices, minlength=int(np.prod(forma))).reshape(forma).astype(np.int32)
+
+        grupos = pd.DataFrame({
+            "Placa ID": pares.get_level_values(0),
+            "Localização": pares.get_level_values(1),
+            "Dia": pares.get_level_values(2),
+        })
+        return cls(grupos, contagens, largura, altura)
+
+    # Placas com capturas nas localizações indicadas
+    def placas(self, localizacoes=None):
+        grupos = self.grupos
+        if localizacoes:
+            grupos = grupos[grupos["Localização"].isin(localizacoes)]
+        return sorted(grupos["Placa ID"].dropna().unique())
+
+    # Soma dos histogramas da seleção: int64 [linha, coluna]
+    def somar(self, localizacoes=None, placas=None, classes=None, inicio=None, fim=None):
+        mascara = np.ones(len(self.grupos), dtype=bool)
+        if localizacoes:
+            mascara &= self.grupos["Localização"].isin(localizacoes).to_numpy()
+        if placas:
+            mascara &= self.grupos["Placa ID"].isin(placas).to_numpy()
+        if inicio is not None and fim is not None:
+            dias = self.grupos["Dia"].dt.date
+            mascara &= ((dias >= inicio) & (dias <= fim)).to_numpy()
+        indices_classes = [CLASSES.index(c) for c in (classes or CLASSES)]
+        return self.contagens[mascara][:, indices_classes].sum(axis=(0, 1), dtype=np.int64)
+
+    # Uma linha por célula com capturas (limites em px), para o gráfico
+    def tabela(self, matriz):
+        linhas, colunas = np.nonzero(matriz)
+        passo_x, passo_y = self.largura / BINS_X, self.altura / BINS_Y
+        return pd.DataFrame({
+            "x": (colunas * passo_x).astype(np.float32),
+            "x2": ((colunas + 1) * passo_x).astype(np.float32),
+            "y": (linhas * passo_y).astype(np.float32),
+            "y2": ((linhas + 1) * passo_y).astype(np.float32),
+            "Moscas": matriz[linhas, colunas].astype(np.int32),
+        })
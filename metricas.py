@@ -0,0 +1,244 @@
+import bisect
+import contextlib
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------------------------------------------
+# Métricas de desempenho (formato de texto do Prometheus)
+# ---------------------------------------------------
+# Contadores e histogramas em memória, por processo: duração dos
+# carregadores (xlsx, csv, SQLite), linhas processadas pela remoção de
+# duplicados, acertos/falhas e tamanho de cada cache, duração dos reruns e
+# dos fragmentos, imagens servidas pela galeria e bytes lidos de detections_output/.
+#
+# O dashboard serve-as em GET /metrics numa porta local quando a variável de
+# ambiente DASHBOARD_METRICAS_PORTA está definida (servir.py dá uma porta a
+# cada processo com --porta-metricas-base). Os valores das caches são lidos
+# no momento do pedido, a partir das estatísticas que cada cache já mantém.
+#
+# Débitos por hora obtêm-se no Prometheus, ex.:
+#   rate(mosca_deduplicacao_linhas_total[1h]) * 3600
+
+PREFIXO = "mosca_"
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_metricas = []
+_caches = {}
+_lock_caches = threading.Lock()
+
+log = logging.getLogger(__name__)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_etiquetas(nomes, valores, extra=()):
+    pares = [*zip(nomes, valores), *extra]
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def _formatar_valor(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, etiquetas=()):
+        self.nome = PREFIXO + nome
+        self.ajuda = ajuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+        _metricas.append(self)
+
+    def incrementar(self, valor=1, **etiquetas):
+        chave = tuple(str(etiquetas[e]) for e in self.etiquetas)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def linhas(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for chave, valor in valores:
+            yield f"{self.nome}{_formatar_etiquetas(self.etiquetas, chave)} {_formatar_valor(valor)}"
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        self.nome = PREFIXO + nome
+        self.ajuda = ajuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}  # etiquetas -> [contagens por bucket, soma, total]
+        self._lock = threading.Lock()
+        _metricas.append(self)
+
+    def observar(self, valor, **etiquetas):
+        chave = tuple(str(etiquetas[e]) for e in self.etiquetas)
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.setdefault(chave, [[0] * len(self.buckets), 0.0, 0])
+            if i < len(self.buckets):
+                serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    # Mede a duração do bloco: `with metricas.X.medir(fonte="csv"): ...`
+    @contextlib.contextmanager
+    def medir(self, **etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    # Decorador que mede cada chamada da função (como medir)
+    def medido(self, **etiquetas):
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            def medida(*args, **kwargs):
+                with self.medir(**etiquetas):
+                    return funcao(*args, **kwargs)
+            return medida
+        return decorador
+
+    def linhas(self):
+        with self._lock:
+            series = sorted((chave, (list(c), s, n)) for chave, (c, s, n) in self._series.items())
+        for chave, (contagens, soma, total) in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                etiquetas = _formatar_etiquetas(self.etiquetas, chave, [("le", _formatar_valor(float(limite)))])
+                yield f"{self.nome}_bucket{etiquetas} {acumulado}"
+            etiquetas = _formatar_etiquetas(self.etiquetas, chave, [("le", "+Inf")])
+            yield f"{self.nome}_bucket{etiquetas} {total}"
+            yield f"{self.nome}_sum{_formatar_etiquetas(self.etiquetas, chave)} {_formatar_valor(soma)}"
+            yield f"{self.nome}_count{_formatar_etiquetas(self.etiquetas, chave)} {total}"
+
+
+# ---------------------------------------------------
+# Métricas do projeto
+# ---------------------------------------------------
+CARREGAMENTO_SEGUNDOS = Histograma(
+    "carregamento_segundos", "Duração da leitura de cada fonte de dados.", ["fonte"]
+)
+LINHAS_CARREGADAS = Contador(
+    "linhas_carregadas_total", "Linhas lidas de cada fonte de dados.", ["fonte"]
+)
+INGESTAO_SEGUNDOS = Histograma(
+    "ingestao_segundos", "Duração de cada ingestão (leitura das fontes e agregados)."
+)
+INGESTOES = Contador(
+    "ingestoes_total", "Snapshots publicados, por origem dos dados (fontes ou cache partilhada).", ["origem"]
+)
+DEDUPLICACAO_SEGUNDOS = Histograma(
+    "deduplicacao_segundos", "Duração da remoção de duplicados.", ["etapa"]
+)
+DEDUPLICACAO_LINHAS = Contador(
+    "deduplicacao_linhas_total", "Linhas (deteções) ou fotografias processadas pela remoção de duplicados.", ["etapa"]
+)
+RERUN_SEGUNDOS = Histograma(
+    "rerun_segundos",
+    "Duração de cada execução completa do script do dashboard, incluindo as que param com st.stop "
+    "(sem as que terminam com uma exceção; os reruns de fragmentos estão em fragmento_segundos).",
+)
+FRAGMENTO_SEGUNDOS = Histograma(
+    "fragmento_segundos", "Duração de cada execução de um fragmento do dashboard (no rerun completo ou sozinho).",
+    ["fragmento"],
+)
+IMAGENS_SERVIDAS = Contador(
+    "imagens_servidas_total", "Imagens enviadas ao browser.", ["painel"]
+)
+BYTES_DETECOES = Contador(
+    "detecoes_bytes_lidos_total", "Bytes lidos de detections_output/ (ficheiros soltos ou arquivo por semanas).",
+    ["origem"],
+)
+
+
+# ---------------------------------------------------
+# Caches (lidas no momento do pedido)
+# ---------------------------------------------------
+# estatisticas: função sem argumentos que devolve um dicionário com
+# acertos, falhas, entradas e bytes (como CacheBytes.estatisticas)
+def registar_cache(nome, estatisticas):
+    with _lock_caches:
+        _caches[nome] = estatisticas
+
+
+def _linhas_caches():
+    with _lock_caches:
+        caches = sorted(_caches.items())
+    stats = {}
+    for nome, estatisticas in caches:
+        try:
+            stats[nome] = estatisticas()
+        except Exception as e:
+            log.warning("Erro a ler as estatísticas da cache '%s': %s", nome, e)
+
+    familias = [
+        ("cache_pedidos_total", "counter", "Pedidos a cada cache, por resultado."),
+        ("cache_entradas", "gauge", "Entradas em cada cache."),
+        ("cache_bytes", "gauge", "Tamanho de cada cache em bytes."),
+    ]
+    for nome, tipo, ajuda in familias:
+        yield f"# HELP {PREFIXO}{nome} {ajuda}"
+        yield f"# TYPE {PREFIXO}{nome} {tipo}"
+        for cache, s in stats.items():
+            if nome == "cache_pedidos_total":
+                for resultado, chave in [("acerto", "acertos"), ("falha", "falhas")]:
+                    etiquetas = _formatar_etiquetas(["cache", "resultado"], [cache, resultado])
+                    yield f"{PREFIXO}{nome}{etiquetas} {s[chave]}"
+            else:
+                yield f"{PREFIXO}{nome}{_formatar_etiquetas(['cache'], [cache])} {s[nome.removeprefix('cache_')]}"
+
+
+# Todas as métricas no formato de texto do Prometheus (versão 0.0.4)
+def exportar():
+    linhas = []
+    for metrica in list(_metricas):
+        linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        linhas.extend(metrica.linhas())
+    linhas.extend(_linhas_caches())
+    return ("\n".join(linhas) + "\n").encode("utf-8")
+
+
+# ---------------------------------------------------
+# Servidor HTTP (GET /metrics)
+# ---------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = exportar()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    # Os pedidos do Prometheus não são escritos no terminal
+    def log_message(self, *args):
+        pass
+
+
+# Arranca o servidor numa thread (uma vez por processo) e devolve-o
+def iniciar_servidor(porta, host="127.0.0.1"):
+    servidor = ThreadingHTTPServer((host, porta), _Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    log.info("Métricas em http://%s:%s/metrics", host, porta)
+    return servidor
@@ -0,0 +1,44 @@
+import pandas as pd
+
+# ---------------------------------------------------
+# Paginação das tabelas no servidor
+# ---------------------------------------------------
+# As tabelas (resumo diário, semana, mês, placa) crescem com o tempo e com
+# o número de armadilhas. A ordenação é feita aqui, só sobre a coluna
+# escolhida (devolve as posições ordenadas), e apenas a janela da página
+# visível é copiada e enviada para o browser.
+
+TAMANHO_PAGINA = 25
+
+
+def n_paginas(n_linhas, tamanho=TAMANHO_PAGINA):
+    return max(1, -(-n_linhas // tamanho))
+
+
+# Colunas pelas quais a tabela pode ser ordenada (o índice, se tiver nome, primeiro)
+def colunas_ordenacao(df):
+    colunas = [c for c in df.columns]
+    if df.index.name is not None and df.index.name not in colunas:
+        colunas.insert(0, df.index.name)
+    return colunas
+
+
+# Página 'numero' (a contar de 1) de df ordenado por 'ordenar_por'
+def pagina(df, numero, tamanho=TAMANHO_PAGINA, ordenar_por=None, descendente=False):
+    inicio = (numero - 1) * tamanho
+    if ordenar_por is None:
+        posicoes = range(len(df))
+        if descendente:
+            posicoes = posicoes[::-1]
+        return df.iloc[posicoes[inicio:inicio + tamanho]]
+
+    if ordenar_por in df.columns:
+        chave = df[ordenar_por].to_numpy()
+    else:
+        chave = df.index.to_numpy()
+    posicoes = (
+        pd.Series(chave)
+        .sort_values(ascending=not descendente, kind="stable", na_position="last")
+        .index.to_numpy()
+    )
+    return df.iloc[posicoes[inicio:inicio + tamanho]]
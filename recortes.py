@@ -0,0 +1,225 @@
+import io
+import logging
+import pathlib
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import armazem_imagens
+import galeria
+
+# ---------------------------------------------------
+# Recortes de cada deteção (revisão mosca a mosca)
+# ---------------------------------------------------
+# Na ingestão, cada caixa do results.csv é recortada da imagem base (um
+# quadrado à volta da caixa, com margem), reduzida a TAMANHO × TAMANHO px e
+# guardada em blocos .npy (uint8 [n, TAMANHO, TAMANHO, 3]) na pasta
+# "recortes" dos dados. Cada ingestão só recorta as deteções novas e grava-as
+# num bloco novo, junto com os recortes dos blocos pequenos (menos de
+# BLOCO_MINIMO recortes), para que as ingestões frequentes não deixem
+# milhares de blocos. Os blocos nunca são alterados: os blocos juntados só
+# são apagados na ingestão seguinte, quando já nenhum snapshot os usa. Um
+# índice (pickle) associa o ID de cada deteção ao bloco e à posição, com a
+# classe e a confiança.
+#
+# Os blocos são abertos com mmap: uma página de centenas de recortes é uma
+# leitura por bloco, e a grelha é montada numa única imagem. No máximo
+# MAX_BLOCOS_ABERTOS ficam abertos (LRU).
+#
+# O ID é o Fly_ID da caixa (cada mosca é recortada uma vez, na primeira
+# fotografia em que aparece) ou, sem Fly_ID, "<imagem>:<classe>:<ordem>".
+#
+# Só se recorta de imagens sem anotações (coluna "Original" da galeria):
+# recortes de uma imagem _det_ com caixas desenhadas trariam as caixas e as
+# etiquetas. As deteções sem fotografia original ficam por recortar (e são
+# contadas nos avisos) até a fotografia aparecer.
+
+TAMANHO = 64              # lado dos recortes (px)
+MARGEM = 0.25             # margem à volta da caixa, em fração do maior lado
+PASTA_RECORTES = "recortes"
+NOME_INDICE = "indice.pkl"
+VERSAO = 1
+BLOCO_MINIMO = 1024       # blocos com menos recortes são juntados ao bloco seguinte
+MAX_BLOCOS_ABERTOS = 16   # mmaps abertos por processo
+
+COLUNAS_INDICE = ["ID", "imagem", "classe", "confianca", "bloco", "posicao"]
+
+log = logging.getLogger(__name__)
+
+_blocos = OrderedDict()
+_lock_blocos = threading.Lock()
+
+
+def caminho_bloco(pasta, bloco):
+    return pathlib.Path(pasta) / f"bloco_{bloco:05d}.npy"
+
+
+# Índice e blocos juntados na última ingestão (a apagar na seguinte)
+def carregar_indice(pasta):
+    try:
+        with open(pathlib.Path(pasta) / NOME_INDICE, "rb") as f:
+            conteudo = pickle.load(f)
+    except FileNotFoundError:
+        conteudo = None
+    except Exception as e:
+        log.warning("Índice dos recortes ignorado: %s", e)
+        conteudo = None
+    if not isinstance(conteudo, dict) or conteudo.get("versao") != VERSAO:
+        return pd.DataFrame(columns=COLUNAS_INDICE), []
+    return conteudo["indice"], conteudo.get("obsoletos", [])
+
+
+def guardar_indice(pasta, indice, obsoletos=()):
+    conteudo = {"versao": VERSAO, "indice": indice, "obsoletos": list(obsoletos)}
+    armazem_imagens.escrever_atomico(
+        pathlib.Path(pasta) / NOME_INDICE, pickle.dumps(conteudo, protocol=pickle.HIGHEST_PROTOCOL)
+    )
+
+
+# Uma linha por deteção a recortar: a primeira caixa de cada Fly_ID, só de imagens sem anotações
+def detecoes(df_caixas, df_galeria):
+    disponiveis = df_galeria[df_galeria["Original"] & (df_galeria["Caminho"].notna() | df_galeria["Arquivo"].notna())]
+    caixas = df_caixas.merge(disponiveis[["Imagem", "Data"]], left_on="imagem", right_on="Imagem", how="inner")
+    caixas = caixas.sort_values("Data", kind="stable").drop(columns=["Imagem", "Data"])
+
+    ordem = caixas.groupby(["imagem", "classe"]).cumcount().astype(str)
+    caixas["ID"] = caixas["fly_id"].fillna(caixas["imagem"] + ":" + caixas["classe"] + ":" + ordem)
+    return caixas.drop_duplicates("ID")
+
+
+# Quadrado à volta da caixa (com margem), recortado e reduzido
+def recortar(img, x_min, y_min, x_max, y_max):
+    from PIL import Image
+
+    lado = max(x_max - x_min, y_max - y_min) * (1 + 2 * MARGEM)
+    cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+    caixa = tuple(int(round(v)) for v in (cx - lado / 2, cy - lado / 2, cx + lado / 2, cy + lado / 2))
+    return np.asarray(img.crop(caixa).resize((TAMANHO, TAMANHO), Image.BILINEAR), dtype=np.uint8)
+
+
+def apagar_blocos(pasta, blocos):
+    for bloco in blocos:
+        caminho = caminho_bloco(pasta, bloco)
+        with _lock_blocos:
+            _blocos.pop(caminho, None)
+        caminho.unlink(missing_ok=True)
+
+
+# Recorta as deteções ainda sem recorte e grava-as num bloco novo (com os
+# recortes dos blocos pequenos). Devolve o índice e os avisos a mostrar
+def atualizar(pasta, df_caixas, df_galeria, arquivo):
+    from PIL import Image
+
+    pasta = pathlib.Path(pasta)
+    indice, obsoletos = carregar_indice(pasta)
+    # Os snapshots que usavam os blocos juntados na ingestão anterior já foram substituídos
+    apagar_blocos(pasta, obsoletos)
+    novas = detecoes(df_caixas, df_galeria)
+    novas = novas[~novas["ID"].isin(indice["ID"])]
+
+    avisos = []
+    sem_original = df_caixas["imagem"].isin(df_galeria.loc[~df_galeria["Original"], "Imagem"]).sum()
+    if sem_original:
+        avisos.append((
+            "info",
+            f"{sem_original} deteções sem fotografia original não foram recortadas para a revisão "
+            "(as imagens disponíveis já têm as caixas desenhadas).",
+        ))
+    if novas.empty:
+        return indice, avisos
+
+    manifesto = df_galeria.set_index("Imagem")
+    coordenadas = novas[["x_min", "y_min", "x_max", "y_max"]].to_numpy()
+    recortes = np.zeros((len(novas), TAMANHO, TAMANHO, 3), dtype=np.uint8)
+    validos = np.zeros(len(novas), dtype=bool)
+    posicoes = pd.RangeIndex(len(novas))
+    erros = {}
+    for imagem, grupo in pd.Series(posicoes, index=novas["imagem"].to_numpy()).groupby(level=0):
+        try:
+            row = manifesto.loc[imagem]
+            dados = galeria.ler_imagem_base(row, arquivo)
+            if dados is None:
+                continue
+            img = Image.open(io.BytesIO(dados)).convert("RGB")
+            for i in grupo.to_numpy():
+                recortes[i] = recortar(img, *coordenadas[i])
+                validos[i] = True
+        except OSError as e:
+            erros[imagem] = e
+
+    if erros:
+        imagem, e = next(iter(erros.items()))
+        avisos.append(("warning", f"Erro a recortar as deteções de {len(erros)} imagens (ex.: {imagem}: {e})."))
+    if not validos.any():
+        return indice, avisos
+
+    # Os recortes dos blocos pequenos vão para o bloco novo, antes dos novos
+    tamanhos = indice.groupby("bloco").size()
+    juntados = tamanhos.index[tamanhos < BLOCO_MINIMO].astype(int).tolist()
+    mantidos = indice[~indice["bloco"].isin(juntados)]
+    movidos = indice[indice["bloco"].isin(juntados)]
+
+    bloco = int(indice["bloco"].max()) + 1 if len(indice) else 0
+    saida = io.BytesIO()
+    np.save(saida, np.concatenate([ler(pasta, movidos), recortes[validos]]))
+    armazem_imagens.escrever_atomico(caminho_bloco(pasta, bloco), saida.getvalue())
+
+    novas = novas[validos]
+    adicionadas = pd.DataFrame({
+        "ID": np.concatenate([movidos["ID"].to_numpy(), novas["ID"].to_numpy()]),
+        "imagem": np.concatenate([movidos["imagem"].to_numpy(), novas["imagem"].to_numpy()]),
+        "classe": np.concatenate([movidos["classe"].to_numpy(), novas["classe"].to_numpy()]),
+        "confianca": np.concatenate([
+            movidos["confianca"].to_numpy(dtype=np.float32), novas["confianca"].to_numpy(dtype=np.float32)
+        ]),
+        "bloco": np.full(len(movidos) + len(novas), bloco, dtype=np.int32),
+        "posicao": np.arange(len(movidos) + len(novas), dtype=np.int32),
+    })
+    indice = pd.concat([mantidos, adicionadas], ignore_index=True) if len(mantidos) else adicionadas
+    guardar_indice(pasta, indice, obsoletos=juntados)
+    return indice, avisos
+
+
+# Bloco aberto com mmap (partilhado por todas as sessões do processo). Um
+# bloco que sai da LRU deixa de ser referenciado aqui; o mmap e o descritor
+# são fechados quando a última leitura em curso o largar.
+def abrir_bloco(pasta, bloco):
+    caminho = caminho_bloco(pasta, bloco)
+    with _lock_blocos:
+        if caminho in _blocos:
+            _blocos.move_to_end(caminho)
+        else:
+            _blocos[caminho] = np.load(caminho, mmap_mode="r")
+            while len(_blocos) > MAX_BLOCOS_ABERTOS:
+                _blocos.popitem(last=False)
+        return _blocos[caminho]
+
+
+# Recortes das linhas do índice, pela mesma ordem: uint8 [n, TAMANHO, TAMANHO, 3]
+def ler(pasta, linhas):
+    recortes = np.zeros((len(linhas), TAMANHO, TAMANHO, 3), dtype=np.uint8)
+    blocos = linhas["bloco"].to_numpy()
+    posicoes = linhas["posicao"].to_numpy()
+    for bloco in np.unique(blocos):
+        selecao = blocos == bloco
+        recortes[selecao] = abrir_bloco(pasta, int(bloco))[posicoes[selecao]]
+    return recortes
+
+
+# Monta os recortes numa grelha e devolve um JPEG
+def grelha(recortes, colunas, separador=2, qualidade=85):
+    from PIL import Image
+
+    n_linhas = -(-len(recortes) // colunas)
+    passo = TAMANHO + separador
+    folha = np.full((n_linhas * passo, colunas * passo, 3), 255, dtype=np.uint8)
+    for i, recorte in enumerate(recortes):
+        linha, coluna = divmod(i, colunas)
+        folha[linha * passo:linha * passo + TAMANHO, coluna * passo:coluna * passo + TAMANHO] = recorte
+
+    saida = io.BytesIO()
+    Image.fromarray(folha).save(saida, format="JPEG", quality=qualidade)
+    return saida.getvalue()
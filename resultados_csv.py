@@ -0,0 +1,158 @@
+import argparse
+import io
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+import armazem_imagens
+from sobreposicoes import CLASSES, PADRAO_CAIXA
+
+# ---------------------------------------------------
+# Leitura estrita do results.csv (esquema declarado + quarentena)
+# ---------------------------------------------------
+# Cada coluna tem um tipo e um formato explícitos; nada é inferido nem
+# convertido em silêncio para NaT ou 0. A "Data imagem" é ISO-8601 em UTC
+# (2025-07-22T20:49:32.892Z, com ou sem milissegundos, com "Z" ou "+00:00")
+# e é lida com os formatos fixos de FORMATOS_DATA. Quando falta ou
+# está mal formada, usa-se a hora no nome da imagem
+# (image_20250722214925_ppp0.jpg, hora local de FUSO_NOME_IMAGEM).
+#
+# As linhas que não cumprem o esquema não seguem para a ingestão: vão para
+# o ficheiro de quarentena (results_quarentena.csv, junto do results.csv),
+# com o número da linha no CSV e os motivos. O ficheiro é reescrito a cada
+# leitura e removido quando não há linhas rejeitadas.
+
+FORMATOS_DATA = (
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%dT%H:%M:%S.%f+00:00",
+    "%Y-%m-%dT%H:%M:%S+00:00",
+)
+FORMATO_DATA_NOME = "%Y%m%d%H%M%S"
+PADRAO_DATA_NOME = r"(?<!\d)(\d{14})(?!\d)"
+FUSO_NOME_IMAGEM = "Europe/Lisbon"  # as armadilhas nomeiam as fotografias com a hora local
+
+NOME_QUARENTENA = "results_quarentena.csv"
+
+# Colunas obrigatórias e o seu tipo; as restantes colunas do CSV passam como texto
+ESQUEMA = {
+    "Nome da imagem": "texto",
+    "Data imagem": "data",
+    "Placa ID": "texto",
+    "Localização": "texto",
+    **{f"Nº {classe}": "inteiro" for classe in CLASSES},
+    **{f"Coord. {classe}": "caixas" for classe in CLASSES},
+    **{f"Conf. {classe}": "confiancas" for classe in CLASSES},
+}
+# Colunas facultativas: podem faltar no ficheiro, mas se existirem têm de ser válidas
+ESQUEMA_FACULTATIVO = {
+    "Latitude": "decimal",
+    "Longitude": "decimal",
+}
+
+
+def caminho_quarentena(csv_file):
+    return pathlib.Path(csv_file).with_name(NOME_QUARENTENA)
+
+
+# Datas do nome das imagens (hora local), em UTC; NaT se o nome não tiver data
+def datas_do_nome(nomes):
+    digitos = nomes.str.extract(PADRAO_DATA_NOME, expand=False)
+    locais = pd.to_datetime(digitos, format=FORMATO_DATA_NOME, errors="coerce")
+    return locais.dt.tz_localize(FUSO_NOME_IMAGEM, ambiguous="NaT", nonexistent="NaT").dt.tz_convert("UTC")
+
+
+# Elementos de uma coluna com listas separadas por ";" (um por linha do índice, vazios ignorados)
+def _elementos(serie):
+    elementos = serie.dropna().str.split(";").explode().str.strip()
+    return elementos[elementos != ""]
+
+
+# Lê o results.csv; devolve (linhas válidas, linhas em quarentena, nº de datas tiradas do nome)
+def ler(csv_file):
+    df = pd.read_csv(csv_file, dtype=str, keep_default_na=False, na_values=[""])
+    em_falta = [c for c in ESQUEMA if c not in df.columns]
+    if em_falta:
+        raise ValueError(f"Colunas em falta no results.csv: {', '.join(em_falta)}")
+
+    motivos = np.full(len(df), "", dtype=object)
+
+    def rejeitar(mascara, motivo):
+        mascara = np.asarray(mascara, dtype=bool)
+        motivos[mascara] = [f"{m}; {motivo}" if m else motivo for m in motivos[mascara]]
+
+    # Texto
+    rejeitar(df["Nome da imagem"].isna(), "Nome da imagem vazio")
+
+    # Data: formatos ISO fixos (em UTC) e, em alternativa, a hora no nome da imagem
+    datas = pd.Series(pd.NaT, index=df.index, dtype="datetime64[us, UTC]")
+    for formato in FORMATOS_DATA:
+        datas = datas.fillna(pd.to_datetime(df["Data imagem"], format=formato, utc=True, errors="coerce"))
+    sem_data = datas.isna()
+    datas[sem_data] = datas_do_nome(df.loc[sem_data, "Nome da imagem"].fillna(""))
+    rejeitar(datas.isna(), "Data imagem inválida e sem data no nome da imagem")
+    n_datas_nome = int((sem_data & datas.notna()).sum())
+
+    colunas = {**ESQUEMA, **{c: t for c, t in ESQUEMA_FACULTATIVO.items() if c in df.columns}}
+    for coluna, tipo in colunas.items():
+        valores = df[coluna]
+        if tipo == "inteiro":
+            rejeitar(~valores.str.fullmatch(r"\d+").fillna(False), f"{coluna} não é um inteiro ≥ 0")
+        elif tipo == "decimal":
+            invalidos = valores.notna() & pd.to_numeric(valores, errors="coerce").isna()
+            rejeitar(invalidos, f"{coluna} não é um número")
+        elif tipo == "caixas":
+            elementos = _elementos(valores)
+            invalidos = elementos[~elementos.str.match(PADRAO_CAIXA)].index.unique()
+            rejeitar(df.index.isin(invalidos), f"{coluna} mal formada")
+        elif tipo == "confiancas":
+            elementos = _elementos(valores)
+            numeros = pd.to_numeric(elementos, errors="coerce")
+            invalidos = elementos[numeros.isna() | (numeros < 0) | (numeros > 1)].index.unique()
+            rejeitar(df.index.isin(invalidos), f"{coluna} não são confianças entre 0 e 1")
+
+            # Uma confiança por caixa (quando há confianças)
+            coluna_caixas = coluna.replace("Conf.", "Coord.")
+            n_caixas = _elementos(df[coluna_caixas]).groupby(level=0).size().reindex(df.index, fill_value=0)
+            n_confiancas = elementos.groupby(level=0).size().reindex(df.index, fill_value=0)
+            rejeitar((n_confiancas > 0) & (n_confiancas != n_caixas), f"{coluna} e {coluna_caixas} com tamanhos diferentes")
+
+    rejeitadas = motivos != ""
+    df_quarentena = df[rejeitadas].copy()
+    df_quarentena.insert(0, "Motivo", motivos[rejeitadas])
+    df_quarentena.insert(0, "Linha", df_quarentena.index + 2)  # linha no ficheiro (1 é o cabeçalho)
+
+    df = df[~rejeitadas].copy()
+    df["Data imagem"] = datas[~rejeitadas]
+    for classe in CLASSES:
+        df[f"Nº {classe}"] = df[f"Nº {classe}"].astype(int)
+    for coluna in ESQUEMA_FACULTATIVO:
+        if coluna in df.columns:
+            df[coluna] = pd.to_numeric(df[coluna])
+    df["Localização"] = df["Localização"].fillna("Desconhecida")
+    return df, df_quarentena.reset_index(drop=True), n_datas_nome
+
+
+# Reescreve o ficheiro de quarentena (ou remove-o, se não há linhas rejeitadas)
+def guardar_quarentena(df_quarentena, caminho):
+    caminho = pathlib.Path(caminho)
+    if df_quarentena.empty:
+        caminho.unlink(missing_ok=True)
+        return
+    saida = io.StringIO()
+    df_quarentena.to_csv(saida, index=False)
+    armazem_imagens.escrever_atomico(caminho, saida.getvalue().encode("utf-8"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Valida o results.csv e grava as linhas rejeitadas em quarentena.")
+    parser.add_argument("csv", nargs="?", default=str(armazem_imagens.BASE_DIR / "results.csv"))
+    args = parser.parse_args()
+
+    df, df_quarentena, n_datas_nome = ler(args.csv)
+    guardar_quarentena(df_quarentena, caminho_quarentena(args.csv))
+    print(f"{len(df)} linhas válidas ({n_datas_nome} com a data do nome da imagem)")
+    print(f"{len(df_quarentena)} linhas em quarentena")
+    for motivo, n in df_quarentena["Motivo"].str.split("; ").explode().value_counts().items():
+        print(f"  {n:5d}  {motivo}")
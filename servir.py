@@ -0,0 +1,126 @@
+import argparse
+import os
+import pathlib
+import signal
+import subprocess
+import sys
+import time
+
+# ---------------------------------------------------
+# Vários processos do dashboard atrás de um proxy local
+# ---------------------------------------------------
+# Arranca N processos "streamlit run dashboard2.py" em portas consecutivas,
+# todos com a mesma cache em disco partilhada (DASHBOARD_CACHE_PARTILHADA):
+# só um processo lê as fontes de cada versão dos dados e os painéis
+# calculados por um processo servem os outros. Um processo que termine é
+# arrancado outra vez.
+#
+# Com --porta-metricas-base, cada processo serve as suas métricas (formato
+# Prometheus, ver metricas.py) numa porta própria, também consecutiva.
+#
+# O proxy (nginx) distribui as sessões pelos processos. Cada sessão do
+# Streamlit vive num processo (websocket e ficheiros de media), pelo que o
+# proxy tem de manter cada cliente no mesmo processo (ip_hash). A
+# configuração é gerada com --nginx para as portas escolhidas:
+#
+#   python servir.py --processos 4 --nginx /etc/nginx/conf.d/dashboard.conf
+#   nginx -s reload
+
+BASE_DIR = pathlib.Path(__file__).parent.resolve()
+SCRIPT = BASE_DIR / "dashboard2.py"
+
+CONFIG_NGINX = """\
+upstream dashboard {{
+    ip_hash;
+{servidores}
+}}
+
+server {{
+    listen {porta};
+
+    location / {{
+        proxy_pass http://dashboard;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_read_timeout 86400;
+        proxy_buffering off;
+    }}
+}}
+"""
+
+
+def config_nginx(portas, porta_proxy):
+    servidores = "\n".join(f"    server 127.0.0.1:{porta};" for porta in portas)
+    return CONFIG_NGINX.format(servidores=servidores, porta=porta_proxy)
+
+
+def arrancar(porta, ambiente):
+    comando = [
+        sys.executable, "-m", "streamlit", "run", str(SCRIPT),
+        "--server.port", str(porta),
+        "--server.address", "127.0.0.1",
+        "--server.headless", "true",
+    ]
+    return subprocess.Popen(comando, env=ambiente)
+
+
+def servir(portas, ambiente, intervalo=2, porta_metricas_base=None):
+    ambientes = {porta: dict(ambiente) for porta in portas}
+    if porta_metricas_base is not None:
+        for i, porta in enumerate(portas):
+            ambientes[porta]["DASHBOARD_METRICAS_PORTA"] = str(porta_metricas_base + i)
+    processos = {porta: arrancar(porta, ambientes[porta]) for porta in portas}
+    print(f"{len(processos)} processos nas portas {', '.join(map(str, portas))}")
+
+    # SIGTERM (systemd, docker) termina os processos como o Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(intervalo)
+            for porta, processo in processos.items():
+                if processo.poll() is not None:
+                    print(f"Processo da porta {porta} terminou (código {processo.returncode}); a arrancar outra vez")
+                    processos[porta] = arrancar(porta, ambientes[porta])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for processo in processos.values():
+            processo.terminate()
+        for processo in processos.values():
+            try:
+                processo.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                processo.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve o dashboard com vários processos atrás de um proxy local.")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 2, help="Número de processos do dashboard")
+    parser.add_argument("--porta-base", type=int, default=8601, help="Porta do primeiro processo (as outras são consecutivas)")
+    parser.add_argument("--porta-proxy", type=int, default=8501, help="Porta onde o proxy escuta")
+    parser.add_argument("--dados", help="Pasta com os dados (DASHBOARD_DADOS)")
+    parser.add_argument("--cache", help="Pasta da cache partilhada (por defeito .cache_partilhada junto dos dados)")
+    parser.add_argument("--porta-metricas-base", type=int, help="Porta das métricas do primeiro processo (desligadas por defeito)")
+    parser.add_argument("--nginx", help="Grava a configuração do nginx neste ficheiro ('-' para mostrar) e termina")
+    args = parser.parse_args()
+
+    portas = [args.porta_base + i for i in range(args.processos)]
+    if args.nginx:
+        config = config_nginx(portas, args.porta_proxy)
+        if args.nginx == "-":
+            print(config, end="")
+        else:
+            pathlib.Path(args.nginx).write_text(config, encoding="utf-8")
+            print(f"Configuração do nginx gravada em {args.nginx}")
+        sys.exit(0)
+
+    ambiente = dict(os.environ)
+    if args.dados:
+        ambiente["DASHBOARD_DADOS"] = str(pathlib.Path(args.dados).resolve())
+    dados = pathlib.Path(ambiente.get("DASHBOARD_DADOS", BASE_DIR / "../tese_public"))
+    ambiente["DASHBOARD_CACHE_PARTILHADA"] = str(pathlib.Path(args.cache or dados / ".cache_partilhada").resolve())
+
+    servir(portas, ambiente, porta_metricas_base=args.porta_metricas_base)
@@ -0,0 +1,71 @@
+import io
+import pandas as pd
+
+# ---------------------------------------------------
+# Sobreposições de deteção desenhadas a partir das caixas
+# ---------------------------------------------------
+# Em vez de três JPEGs anotados por fotografia (_det_femea, _det_macho,
+# _det_mosca), a galeria usa uma única imagem base e desenha as caixas de
+# cada classe a partir das coordenadas do results.csv. O Pillow já vem com
+# o Streamlit.
+
+CLASSES = ["femea", "macho", "mosca"]
+CORES = {"femea": "#e6194b", "macho": "#4363d8", "mosca": "#f58231"}
+
+PADRAO_CAIXA = r"^\s*(?:(?P<fly_id>[^:]+):)?(?P<x_min>-?\d+),(?P<y_min>-?\d+),(?P<x_max>-?\d+),(?P<y_max>-?\d+)\s*$"
+
+
+# Converte as colunas "Coord. <classe>" / "Conf. <classe>" numa tabela com
+# uma linha por caixa (vetorizado, sem percorrer linha a linha)
+def extrair_caixas(df):
+    partes = []
+    for classe in CLASSES:
+        coords = df[f"Coord. {classe}"].fillna("").str.split(";").explode()
+        coords = coords[coords.str.strip() != ""]
+        if coords.empty:
+            continue
+
+        caixas = coords.str.extract(PADRAO_CAIXA).dropna(subset=["x_min"])
+        caixas["ordem"] = caixas.groupby(level=0).cumcount()
+
+        confs = df[f"Conf. {classe}"].fillna("").str.split(";").explode()
+        confs = pd.to_numeric(confs.str.strip(), errors="coerce").to_frame("confianca")
+        confs["ordem"] = confs.groupby(level=0).cumcount()
+
+        caixas = (
+            caixas.reset_index(names="linha")
+            .merge(confs.reset_index(names="linha"), on=["linha", "ordem"], how="left")
+        )
+        caixas["imagem"] = df["Nome da imagem"].str.strip().str.lower().reindex(caixas["linha"]).to_numpy()
+        caixas["classe"] = classe
+        partes.append(caixas)
+
+    colunas = ["imagem", "classe", "fly_id", "x_min", "y_min", "x_max", "y_max", "confianca"]
+    if not partes:
+        return pd.DataFrame(columns=colunas)
+
+    caixas = pd.concat(partes, ignore_index=True)
+    for c in ["x_min", "y_min", "x_max", "y_max"]:
+        caixas[c] = caixas[c].astype("int32")
+    return caixas[colunas]
+
+
+# Desenha as caixas das classes indicadas e devolve um JPEG (reduzido a
+# largura_max, se indicada). caixas: sequência de (classe, x_min, y_min, x_max, y_max)
+def desenhar_caixas(dados_base, caixas, classes=CLASSES, qualidade=85, largura_max=None):
+    from PIL import Image, ImageDraw
+
+    img = Image.open(io.BytesIO(dados_base)).convert("RGB")
+    desenho = ImageDraw.Draw(img)
+    espessura = max(2, round(max(img.size) / 400))
+
+    for classe, x_min, y_min, x_max, y_max in caixas:
+        if classe in classes:
+            desenho.rectangle((x_min, y_min, x_max, y_max), outline=CORES[classe], width=espessura)
+
+    if largura_max is not None:
+        img.thumbnail((largura_max, largura_max))
+
+    saida = io.BytesIO()
+    img.save(saida, format="JPEG", quality=qualidade)
+    return saida.getvalue()
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+
+# ---------------------------------------------------
+# Tendência, início de voo e pico por armadilha
+# ---------------------------------------------------
+# As séries diárias de todas as armadilhas ficam numa matriz 2D
+# (armadilha × dia) e as médias móveis, taxas de crescimento, início de voo
+# e pico são calculados de uma só vez para todas as armadilhas. Novas
+# contagens só obrigam a recalcular as somas acumuladas a partir do
+# primeiro dia alterado.
+
+JANELA = 7                  # dias da média móvel
+LIMIAR_INICIO = 3           # moscas em 7 dias para considerar o início do voo
+LIMIAR_CRESCIMENTO = 0.2    # variação semanal da média (±20%) para "a subir"/"a descer"
+FRACAO_PICO = 0.9           # média atual ≥ 90% do máximo, há menos de uma janela -> "no pico"
+
+ESTADOS = np.array(["Sem voo", "A subir", "No pico", "A descer", "Estável", "Sem capturas recentes"], dtype=object)
+
+
+class MotorTendencias:
+    def __init__(self, armadilhas, inicio, contagens):
+        self.armadilhas = list(armadilhas)          # id de cada linha
+        self.inicio = pd.Timestamp(inicio)           # dia da coluna 0
+        self.contagens = contagens.astype(np.int64)  # [armadilha, dia]
+        self._acumulado = np.zeros((len(self.armadilhas), contagens.shape[1] + 1), dtype=np.int64)
+        self._recalcular_desde(0)
+
+    # contagens: DataFrame com id_armadilha, dia e total (ex.: tabela contagens_diarias)
+    @classmethod
+    def construir(cls, contagens):
+        if contagens.empty:
+            return cls([], pd.Timestamp(date.today()), np.zeros((0, 0), dtype=np.int64))
+        dias = pd.to_datetime(contagens["dia"])
+        inicio = dias.min()
+        armadilhas = sorted(contagens["id_armadilha"].unique())
+        linhas = np.searchsorted(armadilhas, contagens["id_armadilha"])
+        colunas = ((dias - inicio) // pd.Timedelta(days=1)).to_numpy()
+
+        matriz = np.zeros((len(armadilhas), colunas.max() + 1), dtype=np.int64)
+        np.add.at(matriz, (linhas, colunas), contagens["total"].to_numpy())
+        return cls(armadilhas, inicio, matriz)
+
+    # ---------------------------------------------------
+    # Atualização incremental
+    # ---------------------------------------------------
+    # incrementos: DataFrame com id_armadilha, dia e n (moscas novas)
+    def atualizar(self, incrementos):
+        if incrementos.empty:
+            return
+
+        # Novas armadilhas -> novas linhas (somas acumuladas a zero)
+        novas = sorted(set(incrementos["id_armadilha"]) - set(self.armadilhas))
+        if novas:
+            self.armadilhas += novas
+            zeros = np.zeros((len(novas), self.contagens.shape[1]), dtype=np.int64)
+            self.contagens = np.vstack([self.contagens, zeros])
+            self._acumulado = np.vstack([self._acumulado, np.zeros((len(novas), zeros.shape[1] + 1), dtype=np.int64)])
+
+        # Dias antes do início obrigam a deslocar a matriz e a recalcular tudo
+        dias = pd.to_datetime(incrementos["dia"])
+        if self.contagens.shape[1] == 0:
+            self.inicio = dias.min()
+        primeiro_alterado = None
+        if dias.min() < self.inicio:
+            extra = (self.inicio - dias.min()).days
+            self.contagens = np.hstack([np.zeros((len(self.armadilhas), extra), dtype=np.int64), self.contagens])
+            self.inicio = dias.min()
+            primeiro_alterado = 0
+
+        colunas = ((dias - self.inicio) // pd.Timedelta(days=1)).to_numpy()
+        if colunas.max() >= self.contagens.shape[1]:
+            extra = colunas.max() + 1 - self.contagens.shape[1]
+            self.contagens = np.hstack([self.contagens, np.zeros((len(self.armadilhas), extra), dtype=np.int64)])
+
+        posicao = {armadilha: i for i, armadilha in enumerate(self.armadilhas)}
+        linhas = incrementos["id_armadilha"].map(posicao).to_numpy()
+        np.add.at(self.contagens, (linhas, colunas), incrementos["n"].to_numpy())
+
+        self._recalcular_desde(int(colunas.min()) if primeiro_alterado is None else primeiro_alterado)
+
+    # Somas acumuladas ao longo dos dias, só a partir da coluna alterada
+    # (acumulado[:, t] = moscas antes do dia t)
+    def _recalcular_desde(self, coluna):
+        n_dias = self.contagens.shape[1]
+        if self._acumulado.shape[1] != n_dias + 1:
+            # Dias novos depois do último conhecido: as somas continuam a partir
+            # do último acumulado válido (e não de zero)
+            coluna = min(coluna, self._acumulado.shape[1] - 1)
+            acumulado = np.zeros((len(self.armadilhas), n_dias + 1), dtype=np.int64)
+            acumulado[:, :coluna + 1] = self._acumulado[:, :coluna + 1]
+            self._acumulado = acumulado
+        base = self._acumulado[:, coluna]
+        self._acumulado[:, coluna + 1:] = base[:, None] + np.cumsum(self.contagens[:, coluna:], axis=1)
+
+    # ---------------------------------------------------
+    # Indicadores (todas as armadilhas de uma vez)
+    # ---------------------------------------------------
+    def indicadores(self, hoje=None):
+        hoje = pd.Timestamp(hoje or date.today()).normalize()
+        n_dias = max(self.contagens.shape[1], (hoje - self.inicio).days + 1, 1)
+
+        # Acumulado até hoje (dias sem dados depois do último registo contam como zero)
+        acumulado = self._acumulado
+        if n_dias + 1 > acumulado.shape[1]:
+            acumulado = np.hstack([acumulado, np.repeat(acumulado[:, -1:], n_dias + 1 - acumulado.shape[1], axis=1)])
+
+        # Soma móvel de 7 dias para cada armadilha e dia: acumulado[t+1] - acumulado[t+1-7]
+        fim = np.arange(1, n_dias + 1)
+        soma_7d = acumulado[:, fim] - acumulado[:, np.maximum(fim - JANELA, 0)]
+        media_7d = soma_7d / JANELA
+
+        media_atual = media_7d[:, -1]
+        media_anterior = media_7d[:, -1 - JANELA] if n_dias > JANELA else np.zeros(len(self.armadilhas))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crescimento = np.where(
+                media_anterior > 0, (media_atual - media_anterior) / media_anterior, np.where(media_atual > 0, np.inf, 0.0)
+            )
+
+        # Início do voo: primeiro dia com soma de 7 dias ≥ limiar
+        acima = soma_7d >= LIMIAR_INICIO
+        tem_inicio = acima.any(axis=1)
+        dia_inicio = np.argmax(acima, axis=1)
+
+        # Pico: dia com a maior média móvel
+        dia_pico = np.argmax(media_7d, axis=1)
+        media_pico = media_7d[np.arange(len(self.armadilhas)), dia_pico]
+        no_pico = (media_atual >= FRACAO_PICO * media_pico) & (n_dias - 1 - dia_pico < JANELA) & (media_pico > 0)
+
+        estado = np.select(
+            [~tem_inicio, media_atual == 0, no_pico, crescimento > LIMIAR_CRESCIMENTO, crescimento < -LIMIAR_CRESCIMENTO],
+            [0, 5, 2, 1, 3],
+            default=4,
+        )
+
+        dias = pd.date_range(self.inicio, periods=n_dias, freq="D")
+        return pd.DataFrame({
+            "id_armadilha": self.armadilhas,
+            "Média 7 dias": media_atual.round(2),
+            "Crescimento Semanal": np.where(np.isfinite(crescimento), crescimento, np.nan).round(3),
+            "Início do Voo": pd.Series(dias[dia_inicio]).where(tem_inicio),
+            "Data do Pico": pd.Series(dias[dia_pico]).where(media_pico > 0),
+            "Média no Pico": media_pico.round(2),
+            "Estado": ESTADOS[estado],
+        })
+
+
+# Tabela de estado por armadilha, com nome e localização
+def tabela_estado(motor, df_armadilhas, hoje=None):
+    indicadores = motor.indicadores(hoje)
+    df = df_armadilhas.merge(indicadores, left_on="ID Armadilha", right_on="id_armadilha", how="left")
+    df["Estado"] = df["Estado"].fillna("Sem voo")
+    return df.drop(columns=["id_armadilha"]).sort_values(["Localização", "Nome Armadilha"], ignore_index=True)
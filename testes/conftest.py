@@ -0,0 +1,28 @@
+import pathlib
+import shutil
+import sys
+from datetime import date
+
+import pytest
+
+# Os módulos do projeto estão na raiz do repositório
+RAIZ = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+
+# Dados sintéticos pequenos (gerados uma vez por sessão)
+@pytest.fixture(scope="session")
+def pasta_sintetica_base(tmp_path_factory):
+    import dados_sinteticos
+
+    pasta = tmp_path_factory.mktemp("sinteticos")
+    dados_sinteticos.gerar(pasta, n_armadilhas=6, n_dias=45, moscas_por_dia=2, imagens=False, fim=date(2025, 8, 31))
+    return pasta
+
+
+# Cópia dos dados sintéticos que cada teste pode alterar
+@pytest.fixture
+def pasta_sintetica(pasta_sintetica_base, tmp_path):
+    pasta = tmp_path / "dados"
+    shutil.copytree(pasta_sintetica_base, pasta)
+    return pasta
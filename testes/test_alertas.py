@@ -0,0 +1,99 @@
+import itertools
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import alertas
+
+_ids = itertools.count()
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE armadilhas (id INTEGER PRIMARY KEY, nome TEXT, localidade TEXT, latitude REAL, longitude REAL);
+        CREATE TABLE placas (id INTEGER PRIMARY KEY, placa_id TEXT, id_armadilha INTEGER);
+        INSERT INTO armadilhas VALUES (1, 'A1', 'Beja', 38, -7.8), (2, 'A2', 'Moura', 38.1, -7.4);
+        INSERT INTO placas (placa_id, id_armadilha) VALUES ('P1', 1), ('P2', 2);
+    """)
+    alertas.criar_tabelas(conn)
+    yield conn
+    conn.close()
+
+
+# Moscas novas de uma placa: {dia: n}
+def lote(contagens, placa="P1"):
+    linhas = [
+        (f"F{next(_ids)}", placa, pd.Timestamp(dia) + pd.Timedelta(hours=10))
+        for dia, n in contagens.items()
+        for _ in range(n)
+    ]
+    return pd.DataFrame(linhas, columns=["Fly_ID", "Placa ID", "First_Detection_Date"])
+
+
+def abertos(conn):
+    return {
+        (regra, dia): valor
+        for regra, dia, valor in conn.execute("SELECT regra, dia, valor FROM alertas WHERE aberto = 1")
+    }
+
+
+def test_regra_diaria(conn):
+    alertas.ingerir_moscas(conn, lote({"2025-07-01": 3, "2025-07-02": 4}))
+    assert abertos(conn) == {("diario", "2025-07-02"): 4.0}
+
+
+def test_regra_soma_7_dias(conn):
+    alertas.ingerir_moscas(conn, lote({f"2025-07-0{d}": 2 for d in range(1, 7)}))
+    # 2 por dia: a soma de 7 dias passa de 10 no sexto dia
+    assert abertos(conn) == {("soma_7d", "2025-07-06"): 12.0}
+
+
+def test_regra_crescimento_semanal_e_reavaliacao(conn):
+    alertas.ingerir_moscas(conn, lote({"2025-07-01": 1, "2025-07-03": 1, "2025-07-08": 2, "2025-07-10": 3}))
+    alertados = abertos(conn)
+    assert alertados[("crescimento_semanal", "2025-07-10")] == pytest.approx(5 / 2)
+    assert ("crescimento_semanal", "2025-07-08") in alertados
+
+    # Moscas novas na semana anterior: o crescimento no dia 10 deixa de passar o limiar
+    alertas.ingerir_moscas(conn, lote({"2025-07-02": 3}))
+    alertados = abertos(conn)
+    assert ("crescimento_semanal", "2025-07-10") not in alertados
+    assert ("crescimento_semanal", "2025-07-08") in alertados
+
+
+def test_moscas_repetidas_nao_contam_duas_vezes(conn):
+    df = lote({"2025-07-01": 4})
+    assert alertas.ingerir_moscas(conn, df)["n"].tolist() == [4]
+    assert alertas.ingerir_moscas(conn, df).empty
+    assert alertas.contagens_diarias(conn)["total"].tolist() == [4]
+
+
+def test_ingestao_incremental_igual_a_ingestao_completa(conn):
+    dias = pd.date_range("2025-07-01", periods=30).strftime("%Y-%m-%d")
+    contagens = {dia: (i * 7) % 5 for i, dia in enumerate(dias)}
+    df = pd.concat([lote(contagens, "P1"), lote(dict(list(contagens.items())[::3]), "P2")], ignore_index=True)
+    df = df.sample(frac=1, random_state=0)
+
+    completa = sqlite3.connect(":memory:")
+    completa.executescript("\n".join(conn.iterdump()))
+    alertas.ingerir_moscas(completa, df)
+    for inicio in range(0, len(df), 17):
+        alertas.ingerir_moscas(conn, df.iloc[inicio:inicio + 17])
+
+    consulta = "SELECT id_armadilha, regra, dia, valor FROM alertas ORDER BY 1, 2, 3"
+    assert conn.execute(consulta).fetchall() == completa.execute(consulta).fetchall()
+    assert len(completa.execute(consulta).fetchall()) > 0
+
+
+def test_alertas_silenciados_nao_voltam(conn):
+    alertas.ingerir_moscas(conn, lote({"2025-07-01": 5}))
+    df = alertas.alertas_abertos(conn, ["Beja"])
+    assert df["Regra"].tolist() == ["Moscas no dia"]
+    assert alertas.alertas_abertos(conn, ["Moura"]).empty
+
+    alertas.fechar_alertas(conn, df["ID"])
+    alertas.ingerir_moscas(conn, lote({"2025-07-01": 1}))
+    assert alertas.alertas_abertos(conn).empty
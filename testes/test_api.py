@@ -0,0 +1,155 @@
+import http.client
+import json
+import os
+import sqlite3
+import threading
+import time
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+import api
+import ingestao
+
+
+# Servidor da API num porto livre, sobre um ingestor já atualizado (sem thread)
+@pytest.fixture
+def iniciar_api():
+    servidores = []
+
+    def iniciar(pasta, ingestor=None):
+        if ingestor is None:
+            ingestor = ingestao.Ingestor(pasta)
+            ingestor.atualizar()
+        servico = api.ServicoAPI(ingestor, pasta / "placas.db")
+        servidor = ThreadingHTTPServer(("127.0.0.1", 0), api.criar_handler(servico))
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        servidores.append(servidor)
+        return servidor.server_address[1]
+
+    yield iniciar
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def pedir(porta, caminho, **cabecalhos):
+    conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+    try:
+        conn.request("GET", caminho, headers={k.replace("_", "-"): v for k, v in cabecalhos.items()})
+        resposta = conn.getresponse()
+        return resposta.status, dict(resposta.getheaders()), resposta.read()
+    finally:
+        conn.close()
+
+
+def test_304_com_if_none_match(pasta_sintetica, iniciar_api):
+    porta = iniciar_api(pasta_sintetica)
+    estado, cabecalhos, corpo = pedir(porta, "/classes")
+    assert estado == 200
+    assert json.loads(corpo)["dados"]
+
+    estado, cabecalhos_304, corpo = pedir(porta, "/classes", If_None_Match=cabecalhos["ETag"])
+    assert estado == 304 and corpo == b""
+    assert cabecalhos_304["ETag"] == cabecalhos["ETag"]
+
+    # Filtros diferentes -> ETag diferente
+    _, outros, _ = pedir(porta, "/classes?localizacao=Beja")
+    assert outros["ETag"] != cabecalhos["ETag"]
+
+
+def test_if_modified_since(pasta_sintetica, iniciar_api):
+    porta = iniciar_api(pasta_sintetica)
+    _, cabecalhos, _ = pedir(porta, "/curva")
+    assert pedir(porta, "/curva", If_Modified_Since=cabecalhos["Last-Modified"])[0] == 304
+    assert pedir(porta, "/curva", If_Modified_Since=formatdate(0, usegmt=True))[0] == 200
+
+
+def test_etag_estavel_entre_reinicios_com_os_mesmos_dados(pasta_sintetica, iniciar_api):
+    _, antes, _ = pedir(iniciar_api(pasta_sintetica), "/placas")
+    porta = iniciar_api(pasta_sintetica)  # "reinício": novo ingestor, geração 1 outra vez
+    assert pedir(porta, "/placas", If_None_Match=antes["ETag"])[0] == 304
+
+
+def test_etag_antigo_nao_vale_depois_de_reiniciar_com_dados_novos(pasta_sintetica, iniciar_api):
+    _, antes, _ = pedir(iniciar_api(pasta_sintetica), "/classes")
+
+    # Dados novos (metade das moscas) com a data de modificação antiga das fontes
+    mestre = pasta_sintetica / "dashboard_data.xlsx"
+    stat = mestre.stat()
+    df = pd.read_excel(mestre)
+    df.iloc[: len(df) // 2].to_excel(mestre, index=False)
+    os.utime(mestre, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    porta = iniciar_api(pasta_sintetica)
+    estado, depois, _ = pedir(porta, "/classes", If_None_Match=antes["ETag"])
+    assert estado == 200
+    assert depois["ETag"] != antes["ETag"]
+
+
+def test_armadilhas_seguem_placas_db_sem_nova_ingestao(pasta_sintetica, iniciar_api):
+    porta = iniciar_api(pasta_sintetica)
+    _, antes, corpo = pedir(porta, "/armadilhas")
+    n_antes = len(json.loads(corpo)["dados"])
+
+    time.sleep(0.01)
+    conn = sqlite3.connect(pasta_sintetica / "placas.db")
+    conn.execute("INSERT INTO armadilhas (nome, localidade, latitude, longitude) VALUES ('Nova', 'Beja', 38, -7.8)")
+    conn.commit()
+    conn.close()
+
+    estado, depois, corpo = pedir(porta, "/armadilhas", If_None_Match=antes["ETag"])
+    assert estado == 200
+    assert len(json.loads(corpo)["dados"]) == n_antes + 1
+    assert depois["ETag"] != antes["ETag"]
+
+
+def test_erros(pasta_sintetica, iniciar_api):
+    porta = iniciar_api(pasta_sintetica)
+    assert pedir(porta, "/inexistente")[0] == 404
+    assert pedir(porta, "/curva?inicio=2025-07-01")[0] == 400
+
+
+def test_exportacao_de_moscas_em_blocos(pasta_sintetica, iniciar_api):
+    import io
+
+    import exportacao
+
+    porta = iniciar_api(pasta_sintetica)
+    estado, cabecalhos, corpo = pedir(porta, "/moscas.csv?localizacao=Beja")
+    assert estado == 200
+    assert cabecalhos["Transfer-Encoding"] == "chunked" and "Content-Length" not in cabecalhos
+
+    df = pd.read_csv(io.BytesIO(corpo))
+    assert len(df) > 10 and set(df["Localização"]) == {"Beja"}
+    assert set(df.columns) <= set(exportacao.COLUNAS_MOSCAS) and "Fly_ID" in df.columns
+
+    # Sem moscas no filtro: só o cabeçalho
+    _, _, corpo = pedir(porta, "/moscas.csv?localizacao=Inexistente")
+    assert len(corpo.decode("utf-8").splitlines()) == 1
+    assert pedir(porta, "/moscas.csv?fim=2025-07-01")[0] == 400
+
+
+def test_exportacao_parquet(pasta_sintetica, iniciar_api):
+    pq = pytest.importorskip("pyarrow.parquet")
+    import io
+
+    porta = iniciar_api(pasta_sintetica)
+    _, _, csv = pedir(porta, "/moscas.csv")
+    estado, _, corpo = pedir(porta, "/moscas.parquet")
+    assert estado == 200
+    assert pq.read_table(io.BytesIO(corpo)).num_rows == len(pd.read_csv(io.BytesIO(csv)))
+
+
+def test_503_se_a_ingestao_falhar(pasta_sintetica, iniciar_api):
+    (pasta_sintetica / "dashboard_data.xlsx").write_bytes(b"corrompido")
+    ingestor = ingestao.Ingestor(pasta_sintetica).iniciar()
+    try:
+        porta = iniciar_api(pasta_sintetica, ingestor)
+        estado, _, corpo = pedir(porta, "/curva")
+        assert estado == 503 and "Erro a carregar os dados" in json.loads(corpo)["erro"]
+        assert pedir(porta, "/moscas.csv")[0] == 503
+    finally:
+        ingestor.parar()
@@ -0,0 +1,41 @@
+import pathlib
+
+import pytest
+
+import armazem_imagens
+
+
+def test_migracao_interrompida_nao_perde_imagens(tmp_path, monkeypatch):
+    conteudos = {
+        "image_20250701100000_ppp0.jpg_det_femea.jpg": b"a" * 10,
+        "image_20250701100000_ppp0.jpg_det_mosca.jpg": b"a" * 10,
+        "image_20250702100000_ppp0.jpg_det_mosca.jpg": b"b" * 20,
+    }
+    for nome, dados in conteudos.items():
+        (tmp_path / nome).write_bytes(dados)
+
+    # Interrompida ao apagar o segundo original
+    apagar = pathlib.Path.unlink
+    apagados = []
+
+    def interromper(caminho, *args, **kwargs):
+        if len(apagados) == 1:
+            raise KeyboardInterrupt
+        apagados.append(caminho)
+        apagar(caminho, *args, **kwargs)
+
+    monkeypatch.setattr(pathlib.Path, "unlink", interromper)
+    with pytest.raises(KeyboardInterrupt):
+        armazem_imagens.migrar(tmp_path)
+    monkeypatch.undo()
+
+    manifesto = armazem_imagens.carregar_manifesto(tmp_path)
+    assert set(manifesto) == set(conteudos)
+    for nome, dados in conteudos.items():
+        imagem, classe = armazem_imagens.PADRAO_DETECAO.match(nome).group("imagem", "classe")
+        assert armazem_imagens.resolver(manifesto, imagem, classe, tmp_path).read_bytes() == dados
+
+    # A migração seguinte apaga os originais que ficaram
+    resumo = armazem_imagens.migrar(tmp_path)
+    assert resumo["ficheiros"] == 2 and not list(tmp_path.glob("*_det_*.jpg"))
+    assert len(list((tmp_path / armazem_imagens.PASTA_BLOBS).rglob("*.jpg"))) == 2
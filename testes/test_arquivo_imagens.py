@@ -0,0 +1,51 @@
+from datetime import date
+
+import arquivo_imagens
+import ingestao
+
+
+def criar_arquivo(pasta):
+    pasta.mkdir(parents=True, exist_ok=True)
+    conteudos = {
+        "image_20250701100000_ppp0.jpg_det_mosca.jpg": b"a" * 100,
+        "image_20250702100000_ppp0.jpg_det_femea.jpg": b"b" * 50,
+    }
+    for nome, dados in conteudos.items():
+        (pasta / nome).write_bytes(dados)
+    arquivo_imagens.arquivar(pasta, hoje=date(2025, 9, 1))
+    return conteudos
+
+
+def test_leitor_le_do_arquivo_e_reabre_depois_de_fechar(tmp_path):
+    conteudos = criar_arquivo(tmp_path)
+    leitor = arquivo_imagens.LeitorArquivo(tmp_path)
+    assert set(leitor.nomes()) == set(conteudos)
+    assert not any((tmp_path / nome).exists() for nome in conteudos)
+
+    for nome, dados in conteudos.items():
+        assert leitor.ler(nome) == dados
+    leitor.fechar()
+    assert leitor._mapas == {}
+    assert leitor.ler("image_20250701100000_ppp0.jpg_det_mosca.jpg") == b"a" * 100
+
+
+def test_um_leitor_por_geracao_e_o_anterior_e_fechado(pasta_sintetica, monkeypatch):
+    criar_arquivo(pasta_sintetica / "detections_output")
+    criados = []
+    original = arquivo_imagens.LeitorArquivo
+
+    def contar(*args, **kwargs):
+        leitor = original(*args, **kwargs)
+        criados.append(leitor)
+        return leitor
+
+    monkeypatch.setattr(arquivo_imagens, "LeitorArquivo", contar)
+    ingestor = ingestao.Ingestor(pasta_sintetica)
+    ingestor.atualizar()
+    assert len(criados) == 1 and ingestor.snapshot().arquivo is criados[0]
+
+    criados[0].ler("image_20250701100000_ppp0.jpg_det_mosca.jpg")
+    assert criados[0]._mapas
+    ingestor.atualizar(forcar=True)
+    assert len(criados) == 2 and ingestor.snapshot().arquivo is criados[1]
+    assert criados[0]._mapas == {}
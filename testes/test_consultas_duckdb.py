@@ -0,0 +1,64 @@
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+import consultas_duckdb  # noqa: E402
+import exportacao  # noqa: E402
+import ingestao  # noqa: E402
+
+
+@pytest.fixture
+def snapshots(pasta_sintetica):
+    resultado = {}
+    for motor in ["pandas", "duckdb"]:
+        ingestor = ingestao.Ingestor(pasta_sintetica, motor=motor)
+        ingestor.atualizar()
+        resultado[motor] = ingestor.snapshot()
+    return resultado
+
+
+def test_duckdb_igual_ao_cubo(snapshots):
+    snapshot_pandas, snapshot_duckdb = snapshots["pandas"], snapshots["duckdb"]
+    filtros = consultas_duckdb.filtros_verificacao(snapshot_pandas)
+    assert len(filtros) > 5
+    assert consultas_duckdb.comparar(snapshot_pandas, snapshot_duckdb, filtros) == []
+
+
+def test_snapshot_duckdb_nao_guarda_moscas_nem_cubo(snapshots):
+    snapshot_pandas, snapshot_duckdb = snapshots["pandas"], snapshots["duckdb"]
+    assert snapshot_duckdb.parquet_moscas is not None
+    assert snapshot_duckdb.cubo is None
+    assert snapshot_duckdb.df_mestre.empty
+    assert snapshot_duckdb.n_moscas == snapshot_pandas.n_moscas == len(snapshot_pandas.df_mestre)
+    assert snapshot_pandas.parquet_moscas is None and snapshot_pandas.cubo is not None
+
+
+def test_exportacao_duckdb_em_lotes(snapshots):
+    caminho = snapshots["duckdb"].parquet_moscas
+    colunas = ["Fly_ID", "Class", "Localização"]
+    blocos = list(consultas_duckdb.blocos_moscas(caminho, colunas, tamanho_bloco=10))
+    assert len(blocos) > 1 and all(len(bloco) <= 10 for bloco in blocos)
+    assert sum(map(len, blocos)) == snapshots["duckdb"].n_moscas
+
+    # Sem moscas no filtro: só o cabeçalho
+    dados = consultas_duckdb.exportador(caminho, "csv", colunas, ["Inexistente"])().read()
+    assert dados.decode("utf-8").splitlines() == [",".join(colunas)]
+
+
+def test_vista_inicial_com_duckdb(snapshots):
+    import vista_inicial
+
+    vista = vista_inicial.construir(snapshots["duckdb"])
+    esperado = vista_inicial.construir(snapshots["pandas"])
+    assert vista["paineis"]["total"] == esperado["paineis"]["total"]
+    assert vista["localizacoes"] == esperado["localizacoes"]
+
+
+def test_exportacao_parquet_igual_nos_dois_motores(snapshots):
+    pq = pytest.importorskip("pyarrow.parquet")
+    import io
+
+    colunas = consultas_duckdb.colunas(snapshots["duckdb"].parquet_moscas)
+    de_pandas = exportacao.exportador(snapshots["pandas"].df_mestre, "parquet", colunas)().read()
+    de_duckdb = consultas_duckdb.exportador(snapshots["duckdb"].parquet_moscas, "parquet", colunas)().read()
+    assert pq.read_table(io.BytesIO(de_pandas)).equals(pq.read_table(io.BytesIO(de_duckdb)))
@@ -0,0 +1,90 @@
+import io
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image, ImageDraw  # noqa: E402
+
+import duplicados  # noqa: E402
+
+
+# Placa amarela com manchas escuras (semelhante às fotografias das armadilhas)
+def placa(semente, moscas=()):
+    rng = np.random.default_rng(semente)
+    fundo = np.full((480, 640, 3), (230, 210, 60), dtype=np.uint8)
+    fundo = np.clip(fundo + rng.normal(0, 6, fundo.shape), 0, 255).astype(np.uint8)
+    img = Image.fromarray(fundo)
+    desenho = ImageDraw.Draw(img)
+    for _ in range(25):
+        x, y = rng.integers(0, 600), rng.integers(0, 440)
+        r = rng.integers(15, 60)
+        desenho.ellipse((x, y, x + r, y + r), fill=(60, 50, 20))
+    for x, y in moscas:
+        desenho.ellipse((x, y, x + 12, y + 8), fill=(20, 20, 20))
+    return img
+
+
+def jpeg(img, qualidade=90):
+    saida = io.BytesIO()
+    img.save(saida, format="JPEG", quality=qualidade)
+    return saida.getvalue()
+
+
+def test_dhash_aproxima_fotografias_quase_iguais():
+    base = placa(1)
+    quase_igual = jpeg(placa(1, moscas=[(300, 200)]), qualidade=75)
+    outra = jpeg(placa(2))
+
+    h = duplicados.dhash(jpeg(base))
+    assert duplicados.distancia(h, duplicados.dhash(quase_igual)) <= duplicados.LIMIAR_HAMMING
+    assert duplicados.distancia(h, duplicados.dhash(outra)) > duplicados.LIMIAR_HAMMING
+
+
+def test_dhash_cabe_num_inteiro_do_sqlite():
+    h = duplicados.dhash(jpeg(placa(3)))
+    assert -(1 << 63) <= h < (1 << 63)
+    assert duplicados.distancia(h, h) == 0
+
+
+def test_registar_marca_repetidas_da_mesma_placa_na_janela():
+    imagens = {
+        "a.jpg": jpeg(placa(1)),
+        "b.jpg": jpeg(placa(1, moscas=[(100, 100)]), qualidade=80),  # 10 min depois: repetida de a
+        "c.jpg": jpeg(placa(1)),                                      # outra placa: original
+        "d.jpg": jpeg(placa(1)),                                      # 3 h depois: fora da janela
+        "e.jpg": jpeg(placa(2)),                                      # imagem diferente: original
+    }
+    df = pd.DataFrame({
+        "Nome da imagem": list(imagens),
+        "Placa ID": ["P1", "P1", "P2", "P1", "P1"],
+        "Data imagem": pd.to_datetime([
+            "2025-07-01T10:00:00Z", "2025-07-01T10:10:00Z", "2025-07-01T10:05:00Z",
+            "2025-07-01T13:00:00Z", "2025-07-01T10:20:00Z",
+        ]),
+    })
+
+    conn = sqlite3.connect(":memory:")
+    duplicados.criar_tabela(conn)
+    repetidas = duplicados.registar(conn, df, imagens.get)
+    assert repetidas == {"b.jpg": "a.jpg"}
+
+    # Segunda ingestão: nada é recalculado e o resultado é o mesmo
+    assert duplicados.registar(conn, df, lambda imagem: pytest.fail(f"hash recalculado: {imagem}")) == repetidas
+
+
+def test_remapear_passa_para_a_original():
+    imagens = pd.Series([" B.jpg", "a.jpg", "x.jpg"])
+    assert duplicados.remapear(imagens, {"b.jpg": "a.jpg"}).tolist() == ["a.jpg", "a.jpg", "x.jpg"]
+
+
+def test_descartar_mantem_imagens_referenciadas(tmp_path):
+    for imagem in ["b.jpg", "f.jpg"]:
+        (tmp_path / f"{imagem}_det_mosca.jpg").write_bytes(b"x" * 10)
+
+    n_ficheiros, _ = duplicados.descartar(tmp_path, {"b.jpg", "f.jpg"}, referenciadas={"F.jpg"})
+    assert n_ficheiros == 1
+    assert not (tmp_path / "b.jpg_det_mosca.jpg").exists()
+    assert (tmp_path / "f.jpg_det_mosca.jpg").exists()
@@ -0,0 +1,83 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import exposicao
+
+HOJE = date(2025, 7, 20)
+
+
+# Armadilha 1: P1 substituída por P2 a meio da série; armadilha 2: P3 inativa
+# sem sucessora; armadilha 3: P4 ativa desde o dia 3
+@pytest.fixture
+def intervalos():
+    df_placas = pd.DataFrame(
+        [
+            ("P1", 1, "A1", "Beja", "2025-07-01", 0),
+            ("P2", 1, "A1", "Beja", "2025-07-11", 1),
+            ("P3", 2, "A2", "Beja", "2025-07-05", 0),
+            ("P4", 3, "A3", "Moura", "2025-07-03", 1),
+        ],
+        columns=["Placa ID", "ID Armadilha", "Nome Armadilha", "Localização", "Data Colocação", "Ativa"],
+    )
+    return exposicao.intervalos_placas(df_placas, HOJE)
+
+
+@pytest.fixture
+def capturas():
+    return pd.DataFrame({
+        "Fly_ID": ["F1", "F2", "F3", "F4", "F5", "F6"],
+        "Placa ID": ["P1", "P1", "P1", "P2", "P3", "P4"],
+        "First_Detection_Date": pd.to_datetime([
+            "2025-06-28 10:00",  # antes da primeira placa
+            "2025-07-05 10:00",
+            "2025-07-12 10:00",  # registada na P1, mas a P2 já a tinha substituído
+            "2025-07-15 10:00",
+            "2025-07-06 10:00",  # P3 fechada no dia da colocação
+            "2025-07-03 10:00",  # no próprio dia da colocação da P4
+        ]),
+    })
+
+
+def test_intervalos(intervalos):
+    dias = intervalos.set_index("Placa ID")["Dias Exposição"]
+    assert dias.to_dict() == {"P1": 10, "P2": 10, "P3": 0, "P4": 18}
+    p3 = intervalos.set_index("Placa ID").loc["P3"]
+    assert p3["Fim"] == p3["Início"]
+
+
+def test_placa_ativa_de_cada_captura(intervalos, capturas):
+    juntas = exposicao.juntar_placa_ativa(capturas, intervalos)
+    assert juntas.index.equals(capturas.index)
+    ativas = juntas.set_index("Fly_ID")["Placa Ativa"]
+    assert ativas.drop(["F1", "F5"]).to_dict() == {"F2": "P1", "F3": "P2", "F4": "P2", "F6": "P4"}
+    assert ativas[["F1", "F5"]].isna().all()
+
+
+def test_exposicao_por_placa(intervalos, capturas):
+    por_placa = exposicao.exposicao_por_placa(exposicao.juntar_placa_ativa(capturas, intervalos), intervalos)
+    por_placa = por_placa.set_index("Placa ID")
+    assert por_placa["Capturas"].to_dict() == {"P1": 1, "P2": 2, "P3": 0, "P4": 1}
+    assert por_placa.loc["P2", "Moscas por Dia"] == pytest.approx(0.2)
+    assert np.isnan(por_placa.loc["P3", "Moscas por Dia"])
+
+
+def test_serie_e_taxa_de_captura(intervalos, capturas):
+    juntas = exposicao.juntar_placa_ativa(capturas, intervalos)
+    serie = exposicao.serie_capturas_armadilha_dia(juntas, intervalos, HOJE)
+
+    # A P3 (sem exposição) não conta como armadilha ativa; a troca P1 -> P2 não duplica a armadilha
+    beja = serie[serie["Localização"] == "Beja"].set_index("Data")
+    moura = serie[serie["Localização"] == "Moura"].set_index("Data")
+    assert beja.index.equals(pd.date_range("2025-07-01", "2025-07-20"))
+    assert moura.index.equals(pd.date_range("2025-07-03", "2025-07-20"))
+    assert (serie["Armadilhas Ativas"] == 1).all()
+    assert beja["Capturas"].sum() == 3 and moura["Capturas"].sum() == 1
+    assert beja.loc["2025-07-12", "Capturas"] == 1
+
+    taxa = exposicao.taxa_captura(serie).set_index("Data")
+    assert taxa.loc["2025-07-01", "Armadilhas Ativas"] == 1
+    assert taxa.loc["2025-07-12", "Moscas por Armadilha por Dia"] == pytest.approx(0.5)
+    assert exposicao.taxa_captura(serie, ["Moura"], date(2025, 7, 1), date(2025, 7, 4))["Capturas"].tolist() == [1, 0]
@@ -0,0 +1,23 @@
+import ingestao
+
+
+def test_primeira_ingestao_falhada_nao_bloqueia(pasta_sintetica):
+    (pasta_sintetica / "dashboard_data.xlsx").write_bytes(b"corrompido")
+    ingestor = ingestao.Ingestor(pasta_sintetica).iniciar()
+    try:
+        assert ingestor.aguardar_snapshot(timeout=30) is None
+        assert ingestor.erro is not None
+        assert ingestor.mensagem_indisponivel().startswith("Erro a carregar os dados")
+    finally:
+        ingestor.parar()
+
+    # Com as fontes corrigidas, a ingestão seguinte publica o snapshot e limpa o erro
+    (pasta_sintetica / "dashboard_data.xlsx").unlink()
+    ingestor.atualizar()
+    assert ingestor.snapshot() is not None and ingestor.erro is None
+
+
+def test_tempo_esgotado_sem_erro(pasta_sintetica):
+    ingestor = ingestao.Ingestor(pasta_sintetica)
+    assert ingestor.aguardar_snapshot(timeout=0.01) is None
+    assert "ainda estão a ser carregados" in ingestor.mensagem_indisponivel()
@@ -0,0 +1,77 @@
+import logging
+
+import pytest
+
+import metricas
+
+
+# Só as métricas e caches criadas em cada teste são exportadas
+@pytest.fixture(autouse=True)
+def registo_limpo(monkeypatch):
+    monkeypatch.setattr(metricas, "_metricas", [])
+    monkeypatch.setattr(metricas, "_caches", {})
+
+
+def linhas_exportadas():
+    return metricas.exportar().decode("utf-8").splitlines()
+
+
+def test_histograma_acumulado_com_limite_inclusivo():
+    h = metricas.Histograma("teste_segundos", "Teste.", buckets=(0.1, 1))
+    for valor in (0.05, 0.1, 0.5, 3):
+        h.observar(valor)
+
+    assert linhas_exportadas() == [
+        "# HELP mosca_teste_segundos Teste.",
+        "# TYPE mosca_teste_segundos histogram",
+        'mosca_teste_segundos_bucket{le="0.1"} 2',
+        'mosca_teste_segundos_bucket{le="1.0"} 3',
+        'mosca_teste_segundos_bucket{le="+Inf"} 4',
+        "mosca_teste_segundos_sum 3.65",
+        "mosca_teste_segundos_count 4",
+        "# HELP mosca_cache_pedidos_total Pedidos a cada cache, por resultado.",
+        "# TYPE mosca_cache_pedidos_total counter",
+        "# HELP mosca_cache_entradas Entradas em cada cache.",
+        "# TYPE mosca_cache_entradas gauge",
+        "# HELP mosca_cache_bytes Tamanho de cada cache em bytes.",
+        "# TYPE mosca_cache_bytes gauge",
+    ]
+
+
+def test_etiquetas_escapadas():
+    c = metricas.Contador("teste_total", "Teste.", ["fonte"])
+    c.incrementar(2, fonte='C:\\dados\\"novo"\nfim')
+
+    assert 'mosca_teste_total{fonte="C:\\\\dados\\\\\\"novo\\"\\nfim"} 2' in linhas_exportadas()
+
+
+def test_cache_com_erro_nao_impede_as_outras(caplog):
+    metricas.registar_cache("partida", lambda: 1 / 0)
+    metricas.registar_cache("boa", lambda: {"acertos": 3, "falhas": 1, "entradas": 2, "bytes": 100})
+
+    with caplog.at_level(logging.WARNING, logger="metricas"):
+        linhas = linhas_exportadas()
+
+    assert [linha for linha in linhas if not linha.startswith("#")] == [
+        'mosca_cache_pedidos_total{cache="boa",resultado="acerto"} 3',
+        'mosca_cache_pedidos_total{cache="boa",resultado="falha"} 1',
+        'mosca_cache_entradas{cache="boa"} 2',
+        'mosca_cache_bytes{cache="boa"} 100',
+    ]
+    assert "'partida'" in caplog.text
+
+
+def test_medido_regista_chamadas_com_excecao():
+    h = metricas.Histograma("teste_segundos", "Teste.", ["fragmento"])
+
+    @h.medido(fragmento="tabela")
+    def fragmento(falhar):
+        if falhar:
+            raise ValueError
+        return "ok"
+
+    assert fragmento(False) == "ok"
+    with pytest.raises(ValueError):
+        fragmento(True)
+    assert fragmento.__name__ == "fragmento"
+    assert 'mosca_teste_segundos_count{fragmento="tabela"} 2' in linhas_exportadas()
@@ -0,0 +1,109 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+import recortes  # noqa: E402
+
+
+def jpeg(cor):
+    saida = io.BytesIO()
+    Image.new("RGB", (200, 200), cor).save(saida, format="JPEG")
+    return saida.getvalue()
+
+
+def test_so_recorta_de_imagens_sem_anotacoes(tmp_path):
+    (tmp_path / "a.jpg").write_bytes(jpeg((230, 210, 60)))
+    (tmp_path / "b.jpg_det_mosca.jpg").write_bytes(jpeg((255, 0, 0)))
+    df_galeria = pd.DataFrame({
+        "Imagem": ["a.jpg", "b.jpg"],
+        "Data": pd.to_datetime(["2025-07-01", "2025-07-02"]),
+        "Caminho": [str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg_det_mosca.jpg")],
+        "Arquivo": [None, None],
+        "Original": [True, False],
+    })
+    df_caixas = pd.DataFrame({
+        "imagem": ["a.jpg", "b.jpg", "b.jpg"],
+        "classe": ["mosca"] * 3,
+        "fly_id": ["F1", "F2", "F3"],
+        "x_min": [50, 50, 100], "y_min": [50, 50, 100], "x_max": [70, 70, 120], "y_max": [70, 70, 120],
+        "confianca": [0.9, 0.8, 0.7],
+    })
+
+    pasta = tmp_path / "recortes"
+    pasta.mkdir()
+    indice, avisos = recortes.atualizar(pasta, df_caixas, df_galeria, arquivo=None)
+    assert indice["ID"].tolist() == ["F1"]
+    assert [nivel for nivel, _ in avisos] == ["info"] and "2 deteções" in avisos[0][1]
+
+    recorte = recortes.ler(pasta, indice)[0]
+    assert np.abs(recorte.astype(int) - (230, 210, 60)).max() < 10
+
+
+def test_erros_de_leitura_vao_para_os_avisos(tmp_path):
+    df_galeria = pd.DataFrame({
+        "Imagem": ["a.jpg"], "Data": pd.to_datetime(["2025-07-01"]),
+        "Caminho": [str(tmp_path / "inexistente.jpg")], "Arquivo": [None], "Original": [True],
+    })
+    df_caixas = pd.DataFrame({
+        "imagem": ["a.jpg"], "classe": ["mosca"], "fly_id": ["F1"],
+        "x_min": [0], "y_min": [0], "x_max": [10], "y_max": [10], "confianca": [0.9],
+    })
+
+    indice, avisos = recortes.atualizar(tmp_path, df_caixas, df_galeria, arquivo=None)
+    assert indice.empty
+    assert avisos[0][0] == "warning" and "a.jpg" in avisos[0][1]
+
+
+# Uma fotografia por ingestão, cada uma de uma cor, com uma deteção
+def ingerir_uma_a_uma(pasta, n):
+    cores = [(40 * i % 256, 100, 200 - 10 * i) for i in range(n)]
+    indice = None
+    for i, cor in enumerate(cores):
+        nome = f"{i}.jpg"
+        (pasta / nome).write_bytes(jpeg(cor))
+        df_galeria = pd.DataFrame({
+            "Imagem": [nome], "Data": pd.to_datetime(["2025-07-01"]) + pd.Timedelta(days=i),
+            "Caminho": [str(pasta / nome)], "Arquivo": [None], "Original": [True],
+        })
+        df_caixas = pd.DataFrame({
+            "imagem": [nome], "classe": ["mosca"], "fly_id": [f"F{i}"],
+            "x_min": [50], "y_min": [50], "x_max": [70], "y_max": [70], "confianca": [0.9],
+        })
+        indice, _ = recortes.atualizar(pasta / "recortes", df_caixas, df_galeria, arquivo=None)
+    return indice, cores
+
+
+def test_blocos_pequenos_sao_juntados(tmp_path):
+    (tmp_path / "recortes").mkdir()
+    indice, cores = ingerir_uma_a_uma(tmp_path, 6)
+
+    # O bloco atual e o juntado na última ingestão (apagado na seguinte)
+    assert len(list((tmp_path / "recortes").glob("bloco_*.npy"))) == 2
+    assert indice["bloco"].nunique() == 1 and indice["posicao"].tolist() == list(range(6))
+
+    lidos = recortes.ler(tmp_path / "recortes", indice)
+    for recorte, cor in zip(lidos, cores):
+        assert np.abs(recorte.astype(int) - cor).max() < 10
+
+
+def test_blocos_grandes_ficam(tmp_path, monkeypatch):
+    monkeypatch.setattr(recortes, "BLOCO_MINIMO", 2)
+    (tmp_path / "recortes").mkdir()
+    indice, _ = ingerir_uma_a_uma(tmp_path, 5)
+    assert indice.groupby("bloco").size().tolist() == [2, 2, 1]
+
+
+def test_mmaps_abertos_limitados(tmp_path, monkeypatch):
+    monkeypatch.setattr(recortes, "BLOCO_MINIMO", 1)
+    monkeypatch.setattr(recortes, "MAX_BLOCOS_ABERTOS", 2)
+    monkeypatch.setattr(recortes, "_blocos", recortes.OrderedDict())
+    (tmp_path / "recortes").mkdir()
+    indice, _ = ingerir_uma_a_uma(tmp_path, 4)
+
+    assert recortes.ler(tmp_path / "recortes", indice).shape[0] == 4
+    assert len(recortes._blocos) == 2
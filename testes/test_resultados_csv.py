@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+
+import ingestao
+import resultados_csv
+
+CABECALHO = (
+    "Nome da imagem,Data imagem,Placa ID,Localização,Latitude,Longitude,Nº femea,Nº macho,Nº mosca,"
+    "Coord. femea,Coord. macho,Coord. mosca,Conf. femea,Conf. macho,Conf. mosca"
+)
+
+
+def escrever(pasta, *linhas):
+    caminho = pasta / "results.csv"
+    caminho.write_text("\n".join([CABECALHO, *linhas]) + "\n", encoding="utf-8")
+    return caminho
+
+
+VALIDA = 'image_20250722214925_ppp0.jpg,2025-07-22T20:49:32.892Z,P1,Beja,38.02,-7.94,0,0,1,,,"F1:613,520,648,571",,,0.75'
+
+
+def test_linhas_validas_com_tipos_explicitos(tmp_path):
+    df, df_quarentena, n_datas_nome = resultados_csv.ler(escrever(tmp_path, VALIDA))
+    assert df_quarentena.empty and n_datas_nome == 0
+    linha = df.iloc[0]
+    assert linha["Data imagem"] == pd.Timestamp("2025-07-22T20:49:32.892Z")
+    assert linha["Nº mosca"] == 1 and linha["Latitude"] == pytest.approx(38.02)
+
+
+@pytest.mark.parametrize("data", [
+    "2025-07-22T20:49:32Z",
+    "2025-07-22T20:49:32+00:00",
+    "2025-07-22T20:49:32.892+00:00",
+])
+def test_variantes_iso_em_utc(tmp_path, data):
+    linha = VALIDA.replace("2025-07-22T20:49:32.892Z", data)
+    df, df_quarentena, n_datas_nome = resultados_csv.ler(escrever(tmp_path, linha))
+    assert df_quarentena.empty and n_datas_nome == 0
+    assert df.iloc[0]["Data imagem"] == pd.Timestamp(data.replace("+00:00", "Z"))
+
+
+def test_data_em_falta_vem_do_nome_da_imagem(tmp_path):
+    sem_data = VALIDA.replace("2025-07-22T20:49:32.892Z", "")
+    df, df_quarentena, n_datas_nome = resultados_csv.ler(escrever(tmp_path, sem_data))
+    assert df_quarentena.empty and n_datas_nome == 1
+    # 21:49:25 em Lisboa (verão) = 20:49:25 UTC
+    assert df.iloc[0]["Data imagem"] == pd.Timestamp("2025-07-22T20:49:25Z")
+
+
+@pytest.mark.parametrize("original, errada, motivo", [
+    ("2025-07-22T20:49:32.892Z", "22/07/2025", None),  # data mal formada, mas o nome tem a data
+    ("2025-07-22T20:49:32.892Z", "2025-07-22T20:49:32Z", None),  # sem milissegundos
+    ("2025-07-22T20:49:32.892Z", "2025-07-22T20:49:32+00:00", None),  # com o fuso em vez de "Z"
+    ("image_20250722214925_ppp0.jpg,2025-07-22T20:49:32.892Z", "sem_data.jpg,ontem", "Data imagem inválida"),
+    (",0,0,1,", ",0,-1,1,", "Nº macho não é um inteiro"),
+    ("38.02", "norte", "Latitude não é um número"),
+    ('"F1:613,520,648,571"', '"F1:613,520"', "Coord. mosca mal formada"),
+    (",0.75", ",1.5", "Conf. mosca não são confianças"),
+    (",0.75", ",0.75;0.5", "tamanhos diferentes"),
+])
+def test_linhas_invalidas_vao_para_a_quarentena(tmp_path, original, errada, motivo):
+    df, df_quarentena, _ = resultados_csv.ler(escrever(tmp_path, VALIDA, VALIDA.replace(original, errada)))
+    if motivo is None:
+        assert len(df) == 2 and df_quarentena.empty
+    else:
+        assert len(df) == 1
+        assert df_quarentena["Linha"].tolist() == [3]
+        assert motivo in df_quarentena.iloc[0]["Motivo"]
+
+
+def test_colunas_em_falta(tmp_path):
+    caminho = tmp_path / "results.csv"
+    caminho.write_text("Nome da imagem,Data imagem\nx.jpg,2025-07-22T20:49:32.892Z\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Colunas em falta"):
+        resultados_csv.ler(caminho)
+
+
+def test_quarentena_e_avisos_na_ingestao(tmp_path):
+    caminho = escrever(tmp_path, VALIDA, VALIDA.replace("2025-07-22T20:49:32.892Z", ""), VALIDA.replace("38.02", "x"))
+    df, avisos = ingestao.carregar_resultados(caminho)
+    assert len(df) == 2
+    assert [nivel for nivel, _ in avisos] == ["warning", "info"]
+
+    quarentena = resultados_csv.caminho_quarentena(caminho)
+    assert pd.read_csv(quarentena)["Linha"].tolist() == [4]
+
+    # Sem linhas rejeitadas, o ficheiro de quarentena é removido
+    escrever(tmp_path, VALIDA)
+    ingestao.carregar_resultados(caminho)
+    assert not quarentena.exists()
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import tendencias
+
+
+def motor_completo(contagens):
+    return tendencias.MotorTendencias.construir(contagens)
+
+
+def como_contagens(incrementos):
+    return incrementos.rename(columns={"n": "total"})
+
+
+def verificar_igual(incremental, completo, hoje):
+    assert incremental.armadilhas == completo.armadilhas
+    assert incremental.inicio == completo.inicio
+    np.testing.assert_array_equal(incremental.contagens, completo.contagens)
+    np.testing.assert_array_equal(incremental._acumulado, completo._acumulado)
+    pd.testing.assert_frame_equal(incremental.indicadores(hoje), completo.indicadores(hoje))
+
+
+@pytest.mark.parametrize("incrementos", [
+    # Dia novo depois de um intervalo sem dados
+    pd.DataFrame({"id_armadilha": [1], "dia": ["2025-07-08"], "n": [1]}),
+    # Dia já conhecido
+    pd.DataFrame({"id_armadilha": [1], "dia": ["2025-07-02"], "n": [4]}),
+    # Dia antes do início
+    pd.DataFrame({"id_armadilha": [1], "dia": ["2025-06-25"], "n": [3]}),
+    # Armadilha nova, mais dias novos
+    pd.DataFrame({"id_armadilha": [2, 1], "dia": ["2025-07-05", "2025-07-20"], "n": [2, 6]}),
+])
+def test_atualizacao_incremental_igual_a_reconstrucao(incrementos):
+    iniciais = pd.DataFrame({"id_armadilha": [1, 1], "dia": ["2025-07-01", "2025-07-03"], "total": [5, 2]})
+
+    incremental = motor_completo(iniciais)
+    incremental.atualizar(incrementos)
+    completo = motor_completo(pd.concat([iniciais, como_contagens(incrementos)], ignore_index=True))
+
+    verificar_igual(incremental, completo, hoje="2025-07-25")
+
+
+def test_atualizacoes_sucessivas_aleatorias():
+    rng = np.random.default_rng(0)
+    dias = pd.date_range("2025-06-01", periods=60).strftime("%Y-%m-%d")
+    todos = pd.DataFrame({
+        "id_armadilha": rng.integers(1, 5, 200),
+        "dia": rng.choice(dias, 200),
+        "n": rng.integers(1, 10, 200),
+    })
+
+    incremental = motor_completo(como_contagens(todos.iloc[:20]))
+    for inicio in range(20, len(todos), 30):
+        incremental.atualizar(todos.iloc[inicio:inicio + 30])
+    completo = motor_completo(como_contagens(todos))
+
+    verificar_igual(incremental, completo, hoje="2025-08-15")
+
+
+def test_media_nao_fica_negativa_depois_de_um_intervalo():
+    motor = motor_completo(pd.DataFrame({"id_armadilha": [1, 1], "dia": ["2025-07-01", "2025-07-03"], "total": [5, 2]}))
+    motor.atualizar(pd.DataFrame({"id_armadilha": [1], "dia": ["2025-07-08"], "n": [1]}))
+    assert (motor.indicadores("2025-07-08")["Média 7 dias"] >= 0).all()
@@ -0,0 +1,139 @@
+import logging
+import pathlib
+import pickle
+import time
+
+import agregacoes
+import armazem_imagens
+import exposicao
+import galeria
+import sobreposicoes
+
+# ---------------------------------------------------
+# Vista inicial pré-calculada (arranque a frio)
+# ---------------------------------------------------
+# No fim de cada ingestão, o worker grava em disco a vista "sem filtros"
+# do dashboard: curva diária, totais por classe, tabelas por semana, mês e
+# placa, taxa de captura, estado das armadilhas, pontos do mapa e a primeira
+# página da galeria já desenhada. Um processo novo mostra esta vista logo
+# que arranca, enquanto o worker lê o Excel, a BD e o CSV; só é preciso
+# esperar pelo snapshot completo quando o utilizador muda os filtros.
+#
+# O ficheiro tem um número de versão; ficheiros de outra versão são ignorados.
+
+VERSAO = 2
+NOME_FICHEIRO = "vista_inicial.pkl"
+
+log = logging.getLogger(__name__)
+
+
+# Painéis do dashboard com o motor pandas (fatias do cubo) para os filtros
+# dados; sem filtros, são os painéis da vista inicial. As mesmas chaves que
+# consultas_duckdb.paineis
+def paineis(snapshot, localizacoes=None, inicio=None, fim=None, df_filtrado=None):
+    cubo = snapshot.cubo
+    filtros = (localizacoes, inicio, fim)
+    return {
+        "total": cubo.total(*filtros),
+        "curva_diaria": cubo.curva_diaria(*filtros),
+        "totais_por_classe": cubo.totais_por_classe(*filtros),
+        "por_semana": cubo.por_semana(*filtros),
+        "por_mes": cubo.por_mes(*filtros),
+        "por_placa": cubo.por_placa(*filtros),
+        **paineis_exposicao(snapshot, *filtros),
+        "mapa": agregacoes.pontos_mapa(
+            snapshot.df_localizacoes, snapshot.df_mestre if df_filtrado is None else df_filtrado
+        ),
+    }
+
+
+# Taxa de captura, exposição por placa e estado das armadilhas (iguais em todos os motores)
+def paineis_exposicao(snapshot, localizacoes=None, inicio=None, fim=None):
+    taxa = exposicao_placas = tendencias = None
+    if snapshot.exposicao is not None:
+        taxa = exposicao.taxa_captura(snapshot.exposicao.serie, localizacoes, inicio, fim)
+        exposicao_placas = snapshot.exposicao.por_placa
+        if localizacoes:
+            exposicao_placas = exposicao_placas[exposicao_placas["Localização"].isin(localizacoes)]
+    if snapshot.df_tendencias is not None:
+        tendencias = snapshot.df_tendencias
+        if localizacoes:
+            tendencias = tendencias[tendencias["Localização"].isin(localizacoes)]
+
+    return {"taxa_captura": taxa, "exposicao_por_placa": exposicao_placas, "tendencias": tendencias}
+
+
+def construir(snapshot):
+    if snapshot.n_moscas == 0:
+        return None
+    if snapshot.parquet_moscas is not None:
+        import consultas_duckdb
+
+        paineis_iniciais = consultas_duckdb.paineis(snapshot)
+    elif snapshot.cubo is not None:
+        paineis_iniciais = paineis(snapshot)
+    else:
+        return None
+
+    todas_localizacoes, min_date, max_date = snapshot.opcoes_filtros
+    return {
+        "versao": VERSAO,
+        "geracao": snapshot.geracao,
+        "criado_em": snapshot.criado_em,
+        "avisos": snapshot.avisos,
+        "localizacoes": todas_localizacoes,
+        "min_date": min_date,
+        "max_date": max_date,
+        "paineis": paineis_iniciais,
+        "n_imagens_galeria": len(snapshot.df_galeria),
+        "galeria": primeira_pagina_galeria(snapshot),
+    }
+
+
+# Primeira página da galeria com todas as classes desenhadas (só sobre imagens
+# sem anotações): (linha, jpeg ou None)
+def primeira_pagina_galeria(snapshot):
+    df_pagina = snapshot.df_galeria.head(galeria.TAMANHO_PAGINA)
+    caixas = snapshot.df_caixas[snapshot.df_caixas["imagem"].isin(df_pagina["Imagem"])]
+    colunas = ["classe", "x_min", "y_min", "x_max", "y_max"]
+
+    pagina = []
+    for row in df_pagina.itertuples(index=False):
+        imagem = None
+        try:
+            dados = galeria.ler_imagem_base(row, snapshot.arquivo)
+            if dados is not None:
+                caixas_imagem = ()
+                if row.Original:
+                    caixas_imagem = tuple(caixas.loc[caixas["imagem"] == row.Imagem, colunas].itertuples(index=False, name=None))
+                imagem = sobreposicoes.desenhar_caixas(
+                    dados, caixas_imagem, tuple(sobreposicoes.CLASSES), largura_max=galeria.LARGURA_IMAGEM
+                )
+        except OSError as e:
+            log.warning("Erro a preparar a imagem %s da vista inicial: %s", row.Imagem, e)
+        pagina.append((row._asdict(), imagem))
+    return pagina
+
+
+def guardar(vista, caminho):
+    armazem_imagens.escrever_atomico(pathlib.Path(caminho), pickle.dumps(vista, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+# Devolve a vista guardada, ou None se não existir, estiver corrompida ou for de outra versão
+def carregar(caminho):
+    try:
+        with open(caminho, "rb") as f:
+            vista = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning("Vista inicial ignorada (%s): %s", caminho, e)
+        return None
+    if not isinstance(vista, dict) or vista.get("versao") != VERSAO:
+        return None
+    return vista
+
+
+# Idade da vista em segundos (mostrada ao utilizador enquanto os dados carregam)
+def idade(vista):
+    return time.time() - vista["criado_em"]